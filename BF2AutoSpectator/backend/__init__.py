@@ -0,0 +1,36 @@
+from typing import Optional
+
+from BF2AutoSpectator.common.classes import Singleton
+from .base import Window, FrameSource, InputSink
+
+
+class Backend(metaclass=Singleton):
+    """
+    Provides the frame source (screen capture, window lookup) and input sink (keyboard/mouse input) to use.
+    Defaults to the Windows backend, which is only imported once needed, since it requires the Win32 API.
+    """
+    __frame_source: Optional[FrameSource] = None
+    __input_sink: Optional[InputSink] = None
+
+    def use(self, frame_source: FrameSource, input_sink: InputSink) -> None:
+        self.__frame_source = frame_source
+        self.__input_sink = input_sink
+
+    def use_windows(self) -> None:
+        from .windows import WindowsFrameSource, WindowsInputSink
+        self.use(WindowsFrameSource(), WindowsInputSink())
+
+    def get_frame_source(self) -> FrameSource:
+        if self.__frame_source is None:
+            self.use_windows()
+
+        return self.__frame_source
+
+    def get_input_sink(self) -> InputSink:
+        if self.__input_sink is None:
+            self.use_windows()
+
+        return self.__input_sink
+
+
+__all__ = ['Backend', 'Window', 'FrameSource', 'InputSink']
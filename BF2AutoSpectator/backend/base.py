@@ -0,0 +1,113 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+from numpy import ndarray
+
+from BF2AutoSpectator.common import constants
+
+
+class Window:
+    handle: int
+    title: str
+    rect: Tuple[int, int, int, int]
+    class_name: str
+    pid: int
+
+    def __init__(self, handle: int, title: str, rect: Tuple[int, int, int, int], class_name: str, pid: int):
+        self.handle = handle
+        self.title = title
+        self.rect = rect
+        self.class_name = class_name
+        self.pid = pid
+
+    def get_size(self) -> Tuple[int, int]:
+        # Size on Windows contains the window header and the halo/shadow around the window,
+        # which needs to be subtracted to get the real size
+        left, top, right, bottom = self.rect
+        return right - constants.WINDOW_SHADOW_SIZE - left - constants.WINDOW_SHADOW_SIZE, \
+            bottom - constants.WINDOW_SHADOW_SIZE - top - constants.WINDOW_TITLE_BAR_HEIGHT
+
+
+class FrameSource(ABC):
+    """
+    Provides windows and their contents (frames)
+    """
+    @abstractmethod
+    def find_windows(self) -> List[Window]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_window_rect(self, handle: int) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Get the current rectangle of a window
+        :param handle: handle of the window
+        :return: rectangle, format: (left, top, right, bottom) or None if window no longer exists
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def capture(self, region: Tuple[int, int, int, int]) -> ndarray:
+        """
+        Take a screenshot of the specified screen region
+        :param region: region to take screenshot of, format: (left, top, width, height)
+        :return: RGB pixels as array of shape (height, width, 3)
+        """
+        raise NotImplementedError
+
+
+class InputSink(ABC):
+    """
+    Receives any input (keyboard, mouse, window focus) sent to the game
+    """
+    @abstractmethod
+    def press_key(self, key_code: int) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def release_key(self, key_code: int) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def press_key_by_name(self, key: str, presses: int, interval: float) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def write_text(self, text: str, interval: float) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def mouse_move_to(self, x: int, y: int) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def mouse_move_relative(self, dx: int, dy: int) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def mouse_click(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def mouse_down_legacy(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def mouse_up_legacy(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_cursor_position(self) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_cursor_info(self) -> Tuple[int, int, Tuple[int, int]]:
+        """
+        Get cursor details
+        :return: cursor flags, cursor handle and position
+        (see https://learn.microsoft.com/en-us/windows/win32/api/winuser/ns-winuser-cursorinfo)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def bring_to_foreground(self, window: Window) -> None:
+        raise NotImplementedError
@@ -0,0 +1,206 @@
+import glob
+import os
+import time
+from typing import List, Optional, Tuple, Any
+
+import numpy as np
+from PIL import Image
+from numpy import ndarray
+
+from BF2AutoSpectator.common import constants
+from .base import Window, FrameSource, InputSink
+
+REPLAY_FRAME_EXTENSIONS = ['png', 'npz']
+REPLAY_WINDOW_HANDLE = 1
+REPLAY_WINDOW_PID = 0
+REPLAY_RESOLUTIONS = {
+    '720p': (1280, 720),
+    '900p': (1600, 900)
+}
+
+
+class ReplayFrameSource(FrameSource):
+    """
+    Serves recorded frames of the game window client area instead of capturing the screen. Frames are read from
+    <path>/<resolution>/ (PNG screenshots or NPZ files containing a "pixels" array) in file name order.
+    """
+    frames: List[ndarray]
+    names: List[str]
+    resolution: str
+    frame_interval: Optional[float]
+    window: Window
+    loop: bool
+
+    __index: int = 0
+    __started_at: Optional[float] = None
+
+    def __init__(self, path: str, resolution: str, frame_interval: Optional[float] = None, loop: bool = True):
+        """
+        :param path: path to folder containing one folder of frames per resolution
+        :param resolution: resolution to serve frames for
+        :param frame_interval: seconds each frame stays "on screen", None to only advance via next_frame()
+        :param loop: whether to start over after serving the last frame
+        """
+        self.resolution = resolution
+        self.frame_interval = frame_interval
+        self.loop = loop
+        self.names, self.frames = load_replay_frames(os.path.join(path, resolution))
+
+        width, height = REPLAY_RESOLUTIONS[resolution]
+        for name, frame in zip(self.names, self.frames):
+            if frame.shape[:2] != (height, width):
+                raise ValueError(f'Replay frame {name} is {frame.shape[1]}x{frame.shape[0]}, '
+                                 f'expected {width}x{height}')
+
+        # Place the window at the origin, including the title bar and the shadow around it (like on Windows)
+        self.window = Window(
+            REPLAY_WINDOW_HANDLE,
+            constants.BF2_WINDOW_TITLE,
+            (
+                0,
+                0,
+                width + constants.WINDOW_SHADOW_SIZE * 2,
+                height + constants.WINDOW_TITLE_BAR_HEIGHT + constants.WINDOW_SHADOW_SIZE
+            ),
+            'BF2',
+            REPLAY_WINDOW_PID
+        )
+
+    def get_frame_index(self) -> int:
+        if self.frame_interval is not None and self.__started_at is not None:
+            index = int((time.monotonic() - self.__started_at) / self.frame_interval)
+        else:
+            index = self.__index
+
+        return index % len(self.frames) if self.loop else min(index, len(self.frames) - 1)
+
+    def get_frame_name(self) -> str:
+        return self.names[self.get_frame_index()]
+
+    def next_frame(self) -> bool:
+        """
+        Advance to the next frame (only used if frames are not advanced by time)
+        :return: True if a new frame is "on screen", False if replay ended
+        """
+        if not self.loop and self.__index >= len(self.frames) - 1:
+            return False
+
+        self.__index += 1
+        return True
+
+    def rewind(self) -> None:
+        self.__index = 0
+        self.__started_at = None
+
+    def find_windows(self) -> List[Window]:
+        return [self.window]
+
+    def get_window_rect(self, handle: int) -> Optional[Tuple[int, int, int, int]]:
+        if handle != self.window.handle:
+            return None
+
+        return self.window.rect
+
+    def capture(self, region: Tuple[int, int, int, int]) -> ndarray:
+        # Start the clock on the first capture, so time spent loading frames etc. does not skip any frames
+        if self.__started_at is None:
+            self.__started_at = time.monotonic()
+
+        left, top, width, height = region
+        # Translate screen coordinates into client area coordinates
+        left -= self.window.rect[0] + constants.WINDOW_SHADOW_SIZE
+        top -= self.window.rect[1] + constants.WINDOW_TITLE_BAR_HEIGHT
+        # Return a copy, just like an actual screenshot would be
+        return self.frames[self.get_frame_index()][top:top + height, left:left + width].copy()
+
+
+class ReplayInputSink(InputSink):
+    """
+    Records any input instead of sending it, keeping track of a virtual cursor position
+    """
+    events: List[Tuple[float, str, Tuple[Any, ...]]]
+    cursor: Tuple[int, int]
+
+    def __init__(self, cursor: Tuple[int, int] = (0, 0)):
+        self.events = []
+        self.cursor = cursor
+
+    def record(self, event: str, *args: Any) -> None:
+        self.events.append((time.monotonic(), event, args))
+
+    def get_event_counts(self) -> dict:
+        counts = {}
+        for _, event, _ in self.events:
+            counts[event] = counts.get(event, 0) + 1
+
+        return counts
+
+    def clear(self) -> None:
+        self.events = []
+
+    def press_key(self, key_code: int) -> None:
+        self.record('press-key', key_code)
+
+    def release_key(self, key_code: int) -> None:
+        self.record('release-key', key_code)
+
+    def press_key_by_name(self, key: str, presses: int, interval: float) -> None:
+        self.record('press-key-by-name', key, presses)
+
+    def write_text(self, text: str, interval: float) -> None:
+        self.record('write-text', text)
+
+    def mouse_move_to(self, x: int, y: int) -> None:
+        self.cursor = (int(x), int(y))
+        self.record('mouse-move-to', *self.cursor)
+
+    def mouse_move_relative(self, dx: int, dy: int) -> None:
+        self.cursor = (self.cursor[0] + dx, self.cursor[1] + dy)
+        self.record('mouse-move-relative', dx, dy)
+
+    def mouse_click(self) -> None:
+        self.record('mouse-click', *self.cursor)
+
+    def mouse_down_legacy(self) -> None:
+        self.record('mouse-down', *self.cursor)
+
+    def mouse_up_legacy(self) -> None:
+        self.record('mouse-up', *self.cursor)
+
+    def get_cursor_position(self) -> Tuple[int, int]:
+        return self.cursor
+
+    def get_cursor_info(self) -> Tuple[int, int, Tuple[int, int]]:
+        # Report a visible cursor (CURSOR_SHOWING) with a non-zero handle, like Windows does while in menus
+        return 1, 1, self.cursor
+
+    def bring_to_foreground(self, window: Window) -> None:
+        self.record('bring-to-foreground', window.handle)
+
+
+def load_replay_frames(path: str) -> Tuple[List[str], List[ndarray]]:
+    """
+    Load all recorded frames from a folder
+    :param path: path to folder containing PNG and/or NPZ frames
+    :return: file names and RGB pixels of the frames, sorted by file name
+    """
+    paths = sorted(
+        file_path for extension in REPLAY_FRAME_EXTENSIONS
+        for file_path in glob.glob(os.path.join(path, f'*.{extension}'))
+    )
+    if len(paths) == 0:
+        raise FileNotFoundError(f'No replay frames found in {path}')
+
+    names, frames = [], []
+    for file_path in paths:
+        if file_path.endswith('.npz'):
+            with np.load(file_path) as data:
+                pixels = data['pixels']
+        else:
+            with Image.open(file_path) as image:
+                pixels = np.asarray(image.convert('RGB'))
+
+        names.append(os.path.basename(file_path))
+        frames.append(pixels)
+
+    return names, frames
@@ -0,0 +1,139 @@
+import ctypes
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pyautogui
+import win32api
+import win32con
+import win32gui
+import win32process
+from numpy import ndarray
+
+from .base import Window, FrameSource, InputSink
+
+# Remove the top left corner from pyautogui failsafe points
+# (avoid triggering failsafe exception due to mouse moving to top left during spawn)
+del pyautogui.FAILSAFE_POINTS[0]
+
+SendInput = ctypes.windll.user32.SendInput
+# C struct redefinitions
+PUL = ctypes.POINTER(ctypes.c_ulong)
+
+
+class KeyBdInput(ctypes.Structure):
+    _fields_ = [("wVk", ctypes.c_ushort),
+                ("wScan", ctypes.c_ushort),
+                ("dwFlags", ctypes.c_ulong),
+                ("time", ctypes.c_ulong),
+                ("dwExtraInfo", PUL)]
+
+
+class HardwareInput(ctypes.Structure):
+    _fields_ = [("uMsg", ctypes.c_ulong),
+                ("wParamL", ctypes.c_short),
+                ("wParamH", ctypes.c_ushort)]
+
+
+class MouseInput(ctypes.Structure):
+    _fields_ = [("dx", ctypes.c_long),
+                ("dy", ctypes.c_long),
+                ("mouseData", ctypes.c_ulong),
+                ("dwFlags", ctypes.c_ulong),
+                ("time", ctypes.c_ulong),
+                ("dwExtraInfo", PUL)]
+
+
+class Input_I(ctypes.Union):
+    _fields_ = [("ki", KeyBdInput),
+                ("mi", MouseInput),
+                ("hi", HardwareInput)]
+
+
+class Input(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_ulong),
+                ("ii", Input_I)]
+
+
+class WindowsFrameSource(FrameSource):
+    """
+    Finds windows via the Win32 API and captures the screen via GDI (pyautogui)
+    """
+    def find_windows(self) -> List[Window]:
+        windows = []
+        win32gui.EnumWindows(self.window_enumeration_handler, windows)
+        return windows
+
+    @staticmethod
+    def window_enumeration_handler(hwnd: int, top_windows: list):
+        """Add window title and ID to array."""
+        tid, pid = win32process.GetWindowThreadProcessId(hwnd)
+        window = Window(
+            hwnd,
+            win32gui.GetWindowText(hwnd),
+            win32gui.GetWindowRect(hwnd),
+            win32gui.GetClassName(hwnd),
+            pid
+        )
+
+        top_windows.append(window)
+
+    def get_window_rect(self, handle: int) -> Optional[Tuple[int, int, int, int]]:
+        try:
+            return win32gui.GetWindowRect(handle)
+        except win32gui.error:  # PyCharm claims win32gui.error does not exist, but it does
+            return None
+
+    def capture(self, region: Tuple[int, int, int, int]) -> ndarray:
+        return np.asarray(pyautogui.screenshot(region=region))
+
+
+class WindowsInputSink(InputSink):
+    """
+    Sends input via SendInput (keys), legacy mouse_event (relative mouse moves/clicks) and pyautogui
+    """
+    def press_key(self, key_code: int) -> None:
+        extra = ctypes.c_ulong(0)
+        ii_ = Input_I()
+        ii_.ki = KeyBdInput(0, key_code, 0x0008, 0, ctypes.pointer(extra))
+        x = Input(ctypes.c_ulong(1), ii_)
+        SendInput(1, ctypes.pointer(x), ctypes.sizeof(x))
+
+    def release_key(self, key_code: int) -> None:
+        extra = ctypes.c_ulong(0)
+        ii_ = Input_I()
+        ii_.ki = KeyBdInput(0, key_code, 0x0008 | 0x0002, 0, ctypes.pointer(extra))
+        x = Input(ctypes.c_ulong(1), ii_)
+        SendInput(1, ctypes.pointer(x), ctypes.sizeof(x))
+
+    def press_key_by_name(self, key: str, presses: int, interval: float) -> None:
+        pyautogui.press(key, presses=presses, interval=interval)
+
+    def write_text(self, text: str, interval: float) -> None:
+        pyautogui.write(text, interval=interval)
+
+    def mouse_move_to(self, x: int, y: int) -> None:
+        pyautogui.moveTo(x, y)
+
+    # Move mouse using old mouse_event method (relative, by "mickeys)
+    def mouse_move_relative(self, dx: int, dy: int) -> None:
+        win32api.mouse_event(win32con.MOUSEEVENTF_MOVE, dx, dy)
+
+    def mouse_click(self) -> None:
+        pyautogui.leftClick()
+
+    def mouse_down_legacy(self) -> None:
+        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, 0, 0, 0, 0)
+
+    def mouse_up_legacy(self) -> None:
+        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, 0, 0, 0, 0)
+
+    def get_cursor_position(self) -> Tuple[int, int]:
+        x, y = pyautogui.position()
+        return x, y
+
+    def get_cursor_info(self) -> Tuple[int, int, Tuple[int, int]]:
+        return win32gui.GetCursorInfo()
+
+    def bring_to_foreground(self, window: Window) -> None:
+        win32gui.ShowWindow(window.handle, win32con.SW_SHOW)
+        win32gui.SetForegroundWindow(window.handle)
@@ -0,0 +1,287 @@
+import argparse
+import os
+import time
+import tracemalloc
+from typing import Callable, List, Tuple, Dict
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+from BF2AutoSpectator.backend import Backend
+from BF2AutoSpectator.backend.replay import ReplayFrameSource, ReplayInputSink, load_replay_frames
+from BF2AutoSpectator.common import constants
+from BF2AutoSpectator.common.config import Config
+from BF2AutoSpectator.common.histograms import HistogramStore
+from BF2AutoSpectator.common.ocr import OCRResultCache
+from BF2AutoSpectator.common.utility import ImageOperation, apply_image_ops, compile_image_ops, crop_pixels, \
+    calc_cv2_hist, find_window_by_title, init_pytesseract, calc_cv2_hist_delta, to_motion_frame, calc_motion_score
+from BF2AutoSpectator.game import GameInstanceManager
+from BF2AutoSpectator.game.label_matcher import load_label_matcher
+
+OCR_IMAGE_OPS = [
+    (ImageOperation.grayscale, None),
+    (ImageOperation.colorize, {'black': '#000', 'white': '#fff', 'blackpoint': 30, 'whitepoint': 175}),
+    (ImageOperation.invert, None)
+]
+
+# Detectors that only look at the screen (and at most reset the mouse), in the order spectate.run calls them
+DETECTORS = [
+    'is_game_message_visible',
+    'is_in_menu',
+    'is_multiplayer_menu_active',
+    'is_join_internet_menu_active',
+    'is_disconnect_prompt_visible',
+    'is_disconnect_button_visible',
+    'is_play_now_button_visible',
+    'is_connect_to_ip_button_visible',
+    'is_join_game_button_visible',
+    'is_round_end_screen_visible',
+    'is_map_loading',
+    'is_loading_bar_visible',
+    'is_map_briefing_visible',
+    'is_spawn_menu_visible',
+    'is_spawn_point_selectable',
+    'is_suicide_button_visible',
+    'is_scoreboard_visible',
+    'is_default_camera_view_visible'
+]
+
+MOTION_CROP = (168, 0, 168, 0)
+MOTION_LABELS = ['active', 'afk']
+# Min average histogram delta used to detect action before switching to motion scores
+HISTOGRAM_MIN_DELTA = .022
+
+
+def get_hist_crops(resolution: str) -> List[Tuple[int, int, int, int]]:
+    hists = constants.COORDINATES[resolution]['hists']
+    crops = [*hists['teams'], hists['default-camera-view']]
+    for group in ['menu', 'eor', 'spawn-menu', 'scoreboard']:
+        crops.extend(hists[group].values())
+
+    return crops
+
+
+def get_ocr_crops(resolution: str) -> List[Tuple[int, int, int, int]]:
+    return [crop for crops in constants.COORDINATES[resolution]['ocr'].values() for crop in crops]
+
+
+def run_pil_tick(screenshot: Image.Image, hist_crops: list, ocr_crops: list) -> int:
+    """
+    Crop, convert and calculate histograms the way it used to be done (PIL crop copies, RGB to BGR conversions)
+    :return: number of bytes allocated for intermediate images (PIL buffers are not visible to tracemalloc)
+    """
+    allocated = 0
+    for crop in hist_crops:
+        cropped = ImageOps.crop(screenshot, crop)
+        bgr = cv2.cvtColor(np.asarray(cropped), cv2.COLOR_RGB2BGR)
+        cv2.calcHist([bgr], [0], None, [256], [0, 256])
+        allocated += cropped.width * cropped.height * 3 + bgr.nbytes
+
+    for crop in ocr_crops:
+        cropped = ImageOps.crop(screenshot, crop)
+        allocated += cropped.width * cropped.height * 3
+        for operation in OCR_IMAGE_OPS:
+            cropped = apply_image_ops(cropped, [operation])
+            allocated += cropped.width * cropped.height * len(cropped.getbands())
+
+    return allocated
+
+
+def run_array_tick(pixels: np.ndarray, hist_crops: list, ocr_crops: list) -> int:
+    """
+    Crop as views, calculate histograms directly on the views and apply compiled image operations
+    :return: number of bytes allocated for intermediate images
+    """
+    allocated = 0
+    for crop in hist_crops:
+        calc_cv2_hist(crop_pixels(pixels, crop))
+
+    compiled = compile_image_ops(OCR_IMAGE_OPS)
+    for crop in ocr_crops:
+        allocated += compiled.apply(crop_pixels(pixels, crop)).nbytes
+
+    return allocated
+
+
+def measure(label: str, tick: Callable[[], int], iterations: int) -> None:
+    # Warm up (compile/cache image operations etc.)
+    tick()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    image_bytes = 0
+    for _ in range(iterations):
+        image_bytes += tick()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{label}: {elapsed / iterations * 1000:.2f} ms/tick, '
+          f'{image_bytes / iterations / 1024:.0f} KiB of intermediate images/tick, '
+          f'{peak / 1024:.0f} KiB peak traced memory')
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        prog='benchmark-pipeline',
+        description='Compare allocations and timing of the frame processing pipeline against the former PIL pipeline'
+    )
+    parser.add_argument('screenshot', help='Path to a screenshot of the game window client area', type=str)
+    parser.add_argument('--game-res', help='Resolution the screenshot was taken at', choices=['720p', '900p'],
+                        type=str, default='720p')
+    parser.add_argument('--iterations', help='Number of ticks to run per pipeline', type=int, default=50)
+    args = parser.parse_args()
+
+    screenshot = Image.open(args.screenshot).convert('RGB')
+    pixels = np.asarray(screenshot)
+    hist_crops = get_hist_crops(args.game_res)
+    ocr_crops = get_ocr_crops(args.game_res)
+
+    print(f'{len(hist_crops)} histogram regions and {len(ocr_crops)} OCR regions per tick')
+    measure('PIL pipeline', lambda: run_pil_tick(screenshot, hist_crops, ocr_crops), args.iterations)
+    measure('Array pipeline', lambda: run_array_tick(pixels, hist_crops, ocr_crops), args.iterations)
+
+
+def run_detectors():
+    parser = argparse.ArgumentParser(
+        prog='benchmark-detectors',
+        description='Run all detectors against recorded frames (replay backend) and report their latency'
+    )
+    parser.add_argument('frames', help='Path to folder containing a folder of recorded frames (PNG/NPZ) per resolution',
+                        type=str)
+    parser.add_argument('--game-res', help='Resolution the frames were recorded at', choices=['720p', '900p'],
+                        type=str, default='720p')
+    parser.add_argument('--tesseract-path', help='Path to Tesseract install folder', type=str, required=True)
+    parser.add_argument('--histograms', help='Path to histogram store', type=str,
+                        default=os.path.join(Config.ROOT_DIR, 'pickle', 'histograms.bin'))
+    parser.add_argument('--passes', help='Number of passes over all frames', type=int, default=1)
+    parser.add_argument('--no-shared-frame', dest='shared_frame', action='store_false',
+                        help='Let every detector take its own screenshot instead of sharing one frame per tick')
+    parser.add_argument('--no-label-templates', dest='label_templates', action='store_false',
+                        help='Use OCR for all labels instead of matching label templates')
+    parser.add_argument('--no-ocr-cache', dest='ocr_cache', action='store_false',
+                        help='Run every OCR call through the OCR engine instead of caching results')
+    parser.add_argument('--no-detector-cache', dest='detector_cache', action='store_false',
+                        help='Run every detector call instead of caching results while the screen is unchanged')
+    parser.set_defaults(shared_frame=True, label_templates=True, ocr_cache=True, detector_cache=True)
+    args = parser.parse_args()
+
+    frame_source = ReplayFrameSource(args.frames, args.game_res, loop=False)
+    input_sink = ReplayInputSink()
+    Backend().use(frame_source, input_sink)
+
+    Config().set_debug_screenshot(False)
+    init_pytesseract(args.tesseract_path)
+    if not args.ocr_cache:
+        OCRResultCache().configure(0, 0.0)
+    histograms = HistogramStore.load(args.histograms)
+
+    gim = GameInstanceManager('', '', '', args.game_res, histograms)
+    gim.game_window = find_window_by_title(constants.BF2_WINDOW_TITLE, 'BF2')
+    label_matcher = load_label_matcher(Config.ROOT_DIR, args.game_res) if args.label_templates else None
+    if label_matcher is not None:
+        gim.set_label_matcher(label_matcher)
+    if not args.detector_cache:
+        gim.detector_cache.configure(0.0)
+
+    timings: Dict[str, List[float]] = {detector: [] for detector in DETECTORS}
+    for _ in range(args.passes):
+        frame_source.rewind()
+        more = True
+        while more:
+            gim.invalidate_frame()
+            if args.shared_frame:
+                gim.capture_frame()
+
+            positives = []
+            for detector in DETECTORS:
+                started = time.perf_counter()
+                if getattr(gim, detector)():
+                    positives.append(detector)
+                timings[detector].append(time.perf_counter() - started)
+
+            print(f'{frame_source.get_frame_name()}: {", ".join(positives) if len(positives) > 0 else "-"}')
+            more = frame_source.next_frame()
+
+    print(f'{"detector":<32} {"mean ms":>8} {"max ms":>8}')
+    for detector, durations in timings.items():
+        print(f'{detector:<32} {np.mean(durations) * 1000:>8.2f} {np.max(durations) * 1000:>8.2f}')
+    print(f'Total: {sum(np.sum(durations) for durations in timings.values()) / len(timings[DETECTORS[0]]) * 1000:.2f} '
+          f'ms/tick')
+    print(f'Input events: {input_sink.get_event_counts()}')
+    hits, misses = OCRResultCache().get_stats()
+    print(f'OCR cache: {hits} hits, {misses} misses')
+    for detector, (hits, misses) in gim.detector_cache.get_stats().items():
+        print(f'Detector cache ({detector}): {hits} hits, {misses} misses')
+
+
+def calc_histogram_action(frames: List[np.ndarray]) -> float:
+    histograms = [calc_cv2_hist(crop_pixels(frame, MOTION_CROP)) for frame in frames]
+    return float(np.average([
+        calc_cv2_hist_delta(histograms[i], histograms[i + 1]) for i in range(len(histograms) - 1)
+    ]))
+
+
+def calc_motion_action(frames: List[np.ndarray]) -> float:
+    motion_frames = [to_motion_frame(crop_pixels(frame, MOTION_CROP)) for frame in frames]
+    return float(np.average([
+        calc_motion_score(motion_frames[i], motion_frames[i + 1]) for i in range(len(motion_frames) - 1)
+    ]))
+
+
+def find_best_threshold(values: List[float], labels: List[bool]) -> Tuple[float, float]:
+    """
+    Find the threshold that best separates active (value > threshold) from afk clips
+    :return: threshold and accuracy achieved with it
+    """
+    best_threshold, best_accuracy = 0.0, 0.0
+    for threshold in sorted(set(values)):
+        accuracy = np.mean([(value > threshold) == label for value, label in zip(values, labels)])
+        if accuracy > best_accuracy:
+            best_threshold, best_accuracy = threshold, accuracy
+
+    return best_threshold, best_accuracy
+
+
+def run_motion():
+    parser = argparse.ArgumentParser(
+        prog='benchmark-motion',
+        description='Validate AFK detection (histogram deltas vs. motion scores) against a corpus of labelled clips'
+    )
+    parser.add_argument('corpus', help='Path to folder containing "active" and "afk" folders, each containing one '
+                                       'folder of frames (PNG/NPZ, taken .55 seconds apart) per clip', type=str)
+    args = parser.parse_args()
+
+    results: Dict[str, List[Tuple[bool, float, float]]] = {'histogram': [], 'motion': []}
+    labels = []
+    for label in MOTION_LABELS:
+        for clip in sorted(os.listdir(os.path.join(args.corpus, label))):
+            _, frames = load_replay_frames(os.path.join(args.corpus, label, clip))
+            labels.append(label == 'active')
+            for method, calc, threshold in [
+                ('histogram', calc_histogram_action, HISTOGRAM_MIN_DELTA),
+                ('motion', calc_motion_action, constants.MOTION_MIN_SCORE)
+            ]:
+                started = time.perf_counter()
+                value = calc(frames)
+                elapsed = time.perf_counter() - started
+                results[method].append((value > threshold, value, elapsed / (len(frames) - 1)))
+
+            print(f'{label}/{clip}: histogram delta {results["histogram"][-1][1]:.4f}, '
+                  f'motion score {results["motion"][-1][1]:.4f}')
+
+    for method, method_results in results.items():
+        predictions = [prediction for prediction, _, _ in method_results]
+        values = [value for _, value, _ in method_results]
+        skipped_active = sum(1 for prediction, label in zip(predictions, labels) if label and not prediction)
+        broadcast_afk = sum(1 for prediction, label in zip(predictions, labels) if not label and prediction)
+        threshold, accuracy = find_best_threshold(values, labels)
+        print(f'{method}: accuracy {np.mean([p == l for p, l in zip(predictions, labels)]):.2%}, '
+              f'{skipped_active} active clips skipped, {broadcast_afk} afk clips broadcast, '
+              f'{np.mean([elapsed for _, _, elapsed in method_results]) * 1000:.2f} ms/frame pair '
+              f'(best threshold {threshold:.4f} with accuracy {accuracy:.2%})')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,77 @@
+import argparse
+import os
+
+import numpy as np
+
+from BF2AutoSpectator.backend.replay import load_replay_frames
+from BF2AutoSpectator.common import constants
+from BF2AutoSpectator.common.config import Config
+from BF2AutoSpectator.common.utility import crop_pixels, compile_image_ops
+from BF2AutoSpectator.game.label_matcher import LABELS, LabelMatcher, binarize_label_pixels, crop_label_template, \
+    get_label_template_key, get_label_templates_path
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        prog='build-label-templates',
+        description='Build label templates from recorded frames of the game window client area'
+    )
+    parser.add_argument('frames', help='Path to folder containing frames (PNG/NPZ) in which a label is visible, '
+                                       'organized as <region key>/<label>/', type=str)
+    parser.add_argument('--game-res', help='Resolution the frames were recorded at', choices=['720p', '900p'],
+                        type=str, default='720p')
+    parser.add_argument('--output', help='Path to write templates to', type=str)
+    args = parser.parse_args()
+
+    regions = {}
+    templates = {}
+    for (region_key, label), image_ops in LABELS.items():
+        path = os.path.join(args.frames, region_key, label)
+        if not os.path.isdir(path):
+            print(f'No frames for "{label}" ({region_key}), label will be detected using OCR')
+            continue
+
+        _, frames = load_replay_frames(path)
+        crop, = constants.COORDINATES[args.game_res]['ocr'][region_key]
+        compiled = compile_image_ops(image_ops)
+        regions[(region_key, label)] = [compiled.apply(crop_pixels(frame, crop)) for frame in frames]
+
+        # Use the majority of frames to decide which pixels are part of the label (ignores any one-off artifacts)
+        binaries = np.array([binarize_label_pixels(pixels) for pixels in regions[(region_key, label)]])
+        template = crop_label_template(np.where(binaries.mean(axis=0) >= 128, 255, 0).astype(np.uint8))
+        if template is None:
+            print(f'Frames for "{label}" ({region_key}) do not contain any text, skipping label')
+            continue
+
+        templates[(region_key, label)] = template
+        print(f'"{label}" ({region_key}): {len(frames)} frames, template size {template.shape[1]}x{template.shape[0]}')
+
+    # Validate templates against frames of the same label and frames of other labels in the same region
+    matcher = LabelMatcher(args.game_res, templates)
+    for (region_key, label) in templates:
+        positive = min(matcher.match(pixels, region_key, label) for pixels in regions[(region_key, label)])
+        negatives = [
+            matcher.match(pixels, region_key, label)
+            for (other_region_key, other_label), others in regions.items()
+            if other_region_key == region_key and other_label != label
+            for pixels in others
+        ]
+        negative = max(negatives, default=None)
+        print(f'"{label}" ({region_key}): min confidence {positive:.2f}'
+              f'{f", max confidence for other labels {negative:.2f}" if negative is not None else ""}')
+        if positive < constants.LABEL_MATCH_MIN_CONFIDENCE:
+            print(f'Warning: "{label}" ({region_key}) will not be matched in every frame, OCR will be used instead')
+        if negative is not None and negative >= constants.LABEL_MATCH_MIN_CONFIDENCE:
+            print(f'Warning: "{label}" ({region_key}) template also matches other labels')
+
+    output = args.output if args.output is not None else get_label_templates_path(Config.ROOT_DIR, args.game_res)
+    np.savez_compressed(
+        output,
+        resolution=args.game_res,
+        **{get_label_template_key(region_key, label): template for (region_key, label), template in templates.items()}
+    )
+    print(f'Wrote {len(templates)} templates to {output}')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,71 @@
+import argparse
+import os
+
+import numpy as np
+
+from BF2AutoSpectator.backend.replay import load_replay_frames
+from BF2AutoSpectator.common.config import Config
+from BF2AutoSpectator.game.screen_classifier import Screen, get_feature_crops, calc_screen_features, \
+    get_screen_references_path
+
+# Allow references to be this much further away than the furthest nearest neighbour seen during validation
+MAX_DISTANCE_TOLERANCE = 1.25
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        prog='build-screen-references',
+        description='Build screen classifier references from recorded frames of the game window client area'
+    )
+    parser.add_argument('frames', help='Path to folder containing one folder of frames (PNG/NPZ) per screen '
+                                       f'({", ".join(screen.value for screen in Screen)})', type=str)
+    parser.add_argument('--game-res', help='Resolution the frames were recorded at', choices=['720p', '900p'],
+                        type=str, default='720p')
+    parser.add_argument('--output', help='Path to write references to', type=str)
+    args = parser.parse_args()
+
+    crops = get_feature_crops(args.game_res)
+    features, labels = [], []
+    for screen in Screen:
+        path = os.path.join(args.frames, screen.value)
+        if not os.path.isdir(path):
+            print(f'No frames for {screen.value}, screen will never be detected')
+            continue
+
+        _, frames = load_replay_frames(path)
+        features.extend(calc_screen_features(frame, crops) for frame in frames)
+        labels.extend(screen.value for _ in frames)
+        print(f'{screen.value}: {len(frames)} frames')
+
+    features, labels = np.array(features), np.array(labels)
+
+    # Validate references by classifying each frame against all others (leave-one-out)
+    standardized = (features - features.mean(axis=0)) / np.maximum(features.std(axis=0), 1e-3)
+    nearest_distances = []
+    correct = 0
+    for i in range(len(standardized)):
+        distances = np.sqrt(np.mean((standardized - standardized[i]) ** 2, axis=1))
+        distances[i] = np.inf
+        nearest = np.argmin(distances)
+        if labels[nearest] == labels[i]:
+            correct += 1
+            nearest_distances.append(distances[nearest])
+        else:
+            print(f'Frame #{i} ({labels[i]}) is closest to a {labels[nearest]} frame')
+
+    max_distance = max(nearest_distances, default=0.0) * MAX_DISTANCE_TOLERANCE
+    print(f'Leave-one-out accuracy: {correct / len(labels):.2%}, max distance: {max_distance:.4f}')
+
+    output = args.output if args.output is not None else get_screen_references_path(Config.ROOT_DIR, args.game_res)
+    np.savez_compressed(
+        output,
+        features=features.astype(np.float32),
+        labels=labels,
+        resolution=args.game_res,
+        max_distance=max_distance
+    )
+    print(f'Wrote references to {output}')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+import cv2
+
+from BF2AutoSpectator.common.logger import logger
+from BF2AutoSpectator.common.utility import Frame, InputTracker, capture_region
+
+
+class FrameRing:
+    """
+    Bounded, thread-safe buffer of the most recent frames (oldest frames are dropped once full)
+    """
+    __frames: Deque[Frame]
+    __condition: threading.Condition
+
+    def __init__(self, size: int):
+        self.__frames = deque(maxlen=size)
+        self.__condition = threading.Condition()
+
+    def append(self, frame: Frame) -> None:
+        with self.__condition:
+            self.__frames.append(frame)
+            self.__condition.notify_all()
+
+    def clear(self) -> None:
+        with self.__condition:
+            self.__frames.clear()
+
+    def get_frames(self) -> List[Frame]:
+        """
+        Get all buffered frames, which were captured after the last input (older frames may show something else)
+        :return: frames, oldest first
+        """
+        with self.__condition:
+            return [frame for frame in self.__frames if frame.is_valid()]
+
+    def get_spaced_frames(self, count: int, spacing: float) -> Optional[List[Frame]]:
+        """
+        Get the latest frames that were captured at least the given number of seconds apart
+        :param count: number of frames to get
+        :param spacing: minimum number of seconds between two frames
+        :return: frames, oldest first or None if not enough (suitable) frames are buffered
+        """
+        selected = []
+        for frame in reversed(self.get_frames()):
+            if len(selected) == 0 or selected[-1].captured_at - frame.captured_at >= spacing:
+                selected.append(frame)
+            if len(selected) == count:
+                return list(reversed(selected))
+
+        return None
+
+    def wait_for_spaced_frames(self, count: int, spacing: float, timeout: float) -> Optional[List[Frame]]:
+        """
+        Wait until enough frames have been captured (see get_spaced_frames)
+        :param count: number of frames to get
+        :param spacing: minimum number of seconds between two frames
+        :param timeout: max number of seconds to wait for
+        :return: frames, oldest first or None if not enough frames were captured in time
+        """
+        deadline = time.monotonic() + timeout
+        with self.__condition:
+            frames = self.get_spaced_frames(count, spacing)
+            while frames is None and (remaining := deadline - time.monotonic()) > 0:
+                self.__condition.wait(remaining)
+                frames = self.get_spaced_frames(count, spacing)
+
+        return frames
+
+
+class CaptureThread(threading.Thread):
+    """
+    Captures the game window in the background at a fixed rate, keeping a ring of recent downscaled frames
+    (e.g. for motion analysis without having to sleep between screenshots)
+    """
+    rate: float
+    scale: float
+    ring: FrameRing
+
+    __region: Optional[Tuple[int, int, int, int]] = None
+    __stopped: threading.Event
+
+    def __init__(self, rate: float, scale: float, buffer_seconds: float):
+        """
+        :param rate: number of frames to capture per second
+        :param scale: factor to downscale frames by (e.g. .125 to keep 1/8 of the width and height)
+        :param buffer_seconds: number of seconds worth of frames to keep
+        """
+        super().__init__(name='CaptureThread', daemon=True)
+        self.rate = rate
+        self.scale = scale
+        self.ring = FrameRing(max(int(rate * buffer_seconds), 1))
+        self.__stopped = threading.Event()
+
+    def set_region(self, region: Optional[Tuple[int, int, int, int]]) -> None:
+        """
+        Set the screen region to capture, dropping any frames of the previous region
+        :param region: region to capture, format: (left, top, width, height) or None to pause capturing
+        :return:
+        """
+        if region != self.__region:
+            self.__region = region
+            self.ring.clear()
+
+    def stop(self) -> None:
+        self.__stopped.set()
+
+    def run(self) -> None:
+        interval = 1 / self.rate
+        next_capture_at = time.monotonic()
+        while not self.__stopped.wait(max(next_capture_at - time.monotonic(), 0)):
+            next_capture_at += interval
+            # Don't try to catch up on missed captures (e.g. after the system was suspended)
+            if next_capture_at < time.monotonic():
+                next_capture_at = time.monotonic() + interval
+
+            region = self.__region
+            if region is None:
+                continue
+
+            try:
+                self.capture(region)
+            except Exception as e:
+                logger.error(f'Failed to capture frame in background ({e})')
+
+    def capture(self, region: Tuple[int, int, int, int]) -> None:
+        generation = InputTracker().get_generation()
+        pixels = cv2.resize(capture_region(region), None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        frame = Frame(pixels, region, self.scale)
+
+        # Input sent while capturing may or may not be reflected in the frame, so it cannot be attributed to either side
+        if frame.input_generation != generation or region != self.__region:
+            return
+
+        self.ring.append(frame)
@@ -1,3 +1,6 @@
+from enum import Enum
+
+
 class Singleton(type):
     _instances = {}
 
@@ -5,3 +8,18 @@ class Singleton(type):
         if cls not in cls._instances:
             cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
         return cls._instances[cls]
+
+
+class GamePhase(str, Enum):
+    initial = 'initializing'
+    launching = 'launching'
+    inMenu = 'in-menu'
+    loading = 'loading'
+    spawning = 'spawning'
+    spectating = 'spectating'
+    betweenRounds = 'between-rounds'
+    closing = 'closing'
+    starting = 'starting'
+    stopping = 'stopping'
+    stopped = 'stopped'
+    halted = 'halted'
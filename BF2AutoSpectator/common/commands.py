@@ -1,22 +1,91 @@
+import threading
+import time
+from enum import IntEnum
 from typing import Dict, Optional, Union
 
 from BF2AutoSpectator.common.classes import Singleton
+from BF2AutoSpectator.common.logger import logger
+
+
+class CommandPriority(IntEnum):
+    normal = 1
+    high = 2
+
+
+# Commands which change what the spectator should be doing altogether are worth interrupting long waits for
+COMMAND_PRIORITIES: Dict[str, CommandPriority] = {
+    'start': CommandPriority.high,
+    'stop': CommandPriority.high,
+    'release': CommandPriority.high,
+    'game_restart': CommandPriority.high,
+    'join': CommandPriority.high,
+    'rejoin': CommandPriority.high,
+    'rotation_pause': CommandPriority.normal,
+    'rotation_resume': CommandPriority.normal,
+    'next_player': CommandPriority.normal,
+    'respawn': CommandPriority.normal,
+    'debug': CommandPriority.normal
+}
 
 
 class CommandStore(metaclass=Singleton):
     commands: Dict[str, Union[bool, dict]]
+    # Time commands were received at and latencies (time from receiving to popping a command) by command
+    received_at: Dict[str, float]
+    latencies: Dict[str, Dict[str, float]]
+    condition: threading.Condition
 
     def __init__(self):
         self.commands = {}
+        self.received_at = {}
+        self.latencies = {}
+        self.condition = threading.Condition()
 
     def set(self, key: str, value: Union[bool, dict]):
-        self.commands[key] = value
+        with self.condition:
+            self.commands[key] = value
+            self.received_at.setdefault(key, time.monotonic())
+            # Wake up anyone waiting for commands
+            self.condition.notify_all()
 
     def get(self, key: str) -> Optional[Union[bool, dict]]:
         return self.commands.get(key)
 
     def pop(self, key: str) -> Optional[Union[bool, dict]]:
-        if key not in self.commands:
-            return None
+        with self.condition:
+            if key not in self.commands:
+                return None
+
+            self.record_latency(key, time.monotonic() - self.received_at.pop(key))
+            return self.commands.pop(key)
+
+    def has_pending(self, priority: CommandPriority = CommandPriority.normal) -> bool:
+        """
+        Check whether any known command of at least the given priority is waiting to be popped
+        """
+        return any(COMMAND_PRIORITIES.get(key, 0) >= priority for key in self.commands)
+
+    def wait(self, timeout: float, priority: CommandPriority = CommandPriority.normal) -> bool:
+        """
+        Sleep, waking up early if a command is received (use instead of time.sleep in order to act on commands quickly)
+        :param timeout: max number of seconds to sleep for
+        :param priority: min priority of commands to wake up for
+        :return: True if woken up by a command, False if slept for the full timeout
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: self.has_pending(priority), timeout)
+
+    def record_latency(self, key: str, latency: float) -> None:
+        logger.debug(f'Acting on command {key} {latency:.2f}s after receiving it')
+        stats = self.latencies.setdefault(key, {'count': 0, 'mean': 0.0, 'max': 0.0})
+        stats['count'] += 1
+        stats['mean'] += (latency - stats['mean']) / stats['count']
+        stats['max'] = max(stats['max'], latency)
 
-        return self.commands.pop(key)
+    def get_latencies(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get command latencies
+        :return: number of commands acted on, mean and max time (s) from receiving to acting on a command by command
+        """
+        with self.condition:
+            return {key: dict(stats) for key, stats in self.latencies.items()}
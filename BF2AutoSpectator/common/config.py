@@ -1,15 +1,18 @@
 import os
 from datetime import datetime, timedelta
-from typing import Tuple, Optional
+from typing import Tuple, Optional, List
 
 from BF2AutoSpectator.common import constants
 from BF2AutoSpectator.common.classes import Singleton
 
 
 class Config(metaclass=Singleton):
-    ROOT_DIR: str = os.path.dirname(__file__).replace('\\BF2AutoSpectator\\common', '')
+    # Go up from BF2AutoSpectator/common to the folder containing the package (and the pickle/redist folders)
+    ROOT_DIR: str = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     PWD: str = os.getcwd()
     DEBUG_DIR: str = os.path.join(PWD, f'{constants.APP_NAME}-debug')
+    # Anything learned at runtime (ROOT_DIR may be a temporary folder when running as an executable)
+    CACHE_DIR: str = os.path.join(PWD, f'{constants.APP_NAME}-cache')
 
     __player_name: str
     __player_pass: str
@@ -33,6 +36,17 @@ class Config(metaclass=Singleton):
     __resolution: str
     __debug_screenshot: bool
 
+    __background_capture: bool
+    __capture_rate: float
+    __capture_scale: float
+    __capture_buffer: float
+
+    __glyph_ocr_regions: List[str]
+    __ocr_cache_size: int
+    __ocr_cache_ttl: float
+    __ocr_workers: int
+    __detector_cache_ttl: float
+
     __min_iterations_on_player: int
     __max_iterations_on_player: int
     __max_iterations_on_default_camera_view: int
@@ -45,6 +59,9 @@ class Config(metaclass=Singleton):
                     server_mod: str, game_path: str, tesseract_path: str, limit_rtl: bool, instance_rtl: int, map_load_delay: int,
                     use_controller: bool, controller_base_uri: str, control_obs: bool, obs_url: str, obs_source_name: str,
                     resolution: str, debug_screenshot: bool,
+                    background_capture: bool, capture_rate: float, capture_scale: float, capture_buffer: float,
+                    glyph_ocr_regions: List[str], ocr_cache_size: int, ocr_cache_ttl: float, ocr_workers: int,
+                    detector_cache_ttl: float,
                     min_iterations_on_player: int, max_iterations_on_player: int,
                     max_iterations_on_default_camera_view: int, lockup_iterations_on_spawn_menu: int):
         self.__player_name = player_name
@@ -70,6 +87,17 @@ class Config(metaclass=Singleton):
 
         self.__debug_screenshot = debug_screenshot
 
+        self.__background_capture = background_capture
+        self.__capture_rate = capture_rate
+        self.__capture_scale = capture_scale
+        self.__capture_buffer = capture_buffer
+
+        self.__glyph_ocr_regions = glyph_ocr_regions
+        self.__ocr_cache_size = ocr_cache_size
+        self.__ocr_cache_ttl = ocr_cache_ttl
+        self.__ocr_workers = ocr_workers
+        self.__detector_cache_ttl = detector_cache_ttl
+
         self.__min_iterations_on_player = min_iterations_on_player
         self.__max_iterations_on_player = max_iterations_on_player
         self.__max_iterations_on_default_camera_view = max_iterations_on_default_camera_view
@@ -153,6 +181,33 @@ class Config(metaclass=Singleton):
     def set_debug_screenshot(self, debug_screenshot: bool) -> None:
         self.__debug_screenshot = debug_screenshot
 
+    def background_capture(self) -> bool:
+        return self.__background_capture
+
+    def get_capture_rate(self) -> float:
+        return self.__capture_rate
+
+    def get_capture_scale(self) -> float:
+        return self.__capture_scale
+
+    def get_capture_buffer(self) -> float:
+        return self.__capture_buffer
+
+    def get_glyph_ocr_regions(self) -> List[str]:
+        return self.__glyph_ocr_regions
+
+    def get_ocr_cache_size(self) -> int:
+        return self.__ocr_cache_size
+
+    def get_ocr_cache_ttl(self) -> float:
+        return self.__ocr_cache_ttl
+
+    def get_ocr_workers(self) -> int:
+        return self.__ocr_workers
+
+    def get_detector_cache_ttl(self) -> float:
+        return self.__detector_cache_ttl
+
     def get_min_iterations_on_player(self) -> int:
         return self.__min_iterations_on_player
 
@@ -7,7 +7,33 @@ WINDOW_TITLE_BAR_HEIGHT = 31
 WINDOW_SHADOW_SIZE = 8
 HISTCMP_MAX_DELTA = 0.25
 DEFAULT_CAMERA_VIEW_HISTCMP_MAX_DELTA = 0.175
+MAP_IDENTIFICATION_MIN_CONFIDENCE = 0.5
+DEFAULT_CAMERA_VIEW_LEARN_INTERVAL = 1.0
+DEFAULT_CAMERA_VIEW_LEARN_MAX_DELTA = 0.05
+DEFAULT_CAMERA_VIEW_LEARN_MIN_BRIGHTNESS = 10
+# Motion thresholds are calibrated against the synthetic static/AFK/pan/moving object fixtures in tests/test_motion.py
+# (camera movement reduces the aligned error by >= .46, anything else by <= .05; AFK blocks change by < 4, any moving
+# object changes >= 3% of blocks by more than 5). There is no labelled corpus of captured game clips to calibrate
+# against (yet), so compression artifacts, hud elements and lighting of real frames are not accounted for.
+MOTION_SCALE = 0.125
+MOTION_MAX_SHIFT = 4
+MOTION_MIN_SHIFT_GAIN = 0.25
+MOTION_BLOCK_SIZE = 8
+MOTION_BLOCK_MIN_DELTA = 5
+MOTION_MIN_SCORE = 0.02
+LABEL_MATCH_MIN_CONFIDENCE = 0.85
+LABEL_MATCH_MAX_ABSENT_CONFIDENCE = 0.5
+# Text gate thresholds are calibrated against synthetic header renders and generated terrain in
+# tests/test_detector_gate.py (headers keep >= 60% of pixels close to the background value and >= 7% far from it,
+# no terrain crop meets both). There are no captured game message frames to calibrate against (yet). A header with a
+# strong gradient or see-through background would be skipped, so this needs to be verified against real frames.
+DETECTOR_GATE_BACKGROUND_TOLERANCE = 12
+DETECTOR_GATE_MIN_BACKGROUND_SHARE = 0.5
+DETECTOR_GATE_INK_MIN_DISTANCE = 64
+DETECTOR_GATE_MIN_INK_SHARE = 0.03
+MAP_NAME_MIN_SCORE = 0.8
 PLAYER_ROTATION_PAUSE_DURATION = 5
+STATS_LOG_INTERVAL = 300
 TEAMS_SPAWN_MENU_LEFT = ['usmc', 'eu', 'navy-seal', 'sas', 'rebels-left', 'spetsnaz-left', 'peglegs', 'canada-left',
                          'russia-left']
 TEAMS_SPAWN_MENU_RIGHT = ['china', 'mec', 'mec-sf', 'insurgent', 'rebels-right', 'spetsnaz-right', 'undead',
@@ -68,7 +94,8 @@ COORDINATES = {
             'scoreboard': {
                 'table-icons-left': (367, 89, 675, 607),
                 'table-icons-right': (992, 89, 50, 607)
-            }
+            },
+            'default-camera-view': (168, 0, 168, 0)
         }
     },
     '900p': {
@@ -126,7 +153,8 @@ COORDINATES = {
             'scoreboard': {
                 'table-icons-left': (457, 111, 845, 761),
                 'table-icons-right': (1240, 111, 62, 761)
-            }
+            },
+            'default-camera-view': (168, 0, 168, 0)
         }
     },
     # format for spawn coordinates: list(team 0 tuple, team 1 tuple, alternate spawn tuple...)
@@ -0,0 +1,265 @@
+import os
+from typing import List, Optional, Set, Tuple
+
+import cv2
+import numpy as np
+from numpy import ndarray
+
+from BF2AutoSpectator.common.classes import Singleton
+from BF2AutoSpectator.common.logger import logger
+
+GLYPH_SIZE = 12
+# Connected components with fewer pixels are considered noise
+GLYPH_MIN_PIXELS = 2
+# Gaps between glyphs wider than this (relative to median glyph width) are considered spaces
+GLYPH_SPACE_MIN_GAP = .5
+# Glyphs wider than this (relative to median glyph width/line height) may be touching glyphs
+GLYPH_MAX_WIDTH = 1.65
+GLYPH_MAX_ASPECT = 1.3
+# Weight of glyph geometry (size/position in line) relative to the glyph bitmap
+GLYPH_GEOMETRY_WEIGHT = 4.0
+GLYPH_FEATURE_COUNT = GLYPH_SIZE * GLYPH_SIZE + 4
+
+
+def binarize_glyph_pixels(pixels: ndarray) -> ndarray:
+    """
+    Separate text from background (Otsu threshold, text being whatever covers fewer pixels)
+    :param pixels: grayscale or RGB pixels of a single line of text
+    :return: boolean mask, True for text pixels
+    """
+    if pixels.ndim == 3:
+        pixels = cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+    if pixels.min() == pixels.max():
+        return np.zeros(pixels.shape, dtype=bool)
+
+    _, binary = cv2.threshold(np.ascontiguousarray(pixels), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = binary > 0
+    return mask if np.count_nonzero(mask) <= mask.size / 2 else ~mask
+
+
+def segment_glyphs(mask: ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    Find glyphs in a text mask (connected components, merging components stacked on top of each other such as
+    the dot and stem of an "i")
+    :param mask: text mask (see binarize_glyph_pixels)
+    :return: bounding boxes of glyphs, sorted left to right, format: (x, y, width, height)
+    """
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask.astype(np.uint8), connectivity=8)
+    boxes = sorted(
+        (int(x), int(y), int(w), int(h)) for x, y, w, h, area in stats[1:count] if area >= GLYPH_MIN_PIXELS
+    )
+
+    glyphs: List[Tuple[int, int, int, int]] = []
+    for x, y, w, h in boxes:
+        if len(glyphs) > 0:
+            gx, gy, gw, gh = glyphs[-1]
+            overlap = min(gx + gw, x + w) - max(gx, x)
+            if overlap * 2 >= min(gw, w):
+                left, top = min(gx, x), min(gy, y)
+                glyphs[-1] = (left, top, max(gx + gw, x + w) - left, max(gy + gh, y + h) - top)
+                continue
+        glyphs.append((x, y, w, h))
+
+    return glyphs
+
+
+def get_line_metrics(glyphs: List[Tuple[int, int, int, int]]) -> Tuple[int, int, float]:
+    """
+    Get metrics of a line of glyphs
+    :param glyphs: glyphs of the line (see segment_glyphs)
+    :return: top and height of the line, width above which glyphs may be touching glyphs
+    """
+    line_top = min(y for _, y, _, _ in glyphs)
+    line_height = max(y + h for _, y, _, h in glyphs) - line_top
+    max_width = min(np.median([w for _, _, w, _ in glyphs]) * GLYPH_MAX_WIDTH, line_height * GLYPH_MAX_ASPECT)
+
+    return line_top, line_height, max_width
+
+
+def split_glyph(mask: ndarray, glyph: Tuple[int, int, int, int], max_width: float) -> List[Tuple[int, int, int, int]]:
+    """
+    Split a glyph at the column with the fewest text pixels (in its middle half) until no part is wider than max_width
+    """
+    x, y, w, h = glyph
+    if w <= max_width or w < 4:
+        return [glyph]
+
+    columns = np.count_nonzero(mask[y:y + h, x:x + w], axis=0)
+    column = w // 4 + int(np.argmin(columns[w // 4:w - w // 4]))
+    left, right = mask[y:y + h, x:x + column], mask[y:y + h, x + column + 1:x + w]
+
+    parts = []
+    for offset, part in [(x, left), (x + column + 1, right)]:
+        rows, columns = np.nonzero(part)
+        if len(rows) == 0:
+            continue
+        parts.extend(split_glyph(mask, (
+            offset + int(columns.min()),
+            y + int(rows.min()),
+            int(columns.max() - columns.min()) + 1,
+            int(rows.max() - rows.min()) + 1
+        ), max_width))
+
+    return parts
+
+
+def calc_glyph_features(mask: ndarray, glyph: Tuple[int, int, int, int], line_top: int, line_height: int) -> ndarray:
+    """
+    Calculate the feature vector of a glyph: its bitmap scaled to GLYPH_SIZE plus its size and position within the line
+    (to tell apart glyphs that only differ in those, e.g. "." and "-" or "o" and "O")
+    """
+    x, y, w, h = glyph
+    bitmap = cv2.resize(mask[y:y + h, x:x + w].astype(np.float32), (GLYPH_SIZE, GLYPH_SIZE),
+                        interpolation=cv2.INTER_AREA)
+    geometry = np.array([w, h, y - line_top, y + h - line_top], dtype=np.float32) / line_height
+
+    return np.concatenate([bitmap.ravel(), geometry * GLYPH_GEOMETRY_WEIGHT])
+
+
+def extract_glyphs(pixels: ndarray, split: bool = False) -> Tuple[ndarray, List[bool]]:
+    """
+    Segment a single line of text into glyphs
+    :param pixels: grayscale or RGB pixels of a single line of text
+    :param split: whether to split any glyphs that may be touching glyphs
+    :return: glyph features of shape (glyphs, GLYPH_FEATURE_COUNT) and whether each glyph is preceded by a space
+    """
+    mask = binarize_glyph_pixels(pixels)
+    glyphs = segment_glyphs(mask)
+    if len(glyphs) == 0:
+        return np.empty((0, GLYPH_FEATURE_COUNT), dtype=np.float32), []
+
+    line_top, line_height, max_width = get_line_metrics(glyphs)
+    if split:
+        # Only split after determining metrics, parts of touching glyphs should not affect them
+        glyphs = [part for glyph in glyphs for part in split_glyph(mask, glyph, max_width)]
+
+    features = np.array([calc_glyph_features(mask, glyph, line_top, line_height) for glyph in glyphs])
+
+    return features, detect_spaces(glyphs)
+
+
+def detect_spaces(glyphs: List[Tuple[int, int, int, int]]) -> List[bool]:
+    """
+    Determine which glyphs are preceded by a space
+    :param glyphs: glyphs of a line (see segment_glyphs)
+    :return:
+    """
+    # Line height varies with ascenders/descenders, the (median) glyph width is a more stable reference for spaces
+    median_width = np.median([w for _, _, w, _ in glyphs])
+    return [False] + [
+        x - (px + pw) > median_width * GLYPH_SPACE_MIN_GAP
+        for (px, _, pw, _), (x, _, _, _) in zip(glyphs, glyphs[1:])
+    ]
+
+
+class GlyphModel:
+    """
+    Nearest neighbour classifier for glyphs of the (bitmap) BF2 UI font,
+    trained from labelled crops (see train-glyph-ocr)
+    """
+    resolution: str
+    features: ndarray
+    labels: ndarray
+
+    def __init__(self, resolution: str, features: ndarray, labels: ndarray):
+        if features.ndim != 2 or features.shape[1] != GLYPH_FEATURE_COUNT:
+            raise ValueError('Glyph model does not match current feature layout, please retrain it')
+
+        self.resolution = resolution
+        self.features = features.astype(np.float32)
+        self.labels = labels
+
+    @staticmethod
+    def load(path: str, resolution: str) -> 'GlyphModel':
+        with np.load(path) as data:
+            if str(data['resolution']) != resolution:
+                raise ValueError(f'Glyph model is for {data["resolution"]}, not {resolution}')
+            return GlyphModel(resolution, data['features'], data['labels'])
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(path, resolution=self.resolution, features=self.features, labels=self.labels)
+
+    def classify(self, features: ndarray) -> Tuple[List[str], ndarray]:
+        """
+        Classify glyphs
+        :param features: glyph features of shape (glyphs, GLYPH_FEATURE_COUNT)
+        :return: nearest reference glyph and (squared) distance to it for every glyph
+        """
+        # Squared euclidean distances of all glyphs to all references at once
+        distances = (
+            (features ** 2).sum(axis=1)[:, np.newaxis]
+            - 2 * features @ self.features.T
+            + (self.features ** 2).sum(axis=1)[np.newaxis, :]
+        )
+        nearest = np.argmin(distances, axis=1)
+        return [str(label) for label in self.labels[nearest]], distances[np.arange(len(nearest)), nearest]
+
+    def image_to_string(self, pixels: ndarray) -> str:
+        """
+        Extract a single line of text from an image
+        :param pixels: grayscale or RGB pixels
+        :return:
+        """
+        mask = binarize_glyph_pixels(pixels)
+        glyphs = segment_glyphs(mask)
+        if len(glyphs) == 0:
+            return ''
+
+        line_top, line_height, max_width = get_line_metrics(glyphs)
+        chars, distances = self.classify(np.array([
+            calc_glyph_features(mask, glyph, line_top, line_height) for glyph in glyphs
+        ]))
+        spaces = detect_spaces(glyphs)
+
+        text = ''
+        for glyph, char, distance, space in zip(glyphs, chars, distances, spaces):
+            # Wide glyphs can either be wide characters (e.g. "m") or touching glyphs, use whatever matches better
+            parts = split_glyph(mask, glyph, max_width) if glyph[2] > max_width else [glyph]
+            if len(parts) > 1:
+                part_chars, part_distances = self.classify(np.array([
+                    calc_glyph_features(mask, part, line_top, line_height) for part in parts
+                ]))
+                if part_distances.mean() < distance:
+                    char = ''.join(part_chars)
+
+            text += f'{" " if space else ""}{char}'
+
+        return text
+
+
+class GlyphOCR(metaclass=Singleton):
+    """
+    Built-in OCR engine for the BF2 UI font, used instead of Tesseract for the OCR regions it has been enabled for
+    """
+    __model: Optional[GlyphModel] = None
+    __regions: Set[str]
+
+    def __init__(self):
+        self.__regions = set()
+
+    def init(self, model: Optional[GlyphModel], regions: List[str]) -> None:
+        self.__model = model
+        self.__regions = set(regions) if model is not None else set()
+
+    def is_enabled(self, key: Optional[str]) -> bool:
+        return key in self.__regions
+
+    def image_to_string(self, pixels: ndarray) -> str:
+        return self.__model.image_to_string(pixels)
+
+
+def get_glyph_model_path(root_dir: str, resolution: str) -> str:
+    return os.path.join(root_dir, 'pickle', f'glyphs-{resolution}.npz')
+
+
+def load_glyph_model(root_dir: str, resolution: str) -> Optional[GlyphModel]:
+    path = get_glyph_model_path(root_dir, resolution)
+    if not os.path.isfile(path):
+        logger.warning(f'No glyph model found for {resolution}, using Tesseract for all OCR regions')
+        return None
+
+    try:
+        return GlyphModel.load(path, resolution)
+    except (OSError, KeyError, ValueError) as e:
+        logger.error(f'Failed to load glyph model, using Tesseract for all OCR regions ({e})')
+        return None
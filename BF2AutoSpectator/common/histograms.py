@@ -0,0 +1,191 @@
+import hashlib
+import json
+import struct
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy import ndarray
+
+HISTOGRAM_STORE_MAGIC = b'BF2HIST\x00'
+HISTOGRAM_STORE_VERSION = 1
+HISTOGRAM_STORE_ALIGNMENT = 64
+HISTOGRAM_BINS = 256
+
+
+class HistogramStore:
+    """
+    Reference histograms, stored as one contiguous (histograms, bins) matrix per resolution and category (teams, menu,
+    eor, spawn-menu, scoreboard, default-camera-view) plus an index of the histograms' keys. Allows comparing a
+    histogram to all (or a subset of) references of a category at once.
+    """
+    __matrices: Dict[Tuple[str, str], ndarray]
+    __indices: Dict[Tuple[str, str], Dict[str, int]]
+
+    def __init__(self, matrices: Dict[Tuple[str, str], ndarray], keys: Dict[Tuple[str, str], List[str]]):
+        self.__matrices = {}
+        self.__indices = {}
+        for category, matrix in matrices.items():
+            if matrix.ndim != 2 or matrix.shape[1] != HISTOGRAM_BINS or matrix.shape[0] != len(keys[category]):
+                raise ValueError(f'Invalid histogram matrix for {"/".join(category)}: {matrix.shape}')
+            self.__matrices[category] = np.ascontiguousarray(matrix, dtype=np.float32)
+            self.__indices[category] = {key: index for index, key in enumerate(keys[category])}
+
+    def get_categories(self) -> List[Tuple[str, str]]:
+        return list(self.__matrices.keys())
+
+    def get_keys(self, resolution: str, category: str) -> List[str]:
+        return list(self.__indices.get((resolution, category), {}).keys())
+
+    def has(self, resolution: str, category: str, key: str) -> bool:
+        return key in self.__indices.get((resolution, category), {})
+
+    def get(self, resolution: str, category: str, key: str) -> ndarray:
+        """
+        Get a single reference histogram
+        :param resolution: resolution the histogram was taken at
+        :param category: category of the histogram
+        :param key: key of the histogram within the category (e.g. "usmc/active")
+        :return: histogram as (bins, 1) view (same shape as returned by cv2.calcHist)
+        """
+        index = self.__indices[(resolution, category)][key]
+        return self.__matrices[(resolution, category)][index].reshape((HISTOGRAM_BINS, 1))
+
+    def get_matrix(self, resolution: str, category: str, keys: Optional[List[str]] = None) -> ndarray:
+        """
+        Get reference histograms of a category as a matrix
+        :param resolution: resolution the histograms were taken at
+        :param category: category of the histograms
+        :param keys: keys of the histograms to get (all histograms of the category if None)
+        :return: matrix of shape (histograms, bins)
+        """
+        matrix = self.__matrices[(resolution, category)]
+        if keys is None:
+            return matrix
+
+        index = self.__indices[(resolution, category)]
+        return matrix[[index[key] for key in keys]]
+
+    def match(self, resolution: str, category: str, histogram: ndarray, keys: Optional[List[str]] = None) -> ndarray:
+        """
+        Compare a histogram to reference histograms of a category
+        :param resolution: resolution the histograms were taken at
+        :param category: category of the histograms
+        :param histogram: histogram to compare
+        :param keys: keys of the histograms to compare to (all histograms of the category if None)
+        :return: Bhattacharyya distances in the order of the given keys (or the category's keys)
+        """
+        return calc_bhattacharyya_deltas(histogram, self.get_matrix(resolution, category, keys))
+
+    def get_checksum(self) -> str:
+        digest = hashlib.sha256(str(HISTOGRAM_STORE_VERSION).encode())
+        for category in sorted(self.__matrices.keys()):
+            digest.update('/'.join(category).encode())
+            digest.update('\n'.join(self.__indices[category].keys()).encode())
+            digest.update(self.__matrices[category].tobytes())
+
+        return digest.hexdigest()
+
+    def save(self, path: str) -> None:
+        """
+        Write store to disk. Layout: magic, version (uint32), header size (uint32), JSON header (checksum and index of
+        categories and their keys) padded to HISTOGRAM_STORE_ALIGNMENT, followed by all matrices as one float32 block.
+        """
+        index, offset = [], 0
+        for (resolution, category), matrix in self.__matrices.items():
+            index.append({
+                'resolution': resolution,
+                'category': category,
+                'keys': list(self.__indices[(resolution, category)].keys()),
+                'offset': offset
+            })
+            offset += matrix.shape[0]
+
+        header = json.dumps({'checksum': self.get_checksum(), 'index': index}).encode()
+        prefix_size = len(HISTOGRAM_STORE_MAGIC) + 8
+        header += b' ' * (-(prefix_size + len(header)) % HISTOGRAM_STORE_ALIGNMENT)
+
+        with open(path, 'wb') as file:
+            file.write(HISTOGRAM_STORE_MAGIC)
+            file.write(struct.pack('<II', HISTOGRAM_STORE_VERSION, len(header)))
+            file.write(header)
+            for matrix in self.__matrices.values():
+                file.write(matrix.astype('<f4').tobytes())
+
+    @staticmethod
+    def load(path: str) -> 'HistogramStore':
+        """
+        Load store from disk, memory-mapping the histograms (nothing is unpickled/executed)
+        :param path: path to store file
+        :return:
+        """
+        with open(path, 'rb') as file:
+            if file.read(len(HISTOGRAM_STORE_MAGIC)) != HISTOGRAM_STORE_MAGIC:
+                raise ValueError(f'{path} is not a histogram store')
+            version, header_size = struct.unpack('<II', file.read(8))
+            if version != HISTOGRAM_STORE_VERSION:
+                raise ValueError(f'Unsupported histogram store version {version}, expected {HISTOGRAM_STORE_VERSION}')
+            header = json.loads(file.read(header_size))
+
+        data_offset = len(HISTOGRAM_STORE_MAGIC) + 8 + header_size
+        rows = sum(len(entry['keys']) for entry in header['index'])
+        data = np.memmap(path, dtype='<f4', mode='r', offset=data_offset, shape=(rows, HISTOGRAM_BINS))
+
+        matrices, keys = {}, {}
+        for entry in header['index']:
+            category = (entry['resolution'], entry['category'])
+            matrices[category] = data[entry['offset']:entry['offset'] + len(entry['keys'])]
+            keys[category] = entry['keys']
+
+        store = HistogramStore(matrices, keys)
+        if store.get_checksum() != header['checksum']:
+            raise ValueError('Histogram store checksum mismatch, file is corrupted')
+
+        return store
+
+    @staticmethod
+    def from_dict(histograms: dict) -> 'HistogramStore':
+        """
+        Convert the nested histogram dicts formerly stored in histograms.pickle
+        (format: resolution -> category -> [key ->] [active/inactive ->] histogram)
+        :param histograms: nested dicts of histograms
+        :return:
+        """
+        matrices, keys = {}, {}
+        for resolution, categories in histograms.items():
+            for category, entries in categories.items():
+                # Default camera view histograms are nested one level deeper than any other category
+                if category == 'maps':
+                    category, entries = 'default-camera-view', entries['default-camera-view']
+
+                flattened = flatten_histograms(entries)
+                keys[(resolution, category)] = [key for key, _ in flattened]
+                matrices[(resolution, category)] = np.array([histogram.ravel() for _, histogram in flattened])
+
+        return HistogramStore(matrices, keys)
+
+
+def flatten_histograms(entries: dict, prefix: str = '') -> List[Tuple[str, ndarray]]:
+    flattened = []
+    for key, value in entries.items():
+        if isinstance(value, dict):
+            flattened.extend(flatten_histograms(value, f'{prefix}{key}/'))
+        else:
+            flattened.append((f'{prefix}{key}', value))
+
+    return flattened
+
+
+def calc_bhattacharyya_deltas(histogram: ndarray, matrix: ndarray) -> ndarray:
+    """
+    Calculate the Bhattacharyya distance between a histogram and every row of a matrix at once
+    (same results as cv2.compareHist with cv2.HISTCMP_BHATTACHARYYA)
+    :param histogram: histogram of shape (bins,) or (bins, 1)
+    :param matrix: histograms of shape (histograms, bins)
+    :return: distances of shape (histograms,)
+    """
+    histogram = histogram.ravel()
+    products = histogram.sum() * matrix.sum(axis=1, dtype=np.float64)
+    scale = np.where(np.abs(products) > np.finfo(np.float32).eps, 1 / np.sqrt(np.abs(products)), 1.0)
+    coefficients = np.sqrt(matrix * histogram).sum(axis=1, dtype=np.float64)
+
+    return np.sqrt(np.maximum(1 - coefficients * scale, 0))
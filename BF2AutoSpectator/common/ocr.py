@@ -0,0 +1,471 @@
+import ctypes
+import ctypes.util
+import glob
+import hashlib
+import os
+import re
+import shlex
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple, Iterator
+
+import cv2
+import numpy as np
+import pytesseract
+from PIL import Image
+from numpy import ndarray
+
+from BF2AutoSpectator.common import constants
+from BF2AutoSpectator.common.classes import Singleton
+from BF2AutoSpectator.common.logger import logger
+
+# Tesseract CLI assumes 70 dpi for images without resolution information (which is what pytesseract passes to it)
+TESSERACT_SOURCE_RESOLUTION = 70
+TESSERACT_DEFAULT_LANGUAGE = 'eng'
+TESSERACT_DEFAULT_OEM = 3
+TESSERACT_DEFAULT_PSM = 3
+
+# Page segmentation mode for batched OCR (assume a single uniform block of text, one line per crop)
+OCR_BATCH_PSM = 6
+# Rows of background to put between crops when stacking them for batched OCR
+OCR_BATCH_SEPARATOR_HEIGHT = 16
+
+OCR_CACHE_DEFAULT_SIZE = 256
+OCR_CACHE_DEFAULT_TTL = 30.0
+
+TESSERACT_CAPI_SIGNATURES: List[Tuple[str, Optional[type], List[type]]] = [
+    ('TessVersion', ctypes.c_char_p, []),
+    ('TessBaseAPICreate', ctypes.c_void_p, []),
+    ('TessBaseAPIDelete', None, [ctypes.c_void_p]),
+    ('TessBaseAPIInit2', ctypes.c_int, [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]),
+    ('TessBaseAPISetPageSegMode', None, [ctypes.c_void_p, ctypes.c_int]),
+    ('TessBaseAPISetVariable', ctypes.c_int, [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]),
+    ('TessBaseAPISetImage', None, [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                   ctypes.c_int]),
+    ('TessBaseAPISetSourceResolution', None, [ctypes.c_void_p, ctypes.c_int]),
+    ('TessBaseAPIGetUTF8Text', ctypes.c_void_p, [ctypes.c_void_p]),
+    ('TessBaseAPIGetTSVText', ctypes.c_void_p, [ctypes.c_void_p, ctypes.c_int]),
+    ('TessDeleteText', None, [ctypes.c_void_p]),
+    ('TessBaseAPIClear', None, [ctypes.c_void_p]),
+    ('TessBaseAPIEnd', None, [ctypes.c_void_p]),
+]
+
+
+class TesseractConfig:
+    language: str
+    oem: int
+    psm: int
+    variables: Dict[str, str]
+
+    def __init__(self, language: str, oem: int, psm: int, variables: Dict[str, str]):
+        self.language = language
+        self.oem = oem
+        self.psm = psm
+        self.variables = variables
+
+    @staticmethod
+    def parse(ocr_config: str) -> 'TesseractConfig':
+        """
+        Parse a Tesseract CLI style config string
+        :param ocr_config: config/parameters for Tesseract OCR (e.g. "--oem 3 --psm 7 -c tessedit_char_whitelist=0123")
+        :return:
+        """
+        language, oem, psm, variables = TESSERACT_DEFAULT_LANGUAGE, TESSERACT_DEFAULT_OEM, TESSERACT_DEFAULT_PSM, {}
+        args = shlex.split(ocr_config)
+        for index, arg in enumerate(args):
+            if index + 1 >= len(args):
+                break
+            value = args[index + 1]
+            if arg == '--oem':
+                oem = int(value)
+            elif arg == '--psm':
+                psm = int(value)
+            elif arg == '-l':
+                language = value
+            elif arg == '-c' and '=' in value:
+                name, _, var = value.partition('=')
+                variables[name] = var
+
+        return TesseractConfig(language, oem, psm, variables)
+
+
+class TesseractWord:
+    """
+    Word recognized by Tesseract, including its position in the image and the layout element (block/paragraph/line)
+    it is part of
+    """
+    block: int
+    par: int
+    line: int
+    left: int
+    top: int
+    width: int
+    height: int
+    text: str
+
+    def __init__(self, block: int, par: int, line: int, left: int, top: int, width: int, height: int, text: str):
+        self.block = block
+        self.par = par
+        self.line = line
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.text = text
+
+    @staticmethod
+    def parse_tsv(tsv: str) -> List['TesseractWord']:
+        """
+        Parse Tesseract TSV output (columns: level, page, block, paragraph, line, word, left, top, width, height,
+        confidence, text)
+        :param tsv: TSV output
+        :return: recognized (non-empty) words
+        """
+        words = []
+        for row in tsv.splitlines():
+            columns = row.split('\t')
+            # Only word level (5) rows contain text (header row, if any, is skipped as well)
+            if len(columns) < 12 or columns[0] != '5' or columns[11].strip() == '':
+                continue
+            block, par, line = int(columns[2]), int(columns[3]), int(columns[4])
+            left, top, width, height = int(columns[6]), int(columns[7]), int(columns[8]), int(columns[9])
+            words.append(TesseractWord(block, par, line, left, top, width, height, columns[11].strip()))
+
+        return words
+
+
+class TesseractAPI:
+    """
+    Initialized Tesseract engine (wrapper for a TessBaseAPI handle of the Tesseract C API),
+    which avoids starting tesseract.exe and loading the trained data for every OCR call
+    """
+    lib: ctypes.CDLL
+    handle: int
+
+    def __init__(self, lib: ctypes.CDLL, tessdata_path: str, config: TesseractConfig):
+        self.lib = lib
+        self.handle = lib.TessBaseAPICreate()
+
+        if lib.TessBaseAPIInit2(self.handle, tessdata_path.encode(), config.language.encode(), config.oem) != 0:
+            lib.TessBaseAPIDelete(self.handle)
+            raise OSError(f'Failed to initialize Tesseract API with data from {tessdata_path}')
+
+        lib.TessBaseAPISetPageSegMode(self.handle, config.psm)
+        for name, value in config.variables.items():
+            lib.TessBaseAPISetVariable(self.handle, name.encode(), value.encode())
+
+    def image_to_string(self, pixels: ndarray) -> str:
+        return self.recognize(pixels, lambda: self.lib.TessBaseAPIGetUTF8Text(self.handle))
+
+    def image_to_data(self, pixels: ndarray) -> List[TesseractWord]:
+        return TesseractWord.parse_tsv(self.recognize(pixels, lambda: self.lib.TessBaseAPIGetTSVText(self.handle, 0)))
+
+    def recognize(self, pixels: ndarray, get_text: Callable[[], int]) -> str:
+        # Tesseract expects rows to be contiguous, so any (cropped) views need to be copied
+        data = np.ascontiguousarray(pixels)
+        height, width = data.shape[:2]
+        bytes_per_pixel = 1 if data.ndim == 2 else data.shape[2]
+
+        self.lib.TessBaseAPISetImage(
+            self.handle, data.ctypes.data_as(ctypes.c_void_p), width, height, bytes_per_pixel,
+            width * bytes_per_pixel
+        )
+        self.lib.TessBaseAPISetSourceResolution(self.handle, TESSERACT_SOURCE_RESOLUTION)
+        text_ptr = get_text()
+        try:
+            return ctypes.string_at(text_ptr).decode('utf-8', errors='replace') if text_ptr else ''
+        finally:
+            if text_ptr:
+                self.lib.TessDeleteText(text_ptr)
+            self.lib.TessBaseAPIClear(self.handle)
+
+    def end(self) -> None:
+        self.lib.TessBaseAPIEnd(self.handle)
+        self.lib.TessBaseAPIDelete(self.handle)
+
+
+class TesseractEnginePool(metaclass=Singleton):
+    """
+    Keeps initialized Tesseract engines alive, pooled by OCR config string. Falls back to pytesseract
+    (running tesseract.exe for every call) if the Tesseract library cannot be loaded.
+    """
+    __lib: Optional[ctypes.CDLL] = None
+    __tessdata_path: Optional[str] = None
+    __configs: Dict[str, TesseractConfig]
+    __idle: Dict[str, List[TesseractAPI]]
+    __lock: threading.Lock
+
+    def __init__(self):
+        self.__configs = {}
+        self.__idle = {}
+        self.__lock = threading.Lock()
+
+    def init(self, tesseract_path: str) -> bool:
+        """
+        Load the Tesseract library from the given Tesseract install folder
+        :param tesseract_path: path to Tesseract install folder
+        :return: True if the library was loaded, else False (OCR will go through tesseract.exe instead)
+        """
+        self.shutdown()
+
+        try:
+            self.__lib = load_tesseract_library(tesseract_path)
+        except OSError as e:
+            logger.warning(f'Failed to load Tesseract library, falling back to running {constants.TESSERACT_EXE} '
+                           f'per OCR call ({e})')
+            self.__lib = None
+            return False
+
+        self.__tessdata_path = os.path.join(tesseract_path, 'tessdata')
+        logger.debug(f'Loaded Tesseract library (version {self.__lib.TessVersion().decode()})')
+        return True
+
+    def is_available(self) -> bool:
+        return self.__lib is not None
+
+    @contextmanager
+    def engine(self, ocr_config: str) -> Iterator[TesseractAPI]:
+        """
+        Borrow an idle engine initialized with the given config (creating one if none is idle)
+        :param ocr_config: config/parameters for Tesseract OCR
+        :return:
+        """
+        with self.__lock:
+            idle = self.__idle.setdefault(ocr_config, [])
+            engine = idle.pop() if len(idle) > 0 else None
+            config = self.__configs.get(ocr_config)
+            if config is None:
+                config = self.__configs[ocr_config] = TesseractConfig.parse(ocr_config)
+
+        if engine is None:
+            logger.debug(f'Initializing new Tesseract engine for config "{ocr_config}"')
+            engine = TesseractAPI(self.__lib, self.__tessdata_path, config)
+
+        try:
+            yield engine
+        finally:
+            with self.__lock:
+                self.__idle.setdefault(ocr_config, []).append(engine)
+
+    def image_to_string(self, pixels: ndarray, ocr_config: str) -> str:
+        """
+        Extract text from an image
+        :param pixels: grayscale (height, width) or RGB (height, width, 3) pixels
+        :param ocr_config: config/parameters for Tesseract OCR
+        :return:
+        """
+        if not self.is_available():
+            return pytesseract.image_to_string(Image.fromarray(pixels), config=ocr_config)
+
+        try:
+            with self.engine(ocr_config) as engine:
+                return engine.image_to_string(pixels)
+        except OSError as e:
+            logger.error(f'Failed to run OCR via Tesseract library, falling back to {constants.TESSERACT_EXE} ({e})')
+            self.__lib = None
+            return pytesseract.image_to_string(Image.fromarray(pixels), config=ocr_config)
+
+    def image_to_data(self, pixels: ndarray, ocr_config: str) -> List[TesseractWord]:
+        """
+        Extract words and their layout from an image
+        :param pixels: grayscale (height, width) or RGB (height, width, 3) pixels
+        :param ocr_config: config/parameters for Tesseract OCR
+        :return:
+        """
+        if not self.is_available():
+            return TesseractWord.parse_tsv(pytesseract.image_to_data(Image.fromarray(pixels), config=ocr_config))
+
+        try:
+            with self.engine(ocr_config) as engine:
+                return engine.image_to_data(pixels)
+        except OSError as e:
+            logger.error(f'Failed to run OCR via Tesseract library, falling back to {constants.TESSERACT_EXE} ({e})')
+            self.__lib = None
+            return TesseractWord.parse_tsv(pytesseract.image_to_data(Image.fromarray(pixels), config=ocr_config))
+
+    def get_engine_counts(self) -> Dict[str, int]:
+        with self.__lock:
+            return {ocr_config: len(engines) for ocr_config, engines in self.__idle.items()}
+
+    def shutdown(self) -> None:
+        with self.__lock:
+            for engines in self.__idle.values():
+                for engine in engines:
+                    engine.end()
+            self.__idle = {}
+
+
+class OCRResultCache(metaclass=Singleton):
+    """
+    Bounded LRU cache of OCR results, keyed by region, OCR config and a hash of the preprocessed pixels. Since image
+    operations (thresholds etc.) are applied before hashing, unchanged UI elements hash the same from tick to tick,
+    even if the underlying pixels differ slightly.
+    """
+    __entries: 'OrderedDict[Tuple[str, Optional[str], str, Tuple[int, ...], bytes], Tuple[str, float]]'
+    __size: int = OCR_CACHE_DEFAULT_SIZE
+    __ttl: float = OCR_CACHE_DEFAULT_TTL
+    __hits: int = 0
+    __misses: int = 0
+    __lock: threading.Lock
+
+    def __init__(self):
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def configure(self, size: int, ttl: float) -> None:
+        """
+        Configure the cache
+        :param size: max number of results to keep (0 disables the cache)
+        :param ttl: max number of seconds to keep a result for
+        """
+        with self.__lock:
+            self.__size = size
+            self.__ttl = ttl
+            while len(self.__entries) > self.__size:
+                self.__entries.popitem(last=False)
+
+    def get(self, key: Tuple[str, Optional[str], str, Tuple[int, ...], bytes]) -> Optional[str]:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.__ttl:
+                self.__misses += 1
+                return None
+
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+            return entry[0]
+
+    def put(self, key: Tuple[str, Optional[str], str, Tuple[int, ...], bytes], result: str) -> None:
+        with self.__lock:
+            if self.__size <= 0:
+                return
+
+            self.__entries[key] = (result, time.monotonic())
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__size:
+                self.__entries.popitem(last=False)
+
+    def get_stats(self) -> Tuple[int, int]:
+        """
+        Get cache statistics
+        :return: number of hits and misses
+        """
+        with self.__lock:
+            return self.__hits, self.__misses
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            self.__hits = 0
+            self.__misses = 0
+
+
+def get_ocr_cache_key(
+        pixels: ndarray,
+        engine: str,
+        key: Optional[str],
+        ocr_config: str
+) -> Tuple[str, Optional[str], str, Tuple[int, ...], bytes]:
+    """
+    Get the cache key of an OCR call
+    :param pixels: preprocessed pixels that are being run through OCR
+    :param engine: name of the OCR engine used
+    :param key: key of region in coordinates dict the pixels were taken of
+    :param ocr_config: config/parameters for Tesseract OCR
+    :return:
+    """
+    digest = hashlib.blake2b(np.ascontiguousarray(pixels).data, digest_size=16).digest()
+    return engine, key, ocr_config, pixels.shape, digest
+
+
+def get_batch_ocr_config(ocr_config: str) -> str:
+    """
+    Get the config for running multiple (single line) crops through OCR at once
+    :param ocr_config: config/parameters used for individual crops
+    :return:
+    """
+    if re.search(r'--psm \d+', ocr_config) is None:
+        return f'{ocr_config} --psm {OCR_BATCH_PSM}'
+
+    return re.sub(r'--psm \d+', f'--psm {OCR_BATCH_PSM}', ocr_config)
+
+
+def stack_ocr_images(images: List[ndarray]) -> Tuple[ndarray, List[Tuple[int, int]]]:
+    """
+    Stack (single line) images on top of each other, separated by background rows
+    :param images: grayscale or RGB pixels of every image
+    :return: grayscale pixels of the stacked images and the vertical range (top, bottom) of every image
+    """
+    grays = [cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image for image in images]
+    # Use the most common border value as the background (text rarely touches the border of a crop)
+    backgrounds = [
+        int(np.argmax(np.bincount(np.concatenate([gray[0], gray[-1], gray[:, 0], gray[:, -1]]), minlength=256)))
+        for gray in grays
+    ]
+    background = int(np.median(backgrounds))
+
+    width = max(gray.shape[1] for gray in grays)
+    height = sum(gray.shape[0] for gray in grays) + OCR_BATCH_SEPARATOR_HEIGHT * (len(grays) + 1)
+    stacked = np.full((height, width), background, dtype=np.uint8)
+    bands = []
+    top = OCR_BATCH_SEPARATOR_HEIGHT
+    for gray, gray_background in zip(grays, backgrounds):
+        stacked[top:top + gray.shape[0], :] = gray_background
+        stacked[top:top + gray.shape[0], :gray.shape[1]] = gray
+        bands.append((top, top + gray.shape[0]))
+        top += gray.shape[0] + OCR_BATCH_SEPARATOR_HEIGHT
+
+    return stacked, bands
+
+
+def map_words_to_bands(words: List[TesseractWord], bands: List[Tuple[int, int]]) -> Optional[List[str]]:
+    """
+    Map words recognized in stacked images back to the images
+    :param words: words recognized in stacked images
+    :param bands: vertical range (top, bottom) of every image (see stack_ocr_images)
+    :return: text of every image or None if words cannot be mapped unambiguously (layout separation failed)
+    """
+    tolerance = OCR_BATCH_SEPARATOR_HEIGHT // 2
+    results: List[List[TesseractWord]] = [[] for _ in bands]
+    lines: Dict[Tuple[int, int, int], int] = {}
+    for word in words:
+        index = next((
+            index for index, (top, bottom) in enumerate(bands)
+            if word.top >= top - tolerance and word.top + word.height <= bottom + tolerance
+        ), None)
+        # Any word reaching into another image or any line spanning multiple images means Tesseract did not see
+        # the images as separate lines
+        if index is None or lines.setdefault((word.block, word.par, word.line), index) != index:
+            return None
+        results[index].append(word)
+
+    return [' '.join(word.text for word in sorted(result, key=lambda w: w.left)) for result in results]
+
+
+def find_tesseract_library(tesseract_path: str) -> Optional[str]:
+    # Windows installs ship the library as e.g. libtesseract-5.dll next to tesseract.exe
+    candidates = sorted(glob.glob(os.path.join(tesseract_path, 'libtesseract*.dll')), reverse=True)
+    if len(candidates) > 0:
+        return candidates[0]
+
+    return ctypes.util.find_library('tesseract')
+
+
+def load_tesseract_library(tesseract_path: str) -> ctypes.CDLL:
+    path = find_tesseract_library(tesseract_path)
+    if path is None:
+        raise OSError(f'Could not find Tesseract library in {tesseract_path}')
+
+    # Library depends on other libraries (leptonica etc.) shipped in the same folder
+    if hasattr(os, 'add_dll_directory') and os.path.isdir(tesseract_path):
+        os.add_dll_directory(tesseract_path)
+
+    lib = ctypes.CDLL(path)
+    for name, restype, argtypes in TESSERACT_CAPI_SIGNATURES:
+        func = getattr(lib, name)
+        func.restype = restype
+        func.argtypes = argtypes
+
+    return lib
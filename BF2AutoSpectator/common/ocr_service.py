@@ -0,0 +1,141 @@
+import atexit
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from numpy import ndarray
+
+from BF2AutoSpectator.common.classes import Singleton
+from BF2AutoSpectator.common.logger import logger
+
+# Number of frames to keep in shared memory (a slot is only reused once all tasks reading from it are done)
+OCR_SERVICE_SLOTS = 4
+
+# Shared memory of the current worker process (see init_worker)
+_worker_memory: Optional[shared_memory.SharedMemory] = None
+_worker_slot_size: int = 0
+
+
+class OCRService(metaclass=Singleton):
+    """
+    Runs OCR in worker processes. Frames are published once into a ring of shared memory slots, so tasks only need to
+    describe which part of which slot to read (instead of pickling pixels for every task).
+    """
+    __executor: Optional[ProcessPoolExecutor] = None
+    __memory: Optional[shared_memory.SharedMemory] = None
+    __slot_size: int = 0
+    __slot_count: int = 0
+    # Pixels currently held by each slot (to publish the same frame only once) and tasks still reading from it
+    __sources: List[Optional[ndarray]]
+    __futures: List[List[Future]]
+    __next_slot: int = 0
+    __lock: threading.Lock
+
+    def __init__(self):
+        self.__sources = []
+        self.__futures = []
+        self.__lock = threading.Lock()
+
+    def start(self, worker_count: int, slot_size: int, slot_count: int, initializer: Callable, initargs: tuple) -> None:
+        """
+        Start worker processes
+        :param worker_count: number of worker processes
+        :param slot_size: max size of a frame in bytes
+        :param slot_count: number of frames to keep in shared memory
+        :param initializer: function to initialize workers with (called after attaching the shared memory)
+        :param initargs: arguments for initializer
+        """
+        self.stop()
+
+        self.__memory = shared_memory.SharedMemory(create=True, size=slot_size * slot_count)
+        self.__slot_size = slot_size
+        self.__slot_count = slot_count
+        self.__sources = [None] * slot_count
+        self.__futures = [[] for _ in range(slot_count)]
+        self.__executor = ProcessPoolExecutor(
+            max_workers=worker_count,
+            initializer=init_worker,
+            initargs=(self.__memory.name, slot_size, initializer, initargs)
+        )
+        atexit.register(self.stop)
+        logger.debug(f'Started OCR service with {worker_count} workers')
+
+    def is_running(self) -> bool:
+        return self.__executor is not None
+
+    def publish(self, pixels: ndarray) -> Optional[int]:
+        """
+        Copy pixels into a free shared memory slot (unless they have already been published)
+        :param pixels: pixels to publish
+        :return: index of slot holding the pixels or None if pixels do not fit/no slot is free
+        """
+        if pixels.nbytes > self.__slot_size:
+            return None
+
+        with self.__lock:
+            for slot, source in enumerate(self.__sources):
+                if source is pixels:
+                    return slot
+
+            for offset in range(self.__slot_count):
+                slot = (self.__next_slot + offset) % self.__slot_count
+                # Slot can only be reused once all tasks reading from it are done
+                self.__futures[slot] = [future for future in self.__futures[slot] if not future.done()]
+                if len(self.__futures[slot]) == 0:
+                    break
+            else:
+                return None
+
+            view = np.ndarray(pixels.shape, dtype=pixels.dtype, buffer=self.__memory.buf, offset=slot * self.__slot_size)
+            view[:] = pixels
+            self.__sources[slot] = pixels
+            self.__next_slot = (slot + 1) % self.__slot_count
+
+        return slot
+
+    def submit(self, fn: Callable, slot: int, *args) -> Future:
+        """
+        Submit a task reading from a published slot
+        :param fn: function to run in a worker process (needs to be picklable, so a module level function)
+        :param slot: index of slot to read from (passed to fn as first argument)
+        :param args: any further arguments for fn
+        :return:
+        """
+        with self.__lock:
+            future = self.__executor.submit(fn, slot, *args)
+            self.__futures[slot].append(future)
+
+        return future
+
+    def stop(self) -> None:
+        with self.__lock:
+            if self.__executor is not None:
+                self.__executor.shutdown(wait=True, cancel_futures=True)
+                self.__executor = None
+            if self.__memory is not None:
+                self.__memory.close()
+                self.__memory.unlink()
+                self.__memory = None
+            self.__sources = []
+            self.__futures = []
+
+
+def init_worker(memory_name: str, slot_size: int, initializer: Callable, initargs: tuple) -> None:
+    global _worker_memory, _worker_slot_size
+    _worker_memory = shared_memory.SharedMemory(name=memory_name)
+    _worker_slot_size = slot_size
+    initializer(*initargs)
+
+
+def get_shared_pixels(slot: int, shape: Tuple[int, ...]) -> ndarray:
+    """
+    Get (a read-only view of) pixels published to a slot (only available in worker processes)
+    :param slot: index of slot
+    :param shape: shape of published pixels
+    :return:
+    """
+    pixels = np.ndarray(shape, dtype=np.uint8, buffer=_worker_memory.buf, offset=slot * _worker_slot_size)
+    pixels.flags.writeable = False
+    return pixels
@@ -1,87 +1,111 @@
-import ctypes
 import os
 import subprocess
 import time
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from enum import Enum
-from typing import Optional, Tuple, List, Union
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple, List, Union
 
 import cv2
 import jellyfish
 import numpy as np
 import psutil
-import pyautogui
 import pytesseract
-import win32api
-import win32con
-import win32gui
-import win32process
 from PIL import Image, ImageOps
 from numpy import ndarray
 
+from BF2AutoSpectator.backend import Backend, Window
 from BF2AutoSpectator.common import constants
+from BF2AutoSpectator.common.classes import Singleton
 from BF2AutoSpectator.common.config import Config
+from BF2AutoSpectator.common.glyph_ocr import GlyphOCR, load_glyph_model
 from BF2AutoSpectator.common.logger import logger
+from BF2AutoSpectator.common.ocr import TesseractEnginePool, OCRResultCache, get_ocr_cache_key, stack_ocr_images, \
+    map_words_to_bands, get_batch_ocr_config
+from BF2AutoSpectator.common.ocr_service import OCRService, OCR_SERVICE_SLOTS, get_shared_pixels
 
-SendInput = ctypes.windll.user32.SendInput
-# C struct redefinitions
-PUL = ctypes.POINTER(ctypes.c_ulong)
 
+class InputTracker(metaclass=Singleton):
+    """
+    Keeps track of any input sent to the game. Every input increments the generation, which allows anything derived
+    from what was on screen (e.g. a frame snapshot) to detect that the screen may have changed since.
+    """
+    __generation: int = 0
+    __last_input_at: Optional[float] = None
 
-class Window:
-    handle: int
-    title: str
-    rect: Tuple[int, int, int, int]
-    class_name: str
-    pid: int
-
-    def __init__(self, handle: int, title: str, rect: Tuple[int, int, int, int], class_name: str, pid: int):
-        self.handle = handle
-        self.title = title
-        self.rect = rect
-        self.class_name = class_name
-        self.pid = pid
-
-    def get_size(self) -> Tuple[int, int]:
-        # Size on Windows contains the window header and the halo/shadow around the window,
-        # which needs to be subtracted to get the real size
-        left, top, right, bottom = self.rect
-        return right - constants.WINDOW_SHADOW_SIZE - left - constants.WINDOW_SHADOW_SIZE, \
-            bottom - constants.WINDOW_SHADOW_SIZE - top - constants.WINDOW_TITLE_BAR_HEIGHT
-
-
-class KeyBdInput(ctypes.Structure):
-    _fields_ = [("wVk", ctypes.c_ushort),
-                ("wScan", ctypes.c_ushort),
-                ("dwFlags", ctypes.c_ulong),
-                ("time", ctypes.c_ulong),
-                ("dwExtraInfo", PUL)]
-
+    def record(self) -> None:
+        self.__generation += 1
+        self.__last_input_at = time.monotonic()
 
-class HardwareInput(ctypes.Structure):
-    _fields_ = [("uMsg", ctypes.c_ulong),
-                ("wParamL", ctypes.c_short),
-                ("wParamH", ctypes.c_ushort)]
+    def get_generation(self) -> int:
+        return self.__generation
 
+    def get_last_input_at(self) -> Optional[float]:
+        return self.__last_input_at
 
-class MouseInput(ctypes.Structure):
-    _fields_ = [("dx", ctypes.c_long),
-                ("dy", ctypes.c_long),
-                ("mouseData", ctypes.c_ulong),
-                ("dwFlags", ctypes.c_ulong),
-                ("time", ctypes.c_ulong),
-                ("dwExtraInfo", PUL)]
 
+class WaitTracker(metaclass=Singleton):
+    """
+    Keeps track of how long condition waits (see wait_until) actually took, by wait
+    """
+    __waits: Dict[str, int]
+    __timeouts: Dict[str, int]
+    __durations: Dict[str, float]
+    __max_durations: Dict[str, float]
+
+    def __init__(self):
+        self.__waits = {}
+        self.__timeouts = {}
+        self.__durations = {}
+        self.__max_durations = {}
+
+    def record(self, key: str, duration: float, satisfied: bool) -> None:
+        self.__waits[key] = self.__waits.get(key, 0) + 1
+        self.__timeouts[key] = self.__timeouts.get(key, 0) + (0 if satisfied else 1)
+        self.__durations[key] = self.__durations.get(key, 0.0) + duration
+        self.__max_durations[key] = max(self.__max_durations.get(key, 0.0), duration)
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get wait statistics
+        :return: number of waits, number of timed out waits, mean and max duration (s) by wait
+        """
+        return {
+            key: {
+                'waits': waits,
+                'timeouts': self.__timeouts[key],
+                'mean': self.__durations[key] / waits,
+                'max': self.__max_durations[key]
+            }
+            for key, waits in sorted(self.__waits.items())
+        }
+
+
+class Frame:
+    """
+    Snapshot of the game window client area, which can be shared by any number of detectors and crops until input is
+    sent to the game. Downscaled frames (scale < 1) cannot be used in place of screenshots, only for motion analysis.
+    """
+    pixels: ndarray
+    region: Tuple[int, int, int, int]
+    scale: float
+    captured_at: float
+    input_generation: int
 
-class Input_I(ctypes.Union):
-    _fields_ = [("ki", KeyBdInput),
-                ("mi", MouseInput),
-                ("hi", HardwareInput)]
+    def __init__(self, pixels: ndarray, region: Tuple[int, int, int, int], scale: float = 1.0):
+        self.pixels = pixels
+        self.region = region
+        self.scale = scale
+        self.captured_at = time.monotonic()
+        self.input_generation = InputTracker().get_generation()
 
+    def is_valid(self) -> bool:
+        # Any input sent after capturing the frame may have changed what is on screen
+        return self.input_generation == InputTracker().get_generation()
 
-class Input(ctypes.Structure):
-    _fields_ = [("type", ctypes.c_ulong),
-                ("ii", Input_I)]
+    def get_age(self) -> float:
+        return time.monotonic() - self.captured_at
 
 
 class ImageOperation(Enum):
@@ -91,6 +115,35 @@ class ImageOperation(Enum):
     colorize = 4
 
 
+class CompiledImageOperations:
+    """
+    Image operation chain compiled into a single lookup table (plus an optional leading grayscale conversion).
+    All supported operations except grayscale map each channel value independently, so the whole chain can be
+    precomputed for all 256 possible values.
+    """
+    grayscale: bool
+    lut: ndarray
+
+    def __init__(self, grayscale: bool, lut: ndarray):
+        self.grayscale = grayscale
+        self.lut = lut
+
+    def apply(self, pixels: ndarray) -> ndarray:
+        """
+        Apply compiled operations to an RGB image (does not modify the given array, so it is safe to pass views)
+        :param pixels: RGB image as array of shape (height, width, 3)
+        :return: grayscale (height, width) or RGB (height, width, 3) array, matching what the PIL operations return
+        """
+        if self.grayscale:
+            pixels = rgb_to_grayscale(pixels)
+
+        # 1-D table maps every channel the same way, a (256, 3) table maps a grayscale value to an RGB value
+        if self.lut.ndim == 1:
+            return cv2.LUT(pixels, self.lut)
+
+        return self.lut[pixels]
+
+
 def is_running_process(pid: int) -> bool:
     try:
         return psutil.Process(pid=pid).status() == psutil.STATUS_RUNNING
@@ -110,20 +163,39 @@ def kill_process(pid: int) -> bool:
         return False
 
 
+def wait_until(predicate: Callable[[], bool], timeout: float, min_interval: float = .1, key: str = 'wait') -> bool:
+    """
+    Wait for a condition to hold, returning as soon as it does
+    :param predicate: (cheap) check of the condition, called at most every min_interval seconds
+    :param timeout: max number of seconds to wait for
+    :param min_interval: min number of seconds between checks
+    :param key: name of the wait to record the duration under (see WaitTracker)
+    :return: True if condition holds, False if it did not hold before the timeout
+    """
+    started = time.monotonic()
+    while True:
+        checked_at = time.monotonic()
+        satisfied = predicate()
+        if satisfied or checked_at - started >= timeout:
+            break
+        # Always check once more at the timeout
+        time.sleep(max(min(min_interval - (time.monotonic() - checked_at), started + timeout - time.monotonic()), 0))
+
+    duration = time.monotonic() - started
+    WaitTracker().record(key, duration, satisfied)
+    logger.debug(f'Waited {duration:.2f}s for {key} ({"done" if satisfied else "timed out"})')
+
+    return satisfied
+
+
 def press_key(key_code: int) -> None:
-    extra = ctypes.c_ulong(0)
-    ii_ = Input_I()
-    ii_.ki = KeyBdInput(0, key_code, 0x0008, 0, ctypes.pointer(extra))
-    x = Input(ctypes.c_ulong(1), ii_)
-    ctypes.windll.user32.SendInput(1, ctypes.pointer(x), ctypes.sizeof(x))
+    InputTracker().record()
+    Backend().get_input_sink().press_key(key_code)
 
 
 def release_key(key_code: int) -> None:
-    extra = ctypes.c_ulong(0)
-    ii_ = Input_I()
-    ii_.ki = KeyBdInput(0, key_code, 0x0008 | 0x0002, 0, ctypes.pointer(extra))
-    x = Input(ctypes.c_ulong(1), ii_)
-    ctypes.windll.user32.SendInput(1, ctypes.pointer(x), ctypes.sizeof(x))
+    InputTracker().record()
+    Backend().get_input_sink().release_key(key_code)
 
 
 def auto_press_key(key_code: int) -> None:
@@ -132,26 +204,31 @@ def auto_press_key(key_code: int) -> None:
     release_key(key_code)
 
 
-def window_enumeration_handler(hwnd: int, top_windows: list):
-    """Add window title and ID to array."""
-    tid, pid = win32process.GetWindowThreadProcessId(hwnd)
-    window = Window(
-        hwnd,
-        win32gui.GetWindowText(hwnd),
-        win32gui.GetWindowRect(hwnd),
-        win32gui.GetClassName(hwnd),
-        pid
-    )
+def press_key_by_name(key: str, presses: int = 1, interval: float = 0.0) -> None:
+    """
+    Press a key by name
+    :param key: name of the key to press (see pyautogui.KEYBOARD_KEYS)
+    :param presses: number of times to press the key
+    :param interval: seconds to wait between presses
+    :return:
+    """
+    InputTracker().record()
+    Backend().get_input_sink().press_key_by_name(key, presses, interval)
 
-    top_windows.append(window)
+
+def write_text(text: str, interval: float = 0.0) -> None:
+    """
+    Type out a string
+    :param text: text to type
+    :param interval: seconds to wait between characters
+    :return:
+    """
+    InputTracker().record()
+    Backend().get_input_sink().write_text(text, interval)
 
 
 def find_window_by_title(search_title: str, search_class: str = None) -> Optional[Window]:
-    # Reset top windows array
-    top_windows = []
-
-    # Call window enumeration handler
-    win32gui.EnumWindows(window_enumeration_handler, top_windows)
+    top_windows = Backend().get_frame_source().find_windows()
     found_window = None
     for window in top_windows:
         if search_title in window.title and \
@@ -163,7 +240,8 @@ def find_window_by_title(search_title: str, search_class: str = None) -> Optiona
 
 # Move mouse using old mouse_event method (relative, by "mickeys)
 def mouse_move_legacy(dx: int, dy: int) -> None:
-    win32api.mouse_event(win32con.MOUSEEVENTF_MOVE, dx, dy)
+    InputTracker().record()
+    Backend().get_input_sink().mouse_move_relative(dx, dy)
     time.sleep(.08)
 
 
@@ -173,14 +251,15 @@ def mouse_move_to_game_window_coord(game_window: Window, resolution: str, key: s
     :param game_window: Game window to move mouse in/on
     :param resolution: resolution to get/use coordinates for
     :param key: key of click target in coordinates dict
-    :param legacy: whether to use legacy mouse move instead of pyautogui move
+    :param legacy: whether to use legacy (relative) mouse move instead of absolute move
     :return:
     """
+    InputTracker().record()
     if legacy:
         mouse_move_legacy(constants.COORDINATES[resolution]['clicks'][key][0],
                           constants.COORDINATES[resolution]['clicks'][key][1])
     else:
-        pyautogui.moveTo(
+        Backend().get_input_sink().mouse_move_to(
             game_window.rect[0] + constants.COORDINATES[resolution]['clicks'][key][0],
             game_window.rect[1] + constants.COORDINATES[resolution]['clicks'][key][1]
         )
@@ -188,13 +267,14 @@ def mouse_move_to_game_window_coord(game_window: Window, resolution: str, key: s
 
 def is_cursor_on_game_window(game_window: Window) -> bool:
     # https://learn.microsoft.com/en-us/windows/win32/api/winuser/ns-winuser-cursorinfo
-    flags, handle, (px, py) = win32gui.GetCursorInfo()
+    flags, handle, (px, py) = Backend().get_input_sink().get_cursor_info()
     # Get current (!) game window rectangle
-    try:
-        left, top, right, bottom = win32gui.GetWindowRect(game_window.handle)
-    except win32gui.error:  # PyCharm claims win32gui.error does not exist, but it does
+    rect = Backend().get_frame_source().get_window_rect(game_window.handle)
+    if rect is None:
         return False
 
+    left, top, right, bottom = rect
+
     """
     Allow cursor to only be within the actual window "body", ignore the title bar and the shadow around it. If the game 
     is currently not in the menu (meaning we are controlling the mouse movement by mickeys), the cursor position is of
@@ -213,75 +293,275 @@ def mouse_click_in_game_window(game_window: Window, legacy: bool = False) -> Non
         logger.warning(f'Mouse cursor is not on game window, ignoring mouse click')
         return
 
+    InputTracker().record()
     if legacy:
         mouse_click_legacy()
     else:
-        pyautogui.leftClick()
+        Backend().get_input_sink().mouse_click()
 
 
 # Mouse click using old mouse_event method
 def mouse_click_legacy() -> None:
-    win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, 0, 0, 0, 0)
+    InputTracker().record()
+    input_sink = Backend().get_input_sink()
+    input_sink.mouse_down_legacy()
     time.sleep(.08)
-    win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, 0, 0, 0, 0)
+    input_sink.mouse_up_legacy()
 
 
 def mouse_reset_legacy() -> None:
-    win32api.mouse_event(win32con.MOUSEEVENTF_MOVE, -10000, -10000)
+    InputTracker().record()
+    Backend().get_input_sink().mouse_move_relative(-10000, -10000)
     time.sleep(.2)
 
 
 def mouse_reset(game_window: Window) -> None:
     """
-    Reset mouse cursor to the center of the game window (via pyautogui)
+    Reset mouse cursor to the center of the game window
     :param game_window: Game window to move mouse in/on
     :return:
     """
     left, top, right, bottom = game_window.rect
-    pyautogui.moveTo((right - left)/2 + left, (bottom - top - 40)/2 + top)
+    x, y = (right - left)/2 + left, (bottom - top - 40)/2 + top
+    # Detectors reset the mouse before almost every check, so only treat this as input if the cursor actually moves
+    input_sink = Backend().get_input_sink()
+    if input_sink.get_cursor_position() == (int(x), int(y)):
+        return
+
+    InputTracker().record()
+    input_sink.mouse_move_to(x, y)
+
+
+def get_game_window_region(game_window: Window) -> Tuple[int, int, int, int]:
+    """
+    Get the region of the game window's client area (without title bar and shadow)
+    :param game_window: game window to get region of
+    :return: region, format: (left, top, width, height)
+    """
+    left, top, right, bottom = game_window.rect
+    return (
+        left + constants.WINDOW_SHADOW_SIZE,
+        top + constants.WINDOW_TITLE_BAR_HEIGHT,
+        right - constants.WINDOW_SHADOW_SIZE - left - constants.WINDOW_SHADOW_SIZE,
+        bottom - constants.WINDOW_SHADOW_SIZE - top - constants.WINDOW_TITLE_BAR_HEIGHT
+    )
+
+
+def capture_game_window_frame(game_window: Window) -> Frame:
+    """
+    Take a screenshot of the game window's client area to be shared by multiple detectors
+    :param game_window: game window to take screenshot of
+    :return:
+    """
+    region = get_game_window_region(game_window)
+    return Frame(capture_region(region), region)
+
+
+def capture_region(region: Tuple[int, int, int, int]) -> ndarray:
+    """
+    Take a screenshot of the specified screen region (using the backend's frame source)
+    :param region: region to take screenshot of, format: (left, top, width, height)
+    :return: RGB pixels as array of shape (height, width, 3)
+    """
+    return Backend().get_frame_source().capture(region)
+
+
+def crop_pixels(pixels: ndarray, crop: Tuple[int, int, int, int]) -> ndarray:
+    """
+    Crop pixels without copying them (same semantics as ImageOps.crop, but returns a view of the given array)
+    :param pixels: pixels to crop
+    :param crop: crop tuple, format: (left, top, right, bottom), each being the number of pixels to remove on that side
+    :return:
+    """
+    left, top, right, bottom = crop
+    height, width = pixels.shape[:2]
+    return pixels[top:height - bottom, left:width - right]
+
+
+def scale_crop(crop: Tuple[int, int, int, int], scale: float) -> Tuple[int, int, int, int]:
+    """
+    Scale a crop to be used on a downscaled frame
+    :param crop: crop tuple, format: (left, top, right, bottom)
+    :param scale: factor the frame was scaled by
+    :return:
+    """
+    left, top, right, bottom = crop
+    return round(left * scale), round(top * scale), round(right * scale), round(bottom * scale)
+
+
+def bound_crops(
+        region: Tuple[int, int, int, int],
+        crops: List[Tuple[int, int, int, int]]
+) -> Tuple[Tuple[int, int, int, int], List[Tuple[int, int, int, int]]]:
+    """
+    Determine the smallest region containing all crops and translate the crops to be relative to that region
+    :param region: region the crops are relative to, format: (left, top, width, height)
+    :param crops: List of image crop tuples, format: (left, top, right, bottom)
+    :return: bounding region, format: (left, top, width, height) and translated crops
+    """
+    region_left, region_top, width, height = region
+    # Turn crops (pixels to remove from each side) into boxes, format: (left, top, right, bottom)
+    boxes = [(left, top, width - right, height - bottom) for left, top, right, bottom in crops]
+    bound_left = max(min(box[0] for box in boxes), 0)
+    bound_top = max(min(box[1] for box in boxes), 0)
+    bound_right = min(max(box[2] for box in boxes), width)
+    bound_bottom = min(max(box[3] for box in boxes), height)
+
+    translated = [
+        (left - bound_left, top - bound_top, bound_right - right, bound_bottom - bottom)
+        for left, top, right, bottom in boxes
+    ]
+
+    return (
+        region_left + bound_left,
+        region_top + bound_top,
+        bound_right - bound_left,
+        bound_bottom - bound_top
+    ), translated
+
+
+def rgb_to_grayscale(pixels: ndarray) -> ndarray:
+    """
+    Convert RGB to grayscale the same way PIL does (ITU-R 601-2 luma transform in 16-bit fixed point), so results are
+    identical to Image.convert('L')
+    :param pixels: RGB image as array of shape (height, width, 3)
+    :return:
+    """
+    return ((pixels @ np.array([19595, 38470, 7471], dtype=np.uint32) + 0x8000) >> 16).astype(np.uint8)
+
+
+def apply_image_ops(
+        image: Image.Image,
+        image_ops: List[Tuple[ImageOperation, Optional[dict]]]
+) -> Image.Image:
+    for operation in image_ops:
+        method, args = operation
+        if method is ImageOperation.invert:
+            image = ImageOps.invert(image)
+        elif method is ImageOperation.solarize:
+            image = ImageOps.solarize(image, **(args if args is not None else {}))
+        elif method is ImageOperation.grayscale:
+            image = ImageOps.grayscale(image)
+        elif method is ImageOperation.colorize:
+            image = ImageOps.colorize(image, **(args if args is not None else {}))
+
+    return image
+
+
+def compile_image_ops(
+        image_ops: List[Tuple[ImageOperation, Optional[dict]]]
+) -> Optional[CompiledImageOperations]:
+    """
+    Compile a chain of image operations into a single lookup table (cached, since the same chains are used over and
+    over again)
+    :param image_ops: List of image operation tuples, format: (operation, arguments)
+    :return: compiled operations or None if chain cannot be compiled (grayscale conversion after other operations)
+    """
+    key = tuple(
+        (method, tuple(sorted(args.items())) if args is not None else None) for method, args in image_ops
+    )
+    return _compile_image_ops(key)
+
+
+@lru_cache(maxsize=None)
+def _compile_image_ops(
+        key: Tuple[Tuple[ImageOperation, Optional[Tuple[Tuple[str, object], ...]]], ...]
+) -> Optional[CompiledImageOperations]:
+    image_ops = [(method, dict(args) if args is not None else None) for method, args in key]
+    grayscale = len(image_ops) > 0 and image_ops[0][0] is ImageOperation.grayscale
+    if grayscale:
+        image_ops = image_ops[1:]
+
+    # Grayscale conversion mixes channels, so it can only be done upfront
+    if any(method is ImageOperation.grayscale for method, args in image_ops):
+        return None
+
+    # Run the PIL operations on a ramp of all possible values, which results in bit-identical tables
+    ramp = np.arange(256, dtype=np.uint8).reshape((1, 256))
+    if grayscale:
+        ramp_image = Image.fromarray(ramp)
+    else:
+        ramp_image = Image.fromarray(np.repeat(ramp[..., np.newaxis], 3, axis=2))
+
+    try:
+        mapped = np.asarray(apply_image_ops(ramp_image, image_ops))[0]
+    except (AssertionError, ValueError) as e:
+        logger.error(f'Failed to compile image operations ({e})')
+        return None
+
+    if mapped.ndim == 1:
+        lut = mapped
+    elif not grayscale and (mapped == mapped[:, :1]).all():
+        # Operations treated all channels the same way, so one table can be used for every channel
+        lut = mapped[:, 0]
+    elif grayscale:
+        lut = mapped
+    else:
+        return None
+
+    return CompiledImageOperations(grayscale, np.ascontiguousarray(lut))
+
+
+def capture_crops_source(
+        region: Tuple[int, int, int, int],
+        crops: Optional[List[Tuple[int, int, int, int]]] = None,
+        frame: Optional[Frame] = None
+) -> Tuple[ndarray, Optional[List[Tuple[int, int, int, int]]]]:
+    """
+    Get the pixels crops of a region need to be taken from (reusing the frame if possible)
+    :param region: region to take screenshot of, format: (left, top, width, height)
+    :param crops: List of image crop tuples, format: (left, top, right, bottom)
+    :param frame: frame snapshot to use instead of taking a new screenshot (ignored if no longer valid)
+    :return: screenshot and crops relative to it
+    """
+    if frame is not None and frame.is_valid() and frame.region == region and frame.scale == 1.0:
+        return frame.pixels, crops
+    elif crops is not None:
+        # Without a frame to reuse, only capture the part of the region that is actually needed
+        bounding_region, crops = bound_crops(region, crops)
+        return capture_region(bounding_region), crops
+    else:
+        return capture_region(region), crops
 
 
 def screenshot_region(
         region: Tuple[int, int, int, int],
         image_ops: Optional[List[Tuple[ImageOperation, Optional[dict]]]] = None,
         crops: Optional[List[Tuple[int, int, int, int]]] = None,
-        show: bool = False
-) -> Tuple[Union[Image.Image, List[Image.Image]], Image.Image]:
+        show: bool = False,
+        frame: Optional[Frame] = None
+) -> Tuple[Union[ndarray, List[ndarray]], ndarray]:
     """
-    Take a screenshot of the specified screen region (wrapper for pyautogui.screenshot)
+    Take a screenshot of the specified screen region
     :param region: region to take screenshot of, format: (left, top, width, height)
     :param image_ops: List of image operation tuples, format: (operation, arguments)
     :param crops: List of image crop tuples, format: (left, top, right, bottom)
     :param show: whether to show the screenshot
-    :return:
+    :param frame: frame snapshot to use instead of taking a new screenshot (ignored if no longer valid)
+    :return: cropped pixels (views of the screenshot unless any image operations were applied) and the screenshot
+    (only covering the bounding box of all crops unless taken from a frame)
     """
-    screenshot = pyautogui.screenshot(region=region)
-    results: List[Image.Image] = []
+    screenshot, crops = capture_crops_source(region, crops, frame)
+    compiled = compile_image_ops(image_ops) if image_ops is not None else None
+    results: List[ndarray] = []
     # Apply zero-crop if no crops have been given, since we should not modify the original screenshot
     for crop in crops if crops is not None else [(0, 0, 0, 0)]:
-        cropped = ImageOps.crop(screenshot, crop)
-
-        if image_ops is not None:
-            for operation in image_ops:
-                method, args = operation
-                if method is ImageOperation.invert:
-                    cropped = ImageOps.invert(cropped)
-                elif method is ImageOperation.solarize:
-                    cropped = ImageOps.solarize(cropped, **(args if args is not None else {}))
-                elif method is ImageOperation.grayscale:
-                    cropped = ImageOps.grayscale(cropped)
-                elif method is ImageOperation.colorize:
-                    cropped = ImageOps.colorize(cropped, **(args if args is not None else {}))
+        cropped = crop_pixels(screenshot, crop)
+
+        if compiled is not None:
+            cropped = compiled.apply(cropped)
+        elif image_ops is not None:
+            cropped = np.asarray(apply_image_ops(Image.fromarray(cropped), image_ops))
 
         if show:
-            cropped.show()
+            Image.fromarray(cropped).show()
 
         # Save screenshot to debug directory if debugging is enabled
         config = Config()
         if config.debug_screenshot():
             # Save screenshot
             try:
-                cropped.save(
+                Image.fromarray(cropped).save(
                     os.path.join(
                         Config.DEBUG_DIR,
                         f'screenshot-{datetime.now().strftime("%Y-%m-%d-%H-%M-%S-%f")}.jpg'
@@ -300,43 +580,49 @@ def screenshot_game_window_region(
         game_window: Window,
         image_ops: Optional[List[Tuple[ImageOperation, Optional[dict]]]] = None,
         crops: Optional[List[Tuple[int, int, int, int]]] = None,
-        show: bool = False
-) -> Tuple[Union[Image.Image, List[Image.Image]], Image.Image]:
+        show: bool = False,
+        frame: Optional[Frame] = None
+) -> Tuple[Union[ndarray, List[ndarray]], ndarray]:
     """
     Take a screenshot of the specified game window region
     :param game_window: game window to take screenshot of
     :param image_ops: List of image operation tuples, format: (operation, arguments)
     :param crops: List of image crop tuples, format: (left, top, right, bottom)
     :param show: whether to show the screenshot
+    :param frame: frame snapshot to use instead of taking a new screenshot (ignored if no longer valid)
     :return:
     """
-    left, top, right, bottom = game_window.rect
-    return screenshot_region(
-        (
-            left + constants.WINDOW_SHADOW_SIZE,
-            top + constants.WINDOW_TITLE_BAR_HEIGHT,
-            right - constants.WINDOW_SHADOW_SIZE - left - constants.WINDOW_SHADOW_SIZE,
-            bottom - constants.WINDOW_SHADOW_SIZE - top - constants.WINDOW_TITLE_BAR_HEIGHT
-        ),
-        image_ops, crops, show
-    )
+    return screenshot_region(get_game_window_region(game_window), image_ops, crops, show, frame)
 
 
 def init_pytesseract(tesseract_path: str) -> None:
+    # Keep tesseract.exe configured as a fallback in case the Tesseract library cannot be used
     pytesseract.pytesseract.tesseract_cmd = os.path.join(tesseract_path, constants.TESSERACT_EXE)
+    TesseractEnginePool().init(tesseract_path)
 
 
-def image_to_string(image: Image, ocr_config: str) -> str:
+def image_to_string(image: ndarray, ocr_config: str, key: Optional[str] = None) -> str:
     """
-    Extract text from an image (wrapper for pytesseract.image_to_string)
-    :param image: PIL image to extract text from
+    Extract text from an image (using a pooled Tesseract engine, see TesseractEnginePool,
+    or the glyph OCR engine if it has been enabled for the region, see GlyphOCR)
+    :param image: pixels to extract text from (grayscale or RGB)
     :param ocr_config: config/parameters for Tesseract OCR (see https://guides.nyu.edu/tesseract/usage)
+    :param key: key of region in coordinates dict the image was taken of
     :return:
     """
-    # pytesseract stopped stripping \n\x0c from ocr results,
-    # returning raw results instead (https://github.com/madmaze/pytesseract/issues/297)
-    # so strip those characters as well as spaces after getting the result
-    ocr_result = pytesseract.image_to_string(image, config=ocr_config).strip(' \n\x0c')
+    engine = 'glyph' if GlyphOCR().is_enabled(key) else 'tesseract'
+    # Don't run OCR again for unchanged regions (e.g. while idling in the menu or on the round end screen)
+    cache_key = get_ocr_cache_key(image, engine, key, ocr_config)
+    ocr_result = OCRResultCache().get(cache_key)
+    if ocr_result is None:
+        if engine == 'glyph':
+            ocr_result = GlyphOCR().image_to_string(image)
+        else:
+            # pytesseract stopped stripping \n\x0c from ocr results,
+            # returning raw results instead (https://github.com/madmaze/pytesseract/issues/297)
+            # so strip those characters as well as spaces after getting the result
+            ocr_result = TesseractEnginePool().image_to_string(image, ocr_config).strip(' \n\x0c')
+        OCRResultCache().put(cache_key, ocr_result)
 
     # Print ocr result if debugging is enabled
     config = Config()
@@ -346,21 +632,153 @@ def image_to_string(image: Image, ocr_config: str) -> str:
     return ocr_result.lower()
 
 
+def batch_image_to_string(images: List[ndarray], ocr_config: str, key: Optional[str] = None) -> Optional[List[str]]:
+    """
+    Extract text from multiple single line images in a single Tesseract pass over all images stacked on top of each
+    other (instead of one pass per image)
+    :param images: pixels to extract text from (grayscale or RGB)
+    :param ocr_config: config/parameters for Tesseract OCR (as used for individual images)
+    :param key: key of region in coordinates dict the images were taken of
+    :return: text of every image or None if text could not be mapped back to images
+    """
+    cache_keys = [get_ocr_cache_key(image, 'tesseract', key, ocr_config) for image in images]
+    ocr_results = [OCRResultCache().get(cache_key) for cache_key in cache_keys]
+    missing = [index for index, ocr_result in enumerate(ocr_results) if ocr_result is None]
+    if len(missing) > 0:
+        stacked, bands = stack_ocr_images([images[index] for index in missing])
+        words = TesseractEnginePool().image_to_data(stacked, get_batch_ocr_config(ocr_config))
+        batch_results = map_words_to_bands(words, bands)
+        if batch_results is None:
+            return None
+
+        for index, batch_result in zip(missing, batch_results):
+            ocr_results[index] = batch_result
+            OCRResultCache().put(cache_keys[index], batch_result)
+
+    # Print ocr results if debugging is enabled
+    config = Config()
+    if config.debug_screenshot():
+        logger.debug(f'OCR results: {ocr_results}')
+
+    return [ocr_result.lower() for ocr_result in ocr_results]
+
+
+def start_ocr_service(worker_count: int) -> None:
+    """
+    Start OCR worker processes, initialized with the current OCR config (Tesseract, glyph OCR and result cache)
+    :param worker_count: number of worker processes
+    :return:
+    """
+    config = Config()
+    width, height = get_resolution_window_size(config.get_resolution())
+    OCRService().start(
+        worker_count,
+        width * height * 3,
+        OCR_SERVICE_SLOTS,
+        init_ocr_worker,
+        (
+            config.get_tesseract_path(),
+            config.get_resolution(),
+            config.get_glyph_ocr_regions(),
+            config.get_ocr_cache_size(),
+            config.get_ocr_cache_ttl(),
+            config.debug_screenshot()
+        )
+    )
+
+
+def init_ocr_worker(
+        tesseract_path: str, resolution: str, glyph_ocr_regions: List[str],
+        ocr_cache_size: int, ocr_cache_ttl: float, debug_screenshot: bool
+) -> None:
+    init_pytesseract(tesseract_path)
+    OCRResultCache().configure(ocr_cache_size, ocr_cache_ttl)
+    if len(glyph_ocr_regions) > 0:
+        GlyphOCR().init(load_glyph_model(Config.ROOT_DIR, resolution), glyph_ocr_regions)
+    Config().set_debug_screenshot(debug_screenshot)
+
+
+def run_ocr_task(
+        slot: int, shape: Tuple[int, ...], crop: Tuple[int, int, int, int],
+        image_ops: Optional[List[Tuple[ImageOperation, Optional[dict]]]], ocr_config: str, key: Optional[str]
+) -> str:
+    """
+    Run a crop of a frame published to the OCR service through OCR (in an OCR worker process)
+    :param slot: index of slot the frame was published to
+    :param shape: shape of the frame
+    :param crop: image crop tuple, format: (left, top, right, bottom)
+    :param image_ops: List of image operation tuples, format: (operation, arguments)
+    :param ocr_config: config/parameters for Tesseract OCR (see https://guides.nyu.edu/tesseract/usage)
+    :param key: key of region in coordinates dict the crop was taken of
+    :return:
+    """
+    cropped = crop_pixels(get_shared_pixels(slot, shape), crop)
+    compiled = compile_image_ops(image_ops) if image_ops is not None else None
+    if compiled is not None:
+        cropped = compiled.apply(cropped)
+    elif image_ops is not None:
+        cropped = np.asarray(apply_image_ops(Image.fromarray(cropped), image_ops))
+
+    return image_to_string(cropped, ocr_config, key)
+
+
+def parallel_ocr_screenshot_region(
+        region: Tuple[int, int, int, int],
+        image_ops: Optional[List[Tuple[ImageOperation, Optional[dict]]]],
+        crops: List[Tuple[int, int, int, int]],
+        ocr_config: str, frame: Optional[Frame], key: Optional[str]
+) -> Optional[List[str]]:
+    """
+    Run all crops of a region through OCR at once, spread across OCR worker processes
+    :return: text of every crop or None if crops could not be handed to the OCR service
+    """
+    screenshot, crops = capture_crops_source(region, crops, frame)
+    slot = OCRService().publish(screenshot)
+    if slot is None:
+        return None
+
+    futures = [
+        OCRService().submit(run_ocr_task, slot, screenshot.shape, crop, image_ops, ocr_config, key)
+        for crop in crops
+    ]
+    try:
+        return [future.result() for future in futures]
+    except BrokenProcessPool as e:
+        logger.error(f'OCR worker process died, running OCR in-process from now on ({e})')
+        OCRService().stop()
+        return None
+
+
 # Take a screenshot of the given region and run the result through OCR
 def ocr_screenshot_region(
         region: Tuple[int, int, int, int],
         image_ops: Optional[List[Tuple[ImageOperation, Optional[dict]]]] = None,
         crops: Optional[List[Tuple[int, int, int, int]]] = None,
-        show: bool = False, ocr_config: str = r'--oem 3 --psm 7'
+        show: bool = False, ocr_config: str = r'--oem 3 --psm 7',
+        frame: Optional[Frame] = None, key: Optional[str] = None, batch: bool = False, parallel: bool = False
 ) -> Union[str, List[str]]:
-    result, screenshot = screenshot_region(region, image_ops, crops, show)
+    # Debug screenshots/showing crops are handled by screenshot_region, so only go parallel without either
+    if parallel and crops is not None and len(crops) > 1 and OCRService().is_running() \
+            and not show and not Config().debug_screenshot():
+        ocr_results = parallel_ocr_screenshot_region(region, image_ops, crops, ocr_config, frame, key)
+        if ocr_results is not None:
+            return ocr_results
 
-    if isinstance(result, Image.Image):
-        return image_to_string(result, ocr_config)
+    result, screenshot = screenshot_region(region, image_ops, crops, show, frame)
+
+    if isinstance(result, ndarray):
+        return image_to_string(result, ocr_config, key)
+
+    # Glyph OCR is fast enough per crop, batching only pays off for Tesseract
+    if batch and not GlyphOCR().is_enabled(key):
+        ocr_results = batch_image_to_string(result, ocr_config, key)
+        if ocr_results is not None:
+            return ocr_results
+        logger.debug(f'Failed to map batched OCR results back to crops of {key}, running OCR per crop')
 
     ocr_results: List[str] = []
     for cropped in result:
-        ocr_results.append(image_to_string(cropped, ocr_config))
+        ocr_results.append(image_to_string(cropped, ocr_config, key))
 
     return ocr_results
 
@@ -368,7 +786,8 @@ def ocr_screenshot_region(
 def ocr_screenshot_game_window_region(
         game_window: Window, resolution: str, key: str,
         image_ops: Optional[List[Tuple[ImageOperation, Optional[dict]]]] = None,
-        show: bool = False, ocr_config: str = r'--oem 3 --psm 7'
+        show: bool = False, ocr_config: str = r'--oem 3 --psm 7',
+        frame: Optional[Frame] = None, batch: bool = False, parallel: bool = False
 ) -> Union[str, List[str]]:
     """
     Run a region of a game window through OCR (wrapper for ocr_screenshot_region)
@@ -378,41 +797,141 @@ def ocr_screenshot_game_window_region(
     :param image_ops: List of image operation tuples, format: (operation, arguments)
     :param show: whether to show the screenshot
     :param ocr_config: config/parameters for Tesseract OCR (see https://guides.nyu.edu/tesseract/usage)
+    :param frame: frame snapshot to use instead of taking a new screenshot (ignored if no longer valid)
+    :param batch: whether to run all crops of the region through OCR in a single pass
+    :param parallel: whether to run all crops of the region through OCR at once in OCR worker processes
+    (if started, takes precedence over batch)
     :return:
     """
-    left, top, right, bottom = game_window.rect
     return ocr_screenshot_region(
-        (
-            left + constants.WINDOW_SHADOW_SIZE,
-            top + constants.WINDOW_TITLE_BAR_HEIGHT,
-            right - constants.WINDOW_SHADOW_SIZE - left - constants.WINDOW_SHADOW_SIZE,
-            bottom - constants.WINDOW_SHADOW_SIZE - top - constants.WINDOW_TITLE_BAR_HEIGHT
-        ),
+        get_game_window_region(game_window),
         image_ops,
         constants.COORDINATES[resolution]['ocr'][key],
         show,
-        ocr_config
+        ocr_config,
+        frame,
+        key,
+        batch,
+        parallel
     )
 
 
-def histogram_screenshot_region(game_window: Window, crop: Tuple[int, int, int, int]) -> ndarray:
-    result, screenshot = screenshot_game_window_region(game_window, crops=[crop])
+def histogram_screenshot_region(
+        game_window: Window,
+        crop: Tuple[int, int, int, int],
+        frame: Optional[Frame] = None
+) -> ndarray:
+    return histogram_screenshot_regions(game_window, [crop], frame).pop()
 
-    return calc_cv2_hist_from_pil_image(result)
 
+def histogram_screenshot_regions(
+        game_window: Window,
+        crops: List[Tuple[int, int, int, int]],
+        frame: Optional[Frame] = None
+) -> List[ndarray]:
+    """
+    Calculate histograms of multiple game window regions from a single screenshot
+    :param game_window: game window to take screenshot of
+    :param crops: List of image crop tuples, format: (left, top, right, bottom)
+    :param frame: frame snapshot to use instead of taking a new screenshot (ignored if no longer valid)
+    :return: histograms in order of the given crops
+    """
+    results, screenshot = screenshot_game_window_region(game_window, crops=crops, frame=frame)
+    # Crops are views of the same screenshot, so every histogram is calculated on the screenshot without any copies
+    if len(crops) == 1:
+        results = [results]
 
-def calc_cv2_hist_from_pil_image(pil_image: Image) -> ndarray:
-    # Convert PIL to cv2 image
-    cv_image = cv2.cvtColor(np.asarray(pil_image), cv2.COLOR_RGB2BGR)
-    histogram = cv2.calcHist([cv_image], [0], None, [256], [0, 256])
+    return [calc_cv2_hist(result) for result in results]
 
-    return histogram
+
+def calc_cv2_hist(pixels: ndarray) -> ndarray:
+    # Histograms are based on the blue channel (channel 0 in cv2's BGR order, channel 2 in RGB order),
+    # calcHist can read the channel directly from the (strided) RGB view without any conversion/copy
+    return cv2.calcHist([pixels], [2], None, [256], [0, 256])
 
 
 def calc_cv2_hist_delta(a: ndarray, b: ndarray) -> float:
     return cv2.compareHist(a, b, cv2.HISTCMP_BHATTACHARYYA)
 
 
+def is_text_on_plain_background(pixels: ndarray) -> bool:
+    """
+    Check whether pixels look like ui text: text is rendered onto a plain background, so most pixels share (about) the
+    same value while some (the glyphs) clearly stand out from it. A uniform region does not contain any text, in-game
+    views (terrain, vehicles, hud) rarely combine a background that plain with that much contrast.
+    :param pixels: RGB image as array of shape (height, width, 3)
+    :return:
+    """
+    gray = rgb_to_grayscale(pixels)
+    counts = np.bincount(gray.ravel(), minlength=256)
+    background = int(np.argmax(counts))
+
+    tolerance = constants.DETECTOR_GATE_BACKGROUND_TOLERANCE
+    background_share = counts[max(background - tolerance, 0):background + tolerance + 1].sum() / gray.size
+    distance = constants.DETECTOR_GATE_INK_MIN_DISTANCE
+    ink_share = (counts[:max(background - distance + 1, 0)].sum() + counts[background + distance:].sum()) / gray.size
+
+    return background_share >= constants.DETECTOR_GATE_MIN_BACKGROUND_SHARE and \
+        ink_share >= constants.DETECTOR_GATE_MIN_INK_SHARE
+
+
+def to_motion_frame(pixels: ndarray, scale: float = 1.0) -> ndarray:
+    """
+    Prepare pixels for motion analysis (downscale to MOTION_SCALE and convert to grayscale)
+    :param pixels: RGB image as array of shape (height, width, 3)
+    :param scale: factor the pixels have already been scaled by
+    :return: grayscale image as float32 array (to be able to subtract frames from each other)
+    """
+    factor = constants.MOTION_SCALE / scale
+    if factor != 1.0:
+        pixels = cv2.resize(pixels, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+
+    return cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY).astype(np.float32)
+
+
+def estimate_global_shift(a: ndarray, b: ndarray, max_shift: int) -> Tuple[Tuple[int, int], ndarray, float]:
+    """
+    Find the shift (camera movement) that best aligns frame a with frame b by comparing the center of b to every
+    shifted window of a
+    :param a: previous motion frame
+    :param b: current motion frame (same size as a)
+    :param max_shift: max number of pixels to shift by in each direction
+    :return: best shift, format: (dy, dx), absolute differences of the center of b and the best aligned window of a and
+    the mean absolute difference without any shift
+    """
+    height, width = b.shape
+    center = b[max_shift:height - max_shift, max_shift:width - max_shift]
+    # Sum of squared differences for every shift, shape: (2 * max_shift + 1, 2 * max_shift + 1)
+    errors = cv2.matchTemplate(a, center, cv2.TM_SQDIFF)
+
+    dy, dx = np.unravel_index(np.argmin(errors), errors.shape)
+    residual = cv2.absdiff(a[dy:dy + center.shape[0], dx:dx + center.shape[1]], center)
+    unshifted = cv2.absdiff(a[max_shift:height - max_shift, max_shift:width - max_shift], center)
+
+    return (int(dy) - max_shift, int(dx) - max_shift), residual, float(unshifted.mean())
+
+
+def calc_motion_score(a: ndarray, b: ndarray) -> float:
+    """
+    Calculate how much action there is between two motion frames. Any reliably detected camera movement counts as full
+    action. Otherwise (or if the camera moved further than can be compensated for), the score is the share of blocks
+    that changed after compensating for camera movement.
+    :param a: previous motion frame
+    :param b: current motion frame
+    :return: action score between 0 (frozen) and 1 (everything changed/camera moved)
+    """
+    (dy, dx), residual, zero_shift_error = estimate_global_shift(a, b, constants.MOTION_MAX_SHIFT)
+    if (dy, dx) != (0, 0) and residual.mean() < zero_shift_error * (1 - constants.MOTION_MIN_SHIFT_GAIN):
+        return 1.0
+
+    # Average differences per block (ignoring any incomplete blocks at the edges)
+    size = constants.MOTION_BLOCK_SIZE
+    rows, cols = residual.shape[0] // size, residual.shape[1] // size
+    blocks = residual[:rows * size, :cols * size].reshape(rows, size, cols, size).mean(axis=(1, 3))
+
+    return float((blocks > constants.MOTION_BLOCK_MIN_DELTA).mean())
+
+
 def get_resolution_window_size(resolution: str) -> Tuple[int, int]:
     # Set window size based on resolution
     window_size = None
@@ -0,0 +1,48 @@
+import argparse
+import os
+import pickle
+
+import cv2
+import numpy as np
+
+from BF2AutoSpectator.common.config import Config
+from BF2AutoSpectator.common.histograms import HistogramStore, flatten_histograms, calc_bhattacharyya_deltas
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        prog='convert-histograms',
+        description='Convert a histograms pickle into a histogram store'
+    )
+    parser.add_argument('pickle', help='Path to histograms pickle (only convert pickles from trusted sources)', type=str)
+    parser.add_argument('--output', help='Path to write histogram store to', type=str,
+                        default=os.path.join(Config.ROOT_DIR, 'pickle', 'histograms.bin'))
+    args = parser.parse_args()
+
+    with open(args.pickle, 'rb') as histogram_file:
+        histograms = pickle.load(histogram_file)
+
+    store = HistogramStore.from_dict(histograms)
+    store.save(args.output)
+
+    # Make sure nothing got lost or changed in conversion
+    loaded = HistogramStore.load(args.output)
+    for resolution, categories in histograms.items():
+        for category, entries in categories.items():
+            if category == 'maps':
+                category, entries = 'default-camera-view', entries['default-camera-view']
+            for key, histogram in flatten_histograms(entries):
+                reference = loaded.get(resolution, category, key)
+                if not np.array_equal(reference, histogram):
+                    raise ValueError(f'Converted histogram {resolution}/{category}/{key} does not match original')
+                delta = calc_bhattacharyya_deltas(histogram, loaded.get_matrix(resolution, category, [key]))[0]
+                if not np.isclose(delta, cv2.compareHist(histogram, reference, cv2.HISTCMP_BHATTACHARYYA)):
+                    raise ValueError(f'Vectorized comparison of {resolution}/{category}/{key} does not match cv2')
+
+    for resolution, category in loaded.get_categories():
+        print(f'{resolution}/{category}: {len(loaded.get_keys(resolution, category))} histograms')
+    print(f'Wrote histogram store (checksum {loaded.get_checksum()}) to {args.output}')
+
+
+if __name__ == '__main__':
+    run()
@@ -1,4 +1,6 @@
 from .instance_manager import GameInstanceManager, GameMessage
 from .instance_state import GameInstanceState
+from .label_matcher import LabelMatcher
+from .screen_classifier import Screen, ScreenClassifier
 
-__all__ = ['GameInstanceManager', 'GameMessage', 'GameInstanceState']
+__all__ = ['GameInstanceManager', 'GameMessage', 'GameInstanceState', 'LabelMatcher', 'Screen', 'ScreenClassifier']
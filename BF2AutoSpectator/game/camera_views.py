@@ -0,0 +1,96 @@
+import os
+import re
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+from numpy import ndarray
+
+from BF2AutoSpectator.common.logger import logger
+
+# Factor to downscale frames by for thumbnails stored alongside learned references
+CAMERA_VIEW_THUMBNAIL_SCALE = .125
+CAMERA_VIEW_KEY_REGEX = re.compile(r'[^a-z0-9_-]')
+
+
+def get_camera_view_key(map_name: str) -> str:
+    # Map names come from OCR, make sure they result in a valid filename
+    return CAMERA_VIEW_KEY_REGEX.sub('', map_name)
+
+
+def create_thumbnail(pixels: ndarray) -> ndarray:
+    return cv2.resize(pixels, None, fx=CAMERA_VIEW_THUMBNAIL_SCALE, fy=CAMERA_VIEW_THUMBNAIL_SCALE,
+                      interpolation=cv2.INTER_AREA)
+
+
+class CameraViewStore:
+    """
+    Default camera view references learned at runtime for maps without a reference in the histogram store
+    (e.g. custom/mod maps). Each reference is stored as <resolution>/<mod>/<map name>.npz in the store's folder,
+    containing the histogram and a thumbnail of the frame it was taken from (to be able to verify it by eye).
+    """
+    path: str
+    resolution: str
+    mod: str
+    histograms: Dict[str, ndarray]
+
+    def __init__(self, root_dir: str, resolution: str, mod: str):
+        self.path = os.path.join(root_dir, resolution, mod)
+        self.resolution = resolution
+        self.mod = mod
+        self.histograms = {}
+
+    def load(self) -> None:
+        if not os.path.isdir(self.path):
+            return
+
+        for filename in sorted(os.listdir(self.path)):
+            key, extension = os.path.splitext(filename)
+            if extension != '.npz':
+                continue
+
+            try:
+                with np.load(os.path.join(self.path, filename)) as data:
+                    self.histograms[key] = data['histogram'].reshape((-1, 1)).astype(np.float32)
+            except (OSError, KeyError, ValueError) as e:
+                logger.error(f'Failed to load learned default camera view of {key} ({e})')
+
+        logger.debug(f'Loaded {len(self.histograms)} learned default camera views ({self.resolution}/{self.mod})')
+
+    def has(self, map_name: str) -> bool:
+        return get_camera_view_key(map_name) in self.histograms
+
+    def get(self, map_name: str) -> ndarray:
+        return self.histograms[get_camera_view_key(map_name)]
+
+    def put(self, map_name: str, histogram: ndarray, thumbnail: ndarray) -> None:
+        """
+        Store a learned reference (in memory and on disk)
+        :param map_name: map the reference was taken on
+        :param histogram: histogram of the default camera view region
+        :param thumbnail: thumbnail of the default camera view region (see create_thumbnail)
+        """
+        key = get_camera_view_key(map_name)
+        self.histograms[key] = histogram.reshape((-1, 1)).astype(np.float32)
+
+        filename = f'{key}.npz'
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            # Write to temporary file first to never leave a partially written reference behind
+            temp_path = os.path.join(self.path, f'{filename}.tmp')
+            with open(temp_path, 'wb') as file:
+                np.savez_compressed(file, histogram=self.histograms[key].ravel(), thumbnail=thumbnail)
+            os.replace(temp_path, os.path.join(self.path, filename))
+        except OSError as e:
+            logger.error(f'Failed to write learned default camera view of {map_name} to disk ({e})')
+
+
+def load_camera_view_store(root_dir: str, resolution: str, mod: str) -> Optional[CameraViewStore]:
+    store = CameraViewStore(root_dir, resolution, mod)
+    try:
+        store.load()
+    except OSError as e:
+        logger.error(f'Failed to load learned default camera views, learning is disabled ({e})')
+        return None
+
+    return store
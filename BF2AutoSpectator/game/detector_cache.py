@@ -0,0 +1,97 @@
+import functools
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from BF2AutoSpectator.common.utility import Frame, InputTracker
+
+# Results not based on the shared frame would be reported stale if the screen changes on its own (e.g. loading
+# finishes), so they are not cached by default
+DETECTOR_CACHE_DEFAULT_TTL = 0.0
+
+
+class DetectorCacheEntry:
+    result: Any
+    frame: Optional[Frame]
+    input_generation: int
+    computed_at: float
+
+    def __init__(self, result: Any, frame: Optional[Frame], input_generation: int):
+        self.result = result
+        self.frame = frame
+        self.input_generation = input_generation
+        self.computed_at = time.monotonic()
+
+
+class DetectorCache:
+    """
+    Results of detectors, kept until the screen may have changed. Results based on the shared frame are valid for as
+    long as the frame is the current one (which is dropped on any input). Results based on detectors' own screenshots
+    are only kept if a TTL is configured, being valid until any input is sent to the game or they are older than the
+    TTL.
+    """
+    __ttl: float
+    __entries: Dict[Tuple[str, tuple], DetectorCacheEntry]
+    __hits: Dict[str, int]
+    __misses: Dict[str, int]
+
+    def __init__(self, ttl: float = DETECTOR_CACHE_DEFAULT_TTL):
+        self.__ttl = ttl
+        self.__entries = {}
+        self.__hits = {}
+        self.__misses = {}
+
+    def configure(self, ttl: float) -> None:
+        """
+        Configure cache
+        :param ttl: number of seconds to keep results not based on the shared frame for (0: do not keep them)
+        """
+        self.__ttl = ttl
+        self.__entries.clear()
+
+    def get(self, key: Tuple[str, tuple], frame: Optional[Frame]) -> Optional[DetectorCacheEntry]:
+        entry = self.__entries.get(key)
+        if entry is None or entry.frame is not frame or entry.input_generation != InputTracker().get_generation() or \
+                (frame is None and time.monotonic() - entry.computed_at > self.__ttl):
+            self.__misses[key[0]] = self.__misses.get(key[0], 0) + 1
+            return None
+
+        self.__hits[key[0]] = self.__hits.get(key[0], 0) + 1
+        return entry
+
+    def put(self, key: Tuple[str, tuple], result: Any, frame: Optional[Frame]) -> None:
+        if frame is None and self.__ttl <= 0:
+            return
+
+        self.__entries[key] = DetectorCacheEntry(result, frame, InputTracker().get_generation())
+
+    def get_stats(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Get cache statistics
+        :return: number of hits and misses by detector
+        """
+        return {
+            detector: (self.__hits.get(detector, 0), self.__misses.get(detector, 0))
+            for detector in sorted(set(self.__hits) | set(self.__misses))
+        }
+
+    def clear(self) -> None:
+        self.__entries.clear()
+
+
+def memoize_detector(func: Callable) -> Callable:
+    """
+    Cache results of a GameInstanceManager detector method (see DetectorCache), keyed by method name and arguments
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args):
+        key = (func.__name__, args)
+        entry = self.detector_cache.get(key, self.get_frame())
+        if entry is not None:
+            return entry.result
+
+        result = func(self, *args)
+        # Store the frame/input generation *after* running the detector, since some detectors move the mouse
+        self.detector_cache.put(key, result, self.get_frame())
+        return result
+
+    return wrapper
@@ -0,0 +1,123 @@
+import time
+from typing import Callable, Dict, List, Optional
+
+from BF2AutoSpectator.common.logger import logger
+
+# Weight of the latest measurement in a detector's (exponential moving average) cost
+DETECTOR_COST_SMOOTHING = .2
+
+
+class Detector:
+    """
+    Declaration of a detector for the planner: how expensive it is (initially, measured at runtime after) and what
+    needs to be true for it to possibly be positive
+    """
+    name: str
+    detect: Callable[[], bool]
+    cost: float
+    gate: Optional[Callable[[], bool]]
+    requires: List[str]
+    excludes: List[str]
+
+    def __init__(self, name: str, detect: Callable[[], bool], cost: float, gate: Optional[Callable[[], bool]] = None,
+                 requires: Optional[List[str]] = None, excludes: Optional[List[str]] = None):
+        """
+        :param name: name of the detector
+        :param detect: function running the detector
+        :param cost: estimated cost in milliseconds (only used until the detector has been run once)
+        :param gate: cheap check (e.g. histogram or pixel statistics of the detector's region) which needs to pass for
+        the detector to possibly be positive
+        :param requires: detectors which need to be positive for this detector to possibly be positive
+        :param excludes: detectors which need to be negative for this detector to possibly be positive
+        """
+        self.name = name
+        self.detect = detect
+        self.cost = cost
+        self.gate = gate
+        self.requires = requires if requires is not None else []
+        self.excludes = excludes if excludes is not None else []
+
+
+class DetectorPlanner:
+    """
+    Evaluates detectors in order of their (measured) cost, short-circuiting any detector whose gate fails or whose
+    required/excluded detectors already decided that it cannot be positive. Results are kept until the next tick.
+    """
+    __detectors: Dict[str, Detector]
+    __results: Dict[str, bool]
+    __runs: Dict[str, int]
+    __skips: Dict[str, int]
+
+    def __init__(self, detectors: List[Detector]):
+        self.__detectors = {detector.name: detector for detector in detectors}
+        self.__results = {}
+        self.__runs = {detector.name: 0 for detector in detectors}
+        self.__skips = {detector.name: 0 for detector in detectors}
+
+    def begin_tick(self) -> None:
+        self.__results = {}
+
+    def set_results(self, results: Dict[str, bool]) -> None:
+        """
+        Set results determined by other means (e.g. the screen classifier) for the current tick
+        """
+        self.__results.update(results)
+
+    def evaluate(self, names: List[str]) -> Dict[str, bool]:
+        """
+        Evaluate detectors (and any detectors they depend on)
+        :param names: names of detectors to evaluate
+        :return: results of the given detectors
+        """
+        pending = set()
+        stack = list(names)
+        while len(stack) > 0:
+            name = stack.pop()
+            if name in pending or name in self.__results:
+                continue
+            pending.add(name)
+            stack.extend(self.get_dependencies(name))
+
+        while len(pending) > 0:
+            # Run the cheapest detector whose dependencies have been decided
+            ready = [
+                self.__detectors[name] for name in pending
+                if not any(dependency in pending for dependency in self.get_dependencies(name))
+            ]
+            detector = min(ready, key=lambda d: d.cost)
+            pending.remove(detector.name)
+            self.__results[detector.name] = self.run(detector)
+
+        return {name: self.__results[name] for name in names}
+
+    def get_dependencies(self, name: str) -> List[str]:
+        return self.__detectors[name].requires + self.__detectors[name].excludes
+
+    def run(self, detector: Detector) -> bool:
+        if any(not self.__results[name] for name in detector.requires) or \
+                any(self.__results[name] for name in detector.excludes) or \
+                (detector.gate is not None and not detector.gate()):
+            self.__skips[detector.name] += 1
+            return False
+
+        started = time.perf_counter()
+        result = detector.detect()
+        duration = (time.perf_counter() - started) * 1000
+        # Replace the initial estimate on first run, average any following runs
+        detector.cost = duration if self.__runs[detector.name] == 0 else \
+            detector.cost + DETECTOR_COST_SMOOTHING * (duration - detector.cost)
+        self.__runs[detector.name] += 1
+
+        logger.debug(f'Detector {detector.name}: {result} ({duration:.2f} ms, avg {detector.cost:.2f} ms)')
+
+        return result
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get planner statistics
+        :return: cost (ms), number of runs and number of short-circuited evaluations by detector
+        """
+        return {
+            name: {'cost': detector.cost, 'runs': self.__runs[name], 'skips': self.__skips[name]}
+            for name, detector in self.__detectors.items()
+        }
@@ -4,32 +4,36 @@ import re
 import subprocess
 import time
 from enum import Enum
-from typing import Tuple, Optional
+from typing import Callable, Tuple, Optional, List
 
 import numpy as np
-import pyautogui
-import win32con
-import win32gui
 
+from BF2AutoSpectator.backend import Backend
 from BF2AutoSpectator.common import constants
+from BF2AutoSpectator.common.capture import CaptureThread
 from BF2AutoSpectator.common.exceptions import SpawnCoordinatesNotAvailableException
+from BF2AutoSpectator.common.histograms import HistogramStore, calc_bhattacharyya_deltas
 from BF2AutoSpectator.common.logger import logger
 from BF2AutoSpectator.common.utility import Window, find_window_by_title, get_resolution_window_size, \
     mouse_move_to_game_window_coord, mouse_click_in_game_window, ocr_screenshot_game_window_region, auto_press_key, \
-    mouse_reset_legacy, mouse_move_legacy, is_running_process, histogram_screenshot_region, calc_cv2_hist_delta, \
+    mouse_reset_legacy, mouse_move_legacy, is_running_process, histogram_screenshot_regions, calc_cv2_hist_delta, \
     ImageOperation, mouse_reset, get_mod_from_command_line, run_conman, ocr_screenshot_region, is_similar_str, \
-    press_key, release_key, kill_process
+    press_key, release_key, kill_process, Frame, capture_game_window_frame, get_game_window_region, press_key_by_name, \
+    write_text, crop_pixels, scale_crop, to_motion_frame, calc_motion_score, screenshot_game_window_region, \
+    image_to_string, wait_until, calc_cv2_hist, InputTracker, is_text_on_plain_background
 from .instance_state import GameInstanceState
-
-# Remove the top left corner from pyautogui failsafe points
-# (avoid triggering failsafe exception due to mouse moving to top left during spawn)
-del pyautogui.FAILSAFE_POINTS[0]
-
+from .camera_views import CameraViewStore, create_thumbnail
+from .detector_cache import DetectorCache, memoize_detector
+from .detector_planner import Detector, DetectorPlanner
+from .label_matcher import LabelMatcher, LABELS
+from .map_names import MapNameIndex
+from .screen_classifier import Screen, ScreenClassifier
 
 MAP_NAME_REGEX_NvN = re.compile(r'(\d+).?v.?(\d+)')
 MAP_NAME_REGEX_SEPARATORS = re.compile(r'[_.\s]')
 MAP_NAME_REGEX_EXTRA = re.compile(r'[\'()]')
 MAP_NAME_REGEX_MULTI = re.compile(r'[-]{2,}')
+MAP_NAME_INDEX = MapNameIndex(constants.COORDINATES['spawns'].keys())
 
 
 class GameMessage(str, Enum):
@@ -50,13 +54,24 @@ class GameInstanceManager:
     player_name: str
     player_pass: str
     resolution: str
-    histograms: dict
+    histograms: HistogramStore
 
     game_window: Optional[Window] = None
+    frame: Optional[Frame] = None
+    capture_thread: Optional[CaptureThread] = None
+    screen_classifier: Optional[ScreenClassifier] = None
+    label_matcher: Optional[LabelMatcher] = None
+    detector_cache: DetectorCache
+    planner: DetectorPlanner
+    camera_views: Optional[CameraViewStore] = None
+    # Default camera view histogram seen on the last learning attempt, format: (map, input generation, histogram, time)
+    camera_view_sample: Optional[Tuple[str, int, np.ndarray, float]] = None
+    camera_view_learning_pending: bool = False
 
     state: GameInstanceState
 
-    def __init__(self, game_path: str, player_name: str, player_pass: str, resolution: str, histograms: dict):
+    def __init__(self, game_path: str, player_name: str, player_pass: str, resolution: str,
+                 histograms: HistogramStore):
         self.game_path = game_path
         self.player_name = player_name
         self.player_pass = player_pass
@@ -65,6 +80,18 @@ class GameInstanceManager:
 
         # Init game instance state
         self.state = GameInstanceState()
+        self.detector_cache = DetectorCache()
+        # Detectors evaluated by the main loop every tick
+        self.planner = DetectorPlanner([
+            Detector('game-message', self.is_game_message_visible, 5.0,
+                     gate=lambda: self.is_region_text_on_plain_background('game-message-header')),
+            Detector('round-end-screen', self.is_round_end_screen_visible, 50.0),
+            # Map briefing is part of the round end screen and can only be visible while its tab is active
+            Detector('map-briefing', self.is_map_briefing_visible, 5.0, requires=['round-end-screen'],
+                     gate=lambda: self.is_round_end_screen_item_active('map-briefing')),
+            Detector('map-loading', self.is_map_loading, 50.0, requires=['round-end-screen']),
+            Detector('default-camera-view', self.is_default_camera_view_visible, 1.0, excludes=['round-end-screen'])
+        ])
 
     """
     Attribute getters/setters
@@ -72,6 +99,76 @@ class GameInstanceManager:
     def get_state(self) -> GameInstanceState:
         return self.state
 
+    def set_capture_thread(self, capture_thread: CaptureThread) -> None:
+        self.capture_thread = capture_thread
+        self.update_capture_region()
+
+    def set_screen_classifier(self, screen_classifier: ScreenClassifier) -> None:
+        self.screen_classifier = screen_classifier
+
+    def set_label_matcher(self, label_matcher: LabelMatcher) -> None:
+        self.label_matcher = label_matcher
+
+    def set_camera_view_store(self, camera_views: CameraViewStore) -> None:
+        self.camera_views = camera_views
+
+    def update_capture_region(self) -> None:
+        if self.capture_thread is None:
+            return
+
+        self.capture_thread.set_region(get_game_window_region(self.game_window) if self.has_instance() else None)
+
+    """
+    Functions for managing the frame snapshot shared by detectors
+    """
+    def capture_frame(self) -> None:
+        """
+        Take a screenshot of the game window to be used by any following detector calls
+        (until input is sent to the game, after which detectors go back to taking their own screenshots)
+        """
+        self.frame = capture_game_window_frame(self.game_window)
+
+    def invalidate_frame(self) -> None:
+        self.frame = None
+        # Frame is usually only dropped to get a new screenshot, so cached results need to go as well
+        self.detector_cache.clear()
+
+    def histogram_regions(self, regions: List[str]) -> List[np.ndarray]:
+        """
+        Calculate histograms of multiple histogram regions from a single frame/screenshot
+        :param regions: names of the regions, format: group/item (e.g. "eor/score-list", "teams/0") or group
+        :return: histograms in order of the given regions
+        """
+        crops = []
+        for region in regions:
+            group, _, item = region.partition('/')
+            crop = constants.COORDINATES[self.resolution]['hists'][group]
+            if isinstance(crop, list):
+                crop = crop[int(item)]
+            elif isinstance(crop, dict):
+                crop = crop[item]
+            crops.append(crop)
+
+        return histogram_screenshot_regions(self.game_window, crops, frame=self.get_frame())
+
+    def get_frame(self) -> Optional[Frame]:
+        if self.frame is not None and not self.frame.is_valid():
+            self.frame = None
+
+        return self.frame
+
+    def wait_until(self, predicate: Callable[[], bool], timeout: float, min_interval: float = .1,
+                   key: str = 'wait') -> bool:
+        """
+        Wait for a condition on screen to hold (see utility.wait_until), taking a new screenshot for every check
+        """
+        def check() -> bool:
+            # We are waiting for the screen to change without sending any input, so frame/cached results are stale
+            self.invalidate_frame()
+            return predicate()
+
+        return wait_until(check, timeout, min_interval, key)
+
     """
     Functions for launching, finding and destroying/quitting a game instance
     """
@@ -133,23 +230,26 @@ class GameInstanceManager:
 
         # Wait for game window to come up
         game_window_present, correct_params, running_mod = False, False, None
-        check_count = 0
-        check_limit = 5
-        while p.poll() is None and not game_window_present and check_count < check_limit:
+
+        def is_launched() -> bool:
+            nonlocal game_window_present, correct_params, running_mod
             # If we join a server with a different mod without knowing it, the game will restart with that mod
             # => update config to use whatever mod the game is now running with
             game_window_present, correct_params, running_mod = self.find_instance(mod)
-            check_count += 1
-            time.sleep(4)
+            return game_window_present or p.poll() is not None
+
+        wait_until(is_launched, 20, 1, 'game-window')
 
-        # If game window came up, give it some time for login etc.
-        if game_window_present:
-            time.sleep(6)
+        # If game window came up, give it some time for login etc. (menu only shows up once that is done)
+        # Only wait for the menu if the window size is right, else coordinates do not match anyway
+        if game_window_present and correct_params:
+            self.wait_until(self.is_in_menu, 20, 1, key='game-menu')
 
         return game_window_present, correct_params, running_mod
 
     def find_instance(self, mod: str) -> Tuple[bool, bool, Optional[str]]:
         self.game_window = find_window_by_title(constants.BF2_WINDOW_TITLE, 'BF2')
+        self.update_capture_region()
 
         if self.game_window is None:
             return False, False, None
@@ -212,21 +312,74 @@ class GameInstanceManager:
     """
     Functions for detecting game state elements
     """
-    def is_game_message_visible(self) -> bool:
-        return 'game message' in ocr_screenshot_game_window_region(
+    def classify_screen(self) -> Optional[Screen]:
+        """
+        Identify the current screen based on the shared frame
+        :return: screen or None if no classifier/frame is available or the result is ambiguous
+        (in which case individual detectors need to be used)
+        """
+        frame = self.get_frame()
+        if self.screen_classifier is None or frame is None:
+            return None
+
+        screen, distance, unambiguous = self.screen_classifier.classify(frame.pixels)
+        logger.debug(f'Classified screen as {screen.value} (distance: {distance:.4f}, unambiguous: {unambiguous})')
+
+        return screen if unambiguous else None
+
+    @memoize_detector
+    def is_label_visible(self, region_key: str, label: str) -> bool:
+        """
+        Check whether a fixed label is visible in an OCR region (see LABELS). Label templates are tried first,
+        OCR is only used if no template is available or the template match is inconclusive.
+        :param region_key: key of the region in coordinates dict
+        :param label: label to look for
+        :return:
+        """
+        image_ops = LABELS[(region_key, label)]
+        pixels, _ = screenshot_game_window_region(
             self.game_window,
-            self.resolution,
-            'game-message-header',
-            image_ops=[(ImageOperation.invert, None)]
+            image_ops,
+            constants.COORDINATES[self.resolution]['ocr'][region_key],
+            frame=self.get_frame()
+        )
+
+        if self.label_matcher is not None and self.label_matcher.has(region_key, label):
+            confidence = self.label_matcher.match(pixels, region_key, label)
+            if confidence >= constants.LABEL_MATCH_MIN_CONFIDENCE:
+                return True
+            elif confidence <= constants.LABEL_MATCH_MAX_ABSENT_CONFIDENCE:
+                return False
+
+            logger.debug(f'Label match for "{label}" is inconclusive ({confidence:.2f}), falling back to OCR')
+
+        return label in image_to_string(pixels, r'--oem 3 --psm 7', region_key)
+
+    def is_region_text_on_plain_background(self, region_key: str) -> bool:
+        """
+        Check whether an OCR region looks like ui text (rather than the in-game view behind it)
+        :param region_key: key of the region in coordinates dict
+        :return:
+        """
+        pixels, _ = screenshot_game_window_region(
+            self.game_window,
+            crops=constants.COORDINATES[self.resolution]['ocr'][region_key],
+            frame=self.get_frame()
         )
 
+        return is_text_on_plain_background(pixels)
+
+    def is_game_message_visible(self) -> bool:
+        return self.is_label_visible('game-message-header', 'game message')
+
     def get_game_message(self) -> Tuple[GameMessage, str]:
         # Get ocr result of game message content region
         game_message = ocr_screenshot_game_window_region(
             self.game_window,
             self.resolution,
             'game-message-text',
-            image_ops=[(ImageOperation.invert, None)]
+            image_ops=[(ImageOperation.invert, None)],
+            frame=self.get_frame()
         )
 
         if 'full' in game_message:
@@ -252,16 +405,7 @@ class GameInstanceManager:
 
     def is_in_menu(self) -> bool:
         # Get ocr result of quit menu item area
-        return 'quit' in ocr_screenshot_game_window_region(
-            self.game_window,
-            self.resolution,
-            'quit-menu-item',
-            image_ops=[
-                (ImageOperation.grayscale, None),
-                (ImageOperation.colorize, {'black': '#000', 'white': '#fff', 'blackpoint': 30, 'whitepoint': 175}),
-                (ImageOperation.invert, None),
-            ]
-        )
+        return self.is_label_visible('quit-menu-item', 'quit')
 
     def is_multiplayer_menu_active(self) -> bool:
         return self.is_menu_item_active('multiplayer')
@@ -269,52 +413,36 @@ class GameInstanceManager:
     def is_join_internet_menu_active(self) -> bool:
         return self.is_menu_item_active('join-internet')
 
+    @memoize_detector
     def is_menu_item_active(self, menu_item: str) -> bool:
-        histogram = histogram_screenshot_region(
-            self.game_window,
-            constants.COORDINATES[self.resolution]['hists']['menu'][menu_item]
-        )
+        histogram = self.histogram_regions([f'menu/{menu_item}']).pop()
         delta = calc_cv2_hist_delta(
             histogram,
-            self.histograms[self.resolution]['menu'][menu_item]['active']
+            self.histograms.get(self.resolution, 'menu', f'{menu_item}/active')
         )
 
         return delta < constants.HISTCMP_MAX_DELTA
 
     def is_disconnect_prompt_visible(self) -> bool:
-        return 'disconnect' in ocr_screenshot_game_window_region(
-            self.game_window,
-            self.resolution,
-            'disconnect-prompt-header',
-            image_ops=[(ImageOperation.invert, None)]
-        )
+        return self.is_label_visible('disconnect-prompt-header', 'disconnect')
 
     def is_disconnect_button_visible(self) -> bool:
-        return 'disconnect' in ocr_screenshot_game_window_region(
-            self.game_window,
-            self.resolution,
-            'disconnect-button',
-            image_ops=[
-                (ImageOperation.grayscale, None),
-                (ImageOperation.colorize, {'black': '#000', 'white': '#fff', 'blackpoint': 30, 'whitepoint': 175}),
-                (ImageOperation.invert, None)
-            ]
-        )
+        return self.is_label_visible('disconnect-button', 'disconnect')
 
     def is_play_now_button_visible(self) -> bool:
-        return 'play now' in ocr_screenshot_game_window_region(
-            self.game_window,
-            self.resolution,
-            'play-now-button',
-            image_ops=[
-                (ImageOperation.grayscale, None),
-                (ImageOperation.colorize, {'black': '#000', 'white': '#fff', 'blackpoint': 100, 'whitepoint': 200})
-            ]
-        )
+        return self.is_label_visible('play-now-button', 'play now')
 
+    @memoize_detector
     def is_round_end_screen_visible(self) -> bool:
         round_end_screen_items = ['score-list', 'top-players', 'top-scores', 'map-briefing']
-        active = [self.is_round_end_screen_item_active(item) for item in round_end_screen_items]
+        histograms = self.histogram_regions([f'eor/{item}' for item in round_end_screen_items])
+        active = [
+            calc_cv2_hist_delta(
+                histogram,
+                self.histograms.get(self.resolution, 'eor', f'{item}/active')
+            ) < constants.HISTCMP_MAX_DELTA
+            for item, histogram in zip(round_end_screen_items, histograms)
+        ]
 
         # During map load, only item is active at any time. When the round just ended, all are active.
         if not (all(active) or len([a for a in active if a]) == 1):
@@ -329,52 +457,36 @@ class GameInstanceManager:
                 (ImageOperation.grayscale, None),
                 (ImageOperation.colorize, {'black': '#000', 'white': '#fff', 'blackpoint': 50, 'whitepoint': 135}),
                 (ImageOperation.invert, None),
-            ]
+            ],
+            frame=self.get_frame(),
+            batch=True,
+            parallel=True
         )
 
         # Due to the eor header items being transparent, ocr is not going to always detect all items
         # So, we'll take any ocr match (the strings are fairly unique)
         return any(label in item_labels for label in ['score list', 'top players', 'top scores', 'map briefing'])
 
+    @memoize_detector
     def is_round_end_screen_item_active(self, round_end_screen_item: str) -> bool:
-        histogram = histogram_screenshot_region(
-            self.game_window,
-            constants.COORDINATES[self.resolution]['hists']['eor'][round_end_screen_item]
-        )
+        histogram = self.histogram_regions([f'eor/{round_end_screen_item}']).pop()
         delta = calc_cv2_hist_delta(
             histogram,
-            self.histograms[self.resolution]['eor'][round_end_screen_item]['active']
+            self.histograms.get(self.resolution, 'eor', f'{round_end_screen_item}/active')
         )
 
         return delta < constants.HISTCMP_MAX_DELTA
 
     def is_connect_to_ip_button_visible(self) -> bool:
-        return 'connect to ip' in ocr_screenshot_game_window_region(
-            self.game_window,
-            self.resolution,
-            'connect-to-ip-button',
-            image_ops=[
-                (ImageOperation.grayscale, None),
-                (ImageOperation.colorize, {'black': '#000', 'white': '#fff', 'blackpoint': 30, 'whitepoint': 175}),
-                (ImageOperation.invert, None)
-            ]
-        )
+        return self.is_label_visible('connect-to-ip-button', 'connect to ip')
 
+    # Not memoized, since the mouse reset must happen on every call (the label check itself is memoized)
     def is_join_game_button_visible(self) -> bool:
         # Reset mouse to avoid blocking ocr of button region
         mouse_reset(self.game_window)
 
         # Get ocr result of bottom left corner where "join game"-button would be
-        return 'join game' in ocr_screenshot_game_window_region(
-            self.game_window,
-            self.resolution,
-            'join-game-button',
-            image_ops=[
-                (ImageOperation.grayscale, None),
-                (ImageOperation.colorize, {'black': '#000', 'white': '#fff', 'blackpoint': 30, 'whitepoint': 175}),
-                (ImageOperation.invert, None)
-            ]
-        )
+        return self.is_label_visible('join-game-button', 'join game')
 
     def is_map_loading(self) -> bool:
         # Check if join game button is present (check this first in order to avoid race condition where eor screen
@@ -384,26 +496,19 @@ class GameInstanceManager:
         # Check if game is on round end screen
         return self.is_round_end_screen_visible() and not join_game_button_present
 
+    @memoize_detector
     def is_loading_bar_visible(self) -> bool:
-        histogram = histogram_screenshot_region(
-            self.game_window,
-            constants.COORDINATES[self.resolution]['hists']['eor']['loading-bar']
-        )
+        histogram = self.histogram_regions(['eor/loading-bar']).pop()
 
         delta = calc_cv2_hist_delta(
             histogram,
-            self.histograms[self.resolution]['eor']['loading-bar']
+            self.histograms.get(self.resolution, 'eor', 'loading-bar')
         )
 
         return delta < constants.HISTCMP_MAX_DELTA
 
     def is_map_briefing_visible(self) -> bool:
-        return 'map briefing' in ocr_screenshot_game_window_region(
-            self.game_window,
-            self.resolution,
-            'map-briefing-header',
-            image_ops=[(ImageOperation.invert, None)]
-        )
+        return self.is_label_visible('map-briefing-header', 'map briefing')
 
     def open_map_briefing(self) -> bool:
         # Don't block any OCR regions
@@ -421,21 +526,17 @@ class GameInstanceManager:
         time.sleep(.2)
         mouse_click_in_game_window(self.game_window, legacy=True)
 
-        time.sleep(.5)
-
         # Move cursor back to default position
         mouse_reset(self.game_window)
 
-        return self.is_map_briefing_visible()
+        return self.wait_until(self.is_map_briefing_visible, 1, key='map-briefing')
 
+    @memoize_detector
     def is_spawn_menu_visible(self) -> bool:
-        histogram = histogram_screenshot_region(
-            self.game_window,
-            constants.COORDINATES[self.resolution]['hists']['spawn-menu']['close-button']
-        )
+        histogram = self.histogram_regions(['spawn-menu/close-button']).pop()
         delta = calc_cv2_hist_delta(
             histogram,
-            self.histograms[self.resolution]['spawn-menu']['close-button']
+            self.histograms.get(self.resolution, 'spawn-menu', 'close-button')
         )
 
         return delta < constants.HISTCMP_MAX_DELTA
@@ -445,7 +546,10 @@ class GameInstanceManager:
             self.game_window,
             self.resolution,
             'eor-map-details',
-            image_ops=[(ImageOperation.invert, None)]
+            image_ops=[(ImageOperation.invert, None)],
+            frame=self.get_frame(),
+            batch=True,
+            parallel=True
         )
 
         logger.debug(f'Detected map details: {ocr_map_name}/{ocr_map_size}/{ocr_game_mode}')
@@ -473,23 +577,14 @@ class GameInstanceManager:
         # Convert to lower case
         ocr_result = ocr_result.lower()
 
-        # Check if map is known
-        # Also check while replacing first g with q, second t with i and trailing colon with e
-        # to account for common ocr errors
-        if ocr_result in constants.COORDINATES['spawns'].keys():
-            # If block only serves to not run regex if ocr result already matches a known map
-            return ocr_result
-        elif (normalized := re.sub(r'^([^g]*?)g(.*)$', '\\1q\\2', ocr_result)) \
-                in constants.COORDINATES['spawns'].keys():
-            return normalized
-        elif (normalized := re.sub(r'^([^t]*?t[^t]+?)t(.*)$', '\\1i\\2', ocr_result)) \
-                in constants.COORDINATES['spawns'].keys():
-            return normalized
-        elif (normalized := re.sub(r'^(.*?):$', '\\1e', ocr_result)) \
-                in constants.COORDINATES['spawns'].keys():
-            return normalized
-        else:
-            return ocr_result
+        # Resolve to known map name, accounting for common ocr errors
+        map_name, score = MAP_NAME_INDEX.resolve(ocr_result)
+        if score >= constants.MAP_NAME_MIN_SCORE:
+            if map_name != ocr_result:
+                logger.debug(f'Resolved map name {ocr_result} to {map_name} (score: {score:.2f})')
+            return map_name
+
+        return ocr_result
 
     @staticmethod
     def normalize_map_size(ocr_result: str) -> int:
@@ -502,101 +597,196 @@ class GameInstanceManager:
 
     def get_player_team(self) -> Optional[int]:
         # Get histograms of team selection areas
-        team_selection_histograms = []
-        for coord_set in constants.COORDINATES[self.resolution]['hists']['teams']:
-            histogram = histogram_screenshot_region(
-                self.game_window,
-                coord_set
-            )
-            team_selection_histograms.append(histogram)
+        team_selection_histograms = self.histogram_regions(['teams/0', 'teams/1'])
 
-        # Calculate histogram deltas and compare against known ones
+        # Calculate histogram deltas against all known ones at once
         team = None
-        for team_key in constants.TEAMS_SPAWN_MENU_LEFT:
-            histogram_delta = calc_cv2_hist_delta(
-                team_selection_histograms[0],
-                self.histograms[self.resolution]['teams'][team_key]['active']
-            )
-
-            if histogram_delta < constants.HISTCMP_MAX_DELTA:
-                team = 0
-                break
-
-        for team_key in constants.TEAMS_SPAWN_MENU_RIGHT:
-            histogram_delta = calc_cv2_hist_delta(
-                team_selection_histograms[1],
-                self.histograms[self.resolution]['teams'][team_key]['active']
-            )
+        left_deltas = self.histograms.match(
+            self.resolution,
+            'teams',
+            team_selection_histograms[0],
+            [f'{team_key}/active' for team_key in constants.TEAMS_SPAWN_MENU_LEFT]
+        )
+        if (left_deltas < constants.HISTCMP_MAX_DELTA).any():
+            team = 0
 
-            if histogram_delta < constants.HISTCMP_MAX_DELTA:
-                team = 1
-                break
+        right_deltas = self.histograms.match(
+            self.resolution,
+            'teams',
+            team_selection_histograms[1],
+            [f'{team_key}/active' for team_key in constants.TEAMS_SPAWN_MENU_RIGHT]
+        )
+        if (right_deltas < constants.HISTCMP_MAX_DELTA).any():
+            team = 1
 
         logger.debug(f'Detected team is {team}')
 
         return team
 
+    def get_default_camera_view_reference(self, map_name: str) -> Optional[np.ndarray]:
+        if self.histograms.has(self.resolution, 'default-camera-view', map_name):
+            return self.histograms.get(self.resolution, 'default-camera-view', map_name)
+        elif self.camera_views is not None and self.camera_views.has(map_name):
+            return self.camera_views.get(map_name)
+
+        return None
+
     def is_default_camera_view_visible(self) -> bool:
         map_name = self.state.get_rotation_map_name()
-        # Return false if map has not been determined (yet) or is not supported
-        if map_name is None or map_name not in self.histograms[self.resolution]['maps']['default-camera-view']:
+        # Return false if map has not been determined (yet) or is not supported (and has not been learned yet)
+        reference = self.get_default_camera_view_reference(map_name) if map_name is not None else None
+        if reference is None:
             return False
 
-        histogram = histogram_screenshot_region(
-            self.game_window,
-            (
-                168,
-                0,
-                168,
-                0
-            )
-        )
-        delta = calc_cv2_hist_delta(
-            histogram,
-            self.histograms[self.resolution]['maps']['default-camera-view'][map_name]
-        )
+        histogram = self.histogram_regions(['default-camera-view']).pop()
+        delta = calc_cv2_hist_delta(histogram, reference)
 
         return delta < constants.DEFAULT_CAMERA_VIEW_HISTCMP_MAX_DELTA
 
+    def learn_default_camera_view(self) -> bool:
+        """
+        Store the current screen as the default camera view reference of the current map, if there is no reference
+        for it yet (should only be called while the game is known to be on the default camera view, e.g. right after
+        loading into a map and before spawning). Does not wait for the screen to settle, but may need to be called
+        again on the next tick to decide (see is_camera_view_learning_pending).
+        :return: True if a reference was learned
+        """
+        self.camera_view_learning_pending = False
+        map_name = self.state.get_rotation_map_name()
+        if self.camera_views is None or map_name is None or \
+                self.get_default_camera_view_reference(map_name) is not None:
+            return False
+
+        # The default camera view is static, so only learn it once the screen has settled (e.g. finished fading in)
+        static = self.is_default_camera_view_static(map_name)
+        if static is None:
+            self.camera_view_learning_pending = True
+            return False
+        elif not static:
+            logger.debug(f'Screen is not static, not learning default camera view of {map_name}')
+            return False
+
+        if self.get_frame() is None:
+            self.capture_frame()
+        pixels = crop_pixels(self.frame.pixels, constants.COORDINATES[self.resolution]['hists']['default-camera-view'])
+        thumbnail = create_thumbnail(pixels)
+        if thumbnail.mean() < constants.DEFAULT_CAMERA_VIEW_LEARN_MIN_BRIGHTNESS:
+            logger.debug(f'Screen is (nearly) black, not learning default camera view of {map_name}')
+            return False
+
+        logger.info(f'Learned default camera view of {map_name}')
+        self.camera_views.put(map_name, self.histogram_regions(['default-camera-view']).pop(), thumbnail)
+
+        return True
+
+    def is_camera_view_learning_pending(self) -> bool:
+        """
+        Check whether the last call to learn_default_camera_view needs another look at the screen once
+        DEFAULT_CAMERA_VIEW_LEARN_INTERVAL has passed
+        """
+        return self.camera_view_learning_pending
+
+    def is_default_camera_view_static(self, map_name: str) -> Optional[bool]:
+        """
+        Check whether the default camera view region did not change for DEFAULT_CAMERA_VIEW_LEARN_INTERVAL, comparing
+        frames captured in the background if possible, else the current screen to the one seen on the previous call
+        :param map_name: map the default camera view is checked on
+        :return: True if region is static, False if not, None if there is nothing to compare to (yet)
+        """
+        crop = constants.COORDINATES[self.resolution]['hists']['default-camera-view']
+        if self.capture_thread is not None and self.capture_thread.is_alive():
+            captured = self.capture_thread.ring.get_spaced_frames(2, constants.DEFAULT_CAMERA_VIEW_LEARN_INTERVAL)
+            if captured is not None:
+                scale = self.capture_thread.scale
+                first, second = [
+                    calc_cv2_hist(crop_pixels(frame.pixels, scale_crop(crop, scale))) for frame in captured
+                ]
+                return calc_cv2_hist_delta(first, second) < constants.DEFAULT_CAMERA_VIEW_LEARN_MAX_DELTA
+
+        histogram = self.histogram_regions(['default-camera-view']).pop()
+        generation, now = InputTracker().get_generation(), time.monotonic()
+        sample = self.camera_view_sample
+        # Sample can only be compared to if it is of the same map and no input was sent since taking it
+        if sample is None or sample[0] != map_name or sample[1] != generation:
+            self.camera_view_sample = (map_name, generation, histogram, now)
+            return None
+        elif now - sample[3] < constants.DEFAULT_CAMERA_VIEW_LEARN_INTERVAL:
+            return None
+
+        self.camera_view_sample = (map_name, generation, histogram, now)
+        return calc_cv2_hist_delta(sample[2], histogram) < constants.DEFAULT_CAMERA_VIEW_LEARN_MAX_DELTA
+
+    def identify_map(self) -> Tuple[Optional[str], float]:
+        """
+        Identify the current map by comparing the screen to the default camera view references of all maps at once
+        (allows determining the map without seeing the map briefing, e.g. after joining mid-round)
+        :return: best matching map and confidence (0 to 1), None if no reference matches the screen
+        """
+        keys = self.histograms.get_keys(self.resolution, 'default-camera-view')
+        if len(keys) == 0:
+            return None, 0.0
+
+        histogram = self.histogram_regions(['default-camera-view']).pop()
+        deltas = self.histograms.match(self.resolution, 'default-camera-view', histogram)
+        best = int(np.argmin(deltas))
+        if deltas[best] >= constants.DEFAULT_CAMERA_VIEW_HISTCMP_MAX_DELTA:
+            return None, 0.0
+
+        # Variants of a map (e.g. 2v2/CTF) share the default camera view, so only maps whose reference can be told
+        # apart from the best match's reference count as alternatives
+        matrix = self.histograms.get_matrix(self.resolution, 'default-camera-view')
+        distinct = calc_bhattacharyya_deltas(matrix[best], matrix) >= constants.DEFAULT_CAMERA_VIEW_HISTCMP_MAX_DELTA
+        runner_up = deltas[distinct].min() if distinct.any() else 1.0
+        confidence = float(max(1.0 - deltas[best] / runner_up, 0.0)) if runner_up > 0 else 0.0
+
+        return keys[best], confidence
+
     def is_sufficient_action_on_screen(self, screenshot_count: int = 3, screenshot_sleep: float = .55,
-                                       min_delta: float = .022) -> bool:
-        histograms = []
-
-        # Take screenshots and calculate histograms
-        for i in range(0, screenshot_count):
-            histogram = histogram_screenshot_region(
-                self.game_window,
-                (
-                    168,
-                    0,
-                    168,
-                    0
-                )
+                                       min_score: float = constants.MOTION_MIN_SCORE) -> bool:
+        # Ignore the left and right edges (which only contain black bars on most maps)
+        crop = (168, 0, 168, 0)
+        frames = []
+
+        # Use frames captured in the background if possible, only waiting for as many frames as are still missing
+        # (e.g. after switching to a new player, since frames are only used if they were captured after the last input)
+        if self.capture_thread is not None and self.capture_thread.is_alive():
+            captured = self.capture_thread.ring.wait_for_spaced_frames(
+                screenshot_count,
+                screenshot_sleep,
+                timeout=screenshot_count * screenshot_sleep + 2 / self.capture_thread.rate
             )
-            histograms.append(histogram)
+            if captured is not None:
+                scale = self.capture_thread.scale
+                frames = [
+                    to_motion_frame(crop_pixels(frame.pixels, scale_crop(crop, scale)), scale) for frame in captured
+                ]
+            else:
+                logger.debug('Not enough frames captured in background, taking screenshots instead')
+
+        # Take screenshots
+        for i in range(len(frames), screenshot_count):
+            pixels, _ = screenshot_game_window_region(self.game_window, crops=[crop])
+            frames.append(to_motion_frame(pixels))
 
             # Sleep before taking next screenshot
             if i + 1 < screenshot_count:
                 time.sleep(screenshot_sleep)
 
-        histogram_deltas = []
-        # Calculate histogram differences
-        for j in range(0, len(histograms) - 1):
-            histogram_deltas.append(calc_cv2_hist_delta(histograms[j], histograms[j + 1]))
+        # Calculate action scores between consecutive frames
+        scores = [calc_motion_score(frames[j], frames[j + 1]) for j in range(0, len(frames) - 1)]
 
-        # Take average of deltas
-        average_delta = np.average(histogram_deltas)
+        # Take average of scores
+        average_score = np.average(scores)
 
-        logger.debug(f'Average histogram delta: {average_delta}')
+        logger.debug(f'Average action score: {average_score}')
 
-        return average_delta > min_delta
+        return average_score > min_score
 
     """
     Functions to interact with the game instance (=change state)
     """
     def bring_to_foreground(self) -> None:
-        win32gui.ShowWindow(self.game_window.handle, win32con.SW_SHOW)
-        win32gui.SetForegroundWindow(self.game_window.handle)
+        Backend().get_input_sink().bring_to_foreground(self.game_window)
 
     def connect_to_server(self, server_ip: str, server_port: str, server_pass: Optional[str] = None) -> bool:
         if not self.is_multiplayer_menu_active():
@@ -611,13 +801,7 @@ class GameInstanceManager:
             time.sleep(.2)
             mouse_click_in_game_window(self.game_window)
 
-        check_count = 0
-        check_limit = 10
-        while not self.is_connect_to_ip_button_visible() and check_count < check_limit:
-            check_count += 1
-            time.sleep(1)
-
-        if not self.is_connect_to_ip_button_visible():
+        if not self.wait_until(self.is_connect_to_ip_button_visible, 10, .5, 'connect-to-ip-button'):
             return False
 
         # Move cursor onto connect to ip button and click
@@ -629,28 +813,28 @@ class GameInstanceManager:
         time.sleep(.3)
 
         # Clear out ip field
-        pyautogui.press('backspace', presses=20, interval=.05)
+        press_key_by_name('backspace', presses=20, interval=.05)
 
         # Write ip
-        pyautogui.write(server_ip, interval=.05)
+        write_text(server_ip, interval=.05)
 
         # Hit tab to enter port
-        pyautogui.press('tab')
+        press_key_by_name('tab')
 
         # Clear out port field
-        pyautogui.press('backspace', presses=10, interval=.05)
+        press_key_by_name('backspace', presses=10, interval=.05)
 
         # Write port
-        pyautogui.write(server_port, interval=.05)
+        write_text(server_port, interval=.05)
 
         time.sleep(.3)
 
         # Write password if required
         # Field clears itself, so need to clear manually
         if server_pass is not None:
-            pyautogui.press('tab')
+            press_key_by_name('tab')
 
-            pyautogui.write(server_pass, interval=.05)
+            write_text(server_pass, interval=.05)
 
             time.sleep(.3)
 
@@ -661,27 +845,23 @@ class GameInstanceManager:
 
         # Successfully joining a server means leaving the menu, so wait for menu to disappear
         # (cancel further checks when a game/error message is present)
-        check_count = 0
-        check_limit = 16
-        in_menu = True
-        game_message_visible = False
-        while in_menu and not game_message_visible and check_count < check_limit:
-            in_menu = self.is_in_menu()
-            game_message_visible = self.is_game_message_visible()
-            # Game will show a "you need to disconnect first" prompt if it was still connected to a server
-            if self.is_disconnect_prompt_visible():
-                logger.warning('Disconnect prompt is visible, clicking "Yes" to disconnect')
-                # Click "yes" in order to disconnect
-                mouse_move_to_game_window_coord(self.game_window, self.resolution, 'disconnect-prompt-yes-button')
-                time.sleep(.2)
-                mouse_click_in_game_window(self.game_window)
-                time.sleep(.5)
-                # Stop checking, since we will stay in menu (game only disconnects here, we need to retry connecting)
-                break
-            check_count += 1
-            time.sleep(1)
-
-        return not in_menu
+        # Game will show a "you need to disconnect first" prompt if it was still connected to a server
+        self.wait_until(
+            lambda: not self.is_in_menu() or self.is_game_message_visible() or self.is_disconnect_prompt_visible(),
+            16, .5, 'server-join'
+        )
+
+        if self.is_disconnect_prompt_visible():
+            logger.warning('Disconnect prompt is visible, clicking "Yes" to disconnect')
+            # Click "yes" in order to disconnect
+            mouse_move_to_game_window_coord(self.game_window, self.resolution, 'disconnect-prompt-yes-button')
+            time.sleep(.2)
+            mouse_click_in_game_window(self.game_window)
+            time.sleep(.5)
+            # We will stay in menu (game only disconnects here, we need to retry connecting)
+            return False
+
+        return not self.is_in_menu()
 
     def disconnect_from_server(self) -> bool:
         # Make sure disconnect button is present
@@ -694,11 +874,7 @@ class GameInstanceManager:
             # Reset mouse to avoid blocking ocr of button region
             mouse_reset(self.game_window)
 
-            check = 0
-            max_checks = 5
-            while not self.is_play_now_button_visible() and check < max_checks:
-                check += 1
-                time.sleep(.3)
+            self.wait_until(self.is_play_now_button_visible, 1.5, key='play-now-button')
 
         # We should still be in the menu but see the "play now" button instead of the "disconnect" button
         return self.is_in_menu() and self.is_play_now_button_visible()
@@ -707,26 +883,17 @@ class GameInstanceManager:
         if not self.state.map_loading():
             return False
 
-        check_count = 0
-        check_limit = 18
-        started_loading = False
-        while not started_loading and check_count < check_limit:
-            started_loading = self.is_loading_bar_visible()
-            if not started_loading:
-                check_count += 1
-                time.sleep(.25)
-
-        if not started_loading:
+        if not self.wait_until(self.is_loading_bar_visible, 4.5, .25, 'loading-bar'):
             return False
 
         # Toggling ALT somehow "pauses"/"resumes" the game while keeping the audio running
         # In contrast, BF2mld's approach of suspending the process pauses the audio (not ideal with loading music on)
         logger.debug('Suspending map load')
-        pyautogui.press('alt')
+        press_key_by_name('alt')
         time.sleep(delay)
 
         logger.debug('Resuming map load')
-        pyautogui.press('alt')
+        press_key_by_name('alt')
 
         return True
 
@@ -741,30 +908,32 @@ class GameInstanceManager:
         attempt = 0
         max_attempts = 5
         while not (ready := self.is_console_ready()) and attempt < max_attempts:
-            pyautogui.press('backspace', presses=pow((attempt + 1), 2), interval=.05)
+            press_key_by_name('backspace', presses=pow((attempt + 1), 2), interval=.05)
             attempt += 1
 
         if not ready:
             return False
 
         # Write command
-        pyautogui.write(command, interval=.05)
-        time.sleep(.3)
+        write_text(command, interval=.05)
 
         # Read command back
-        written_command = self.get_console_command(len(command))
-        if not is_similar_str(command, written_command.lstrip('>')):
+        if not self.wait_until(
+                lambda: is_similar_str(command, self.get_console_command(len(command)).lstrip('>')),
+                .6, key='console-command'
+        ):
             return False
 
         # Hit enter
-        pyautogui.press('enter')
+        press_key_by_name('enter')
         time.sleep(.1)
 
         # X / toggle console
         self.toggle_console()
 
-        return not self.is_console_ready()
+        return self.wait_until(lambda: not self.is_console_ready(), .5, key='console-closed')
 
+    @memoize_detector
     def is_console_ready(self) -> bool:
         # We should only see the input "prompt"
         return self.get_console_command(3) == '>'
@@ -777,20 +946,16 @@ class GameInstanceManager:
         don't expect an exact match with the command that was put in)
         """
         # Set screenshot width based on command length (add 5px per character)
-        left, top, right, bottom = self.game_window.rect
         return ocr_screenshot_region(
-            (
-                left + constants.WINDOW_SHADOW_SIZE,
-                top + constants.WINDOW_TITLE_BAR_HEIGHT,
-                right - constants.WINDOW_SHADOW_SIZE - left - constants.WINDOW_SHADOW_SIZE,
-                bottom - constants.WINDOW_SHADOW_SIZE - top - constants.WINDOW_TITLE_BAR_HEIGHT
-            ),
+            get_game_window_region(self.game_window),
             crops=[(
                 constants.COORDINATES[self.resolution]['ocr']['console-command'][0][0],
                 constants.COORDINATES[self.resolution]['ocr']['console-command'][0][1],
                 constants.COORDINATES[self.resolution]['ocr']['console-command'][0][2] - characters * 6,
                 constants.COORDINATES[self.resolution]['ocr']['console-command'][0][3]
-            )]
+            )],
+            frame=self.get_frame(),
+            key='console-command'
         )
 
     @staticmethod
@@ -815,11 +980,14 @@ class GameInstanceManager:
                 (randomize and self.select_random_spawn_point() or (not randomize and self.select_spawn_point())):
             # Hit enter to spawn
             auto_press_key(0x1c)
-            time.sleep(1)
+            self.wait_until(lambda: not self.is_spawn_menu_visible(), 1, key='spawn-menu-close')
 
             # Re-open spawn menu
             self.open_spawn_menu(.3)
 
+            # Spawn menu closes before the spawn registers, only the suicide button showing up confirms it did
+            self.wait_until(self.is_suicide_button_visible, 1, key='spawn')
+
             # Reset cursor again
             mouse_reset_legacy()
 
@@ -837,13 +1005,13 @@ class GameInstanceManager:
             mouse_move_to_game_window_coord(self.game_window, self.resolution, 'suicide-button', True)
             time.sleep(.3)
             mouse_click_in_game_window(self.game_window, legacy=True)
-            time.sleep(.5)
 
         # Reset mouse again to make sure it does not block any OCR attempts
         mouse_reset_legacy()
 
         # Make sure the button was visible before but is not any longer
-        return suicide_button_visible and not self.is_suicide_button_visible()
+        return suicide_button_visible and \
+            self.wait_until(lambda: not self.is_suicide_button_visible(), 1, key='suicide')
 
     def select_spawn_point(self) -> bool:
         # Make sure spawning on map and size is supported
@@ -907,48 +1075,20 @@ class GameInstanceManager:
         time.sleep(.2)
 
     def is_spawn_point_selectable(self) -> bool:
-        return 'select' in ocr_screenshot_game_window_region(
-            self.game_window,
-            self.resolution,
-            'spawn-selected-text',
-            image_ops=[
-                (ImageOperation.grayscale, None),
-                (ImageOperation.colorize, {'black': '#000', 'white': '#fff', 'blackpoint': 30, 'whitepoint': 175}),
-                (ImageOperation.invert, None)
-            ]
-        )
+        return self.is_label_visible('spawn-selected-text', 'select')
 
     def is_spawn_point_selected(self) -> bool:
-        return 'done' in ocr_screenshot_game_window_region(
-            self.game_window,
-            self.resolution,
-            'spawn-selected-text',
-            image_ops=[
-                (ImageOperation.grayscale, None),
-                (ImageOperation.colorize, {'black': '#000', 'white': '#fff', 'blackpoint': 30, 'whitepoint': 175}),
-                (ImageOperation.invert, None)
-            ]
-        )
+        return self.is_label_visible('spawn-selected-text', 'done')
 
     def is_suicide_button_visible(self) -> bool:
-        return 'suicide' in ocr_screenshot_game_window_region(
-            self.game_window,
-            self.resolution,
-            'suicide-button',
-            image_ops=[
-                (ImageOperation.grayscale, None),
-                (ImageOperation.colorize, {'black': '#000', 'white': '#fff', 'blackpoint': 30, 'whitepoint': 175}),
-                (ImageOperation.invert, None)
-            ]
-        )
+        return self.is_label_visible('suicide-button', 'suicide')
 
     def show_scoreboard(self, duration: float = .5) -> bool:
         # Press tab
         press_key(0x0f)
-        time.sleep(.25)
 
         # Scoreboard should be visible
-        if not self.is_scoreboard_visible():
+        if not self.wait_until(self.is_scoreboard_visible, .5, key='scoreboard-open'):
             release_key(0x0f)
             return False
 
@@ -956,21 +1096,18 @@ class GameInstanceManager:
 
         # Release tab
         release_key(0x0f)
-        time.sleep(.25)
 
         # Scoreboard should no longer be visible
-        return not self.is_scoreboard_visible()
+        return self.wait_until(lambda: not self.is_scoreboard_visible(), .5, key='scoreboard-closed')
 
+    @memoize_detector
     def is_scoreboard_visible(self) -> bool:
-        for side in ['table-icons-left', 'table-icons-right']:
-            histogram = histogram_screenshot_region(
-                self.game_window,
-                constants.COORDINATES[self.resolution]['hists']['scoreboard'][side]
-            )
-
+        sides = ['table-icons-left', 'table-icons-right']
+        histograms = self.histogram_regions([f'scoreboard/{side}' for side in sides])
+        for side, histogram in zip(sides, histograms):
             delta = calc_cv2_hist_delta(
                 histogram,
-                self.histograms[self.resolution]['scoreboard'][side]
+                self.histograms.get(self.resolution, 'scoreboard', side)
             )
 
             if delta >= constants.HISTCMP_MAX_DELTA:
@@ -991,9 +1128,7 @@ class GameInstanceManager:
         time.sleep(.2)
         mouse_click_in_game_window(self.game_window, legacy=True)
 
-        time.sleep(.5)
-
-        return not self.is_join_game_button_visible()
+        return self.wait_until(lambda: not self.is_join_game_button_visible(), 1, key='join-game')
 
     def close_game_message(self) -> None:
         # Move cursor onto ok button and click
@@ -0,0 +1,139 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from numpy import ndarray
+
+from BF2AutoSpectator.common.logger import logger
+from BF2AutoSpectator.common.utility import ImageOperation
+
+# Pixels above this value (after image operations) are considered background, anything else text
+LABEL_BINARIZE_THRESHOLD = 128
+# Padding to keep around the text when cropping templates (allows for small shifts in label position)
+LABEL_TEMPLATE_PADDING = 2
+
+IMAGE_OPS_INVERT = [(ImageOperation.invert, None)]
+IMAGE_OPS_BUTTON = [
+    (ImageOperation.grayscale, None),
+    (ImageOperation.colorize, {'black': '#000', 'white': '#fff', 'blackpoint': 30, 'whitepoint': 175}),
+    (ImageOperation.invert, None)
+]
+IMAGE_OPS_PLAY_NOW_BUTTON = [
+    (ImageOperation.grayscale, None),
+    (ImageOperation.colorize, {'black': '#000', 'white': '#fff', 'blackpoint': 100, 'whitepoint': 200})
+]
+
+# Fixed labels detectors check for, format: (ocr region key, label) -> image operations to apply before matching/OCR
+LABELS: Dict[Tuple[str, str], List[Tuple[ImageOperation, Optional[dict]]]] = {
+    ('game-message-header', 'game message'): IMAGE_OPS_INVERT,
+    ('quit-menu-item', 'quit'): IMAGE_OPS_BUTTON,
+    ('disconnect-prompt-header', 'disconnect'): IMAGE_OPS_INVERT,
+    ('disconnect-button', 'disconnect'): IMAGE_OPS_BUTTON,
+    ('play-now-button', 'play now'): IMAGE_OPS_PLAY_NOW_BUTTON,
+    ('connect-to-ip-button', 'connect to ip'): IMAGE_OPS_BUTTON,
+    ('join-game-button', 'join game'): IMAGE_OPS_BUTTON,
+    ('map-briefing-header', 'map briefing'): IMAGE_OPS_INVERT,
+    ('spawn-selected-text', 'select'): IMAGE_OPS_BUTTON,
+    ('spawn-selected-text', 'done'): IMAGE_OPS_BUTTON,
+    ('suicide-button', 'suicide'): IMAGE_OPS_BUTTON
+}
+
+
+def binarize_label_pixels(pixels: ndarray) -> ndarray:
+    """
+    Binarize (preprocessed) pixels of an OCR region
+    :param pixels: grayscale or RGB pixels
+    :return: binary pixels (0: text, 255: background)
+    """
+    if pixels.ndim == 3:
+        pixels = cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+
+    _, binary = cv2.threshold(pixels, LABEL_BINARIZE_THRESHOLD, 255, cv2.THRESH_BINARY)
+    return binary
+
+
+def crop_label_template(binary: ndarray) -> Optional[ndarray]:
+    """
+    Crop binarized pixels to the text they contain (plus padding)
+    :param binary: binary pixels (see binarize_label_pixels)
+    :return: cropped pixels or None if there is no text
+    """
+    rows, columns = np.nonzero(binary == 0)
+    if len(rows) == 0:
+        return None
+
+    height, width = binary.shape
+    top = max(rows.min() - LABEL_TEMPLATE_PADDING, 0)
+    bottom = min(rows.max() + LABEL_TEMPLATE_PADDING + 1, height)
+    left = max(columns.min() - LABEL_TEMPLATE_PADDING, 0)
+    right = min(columns.max() + LABEL_TEMPLATE_PADDING + 1, width)
+    return binary[top:bottom, left:right]
+
+
+def get_label_template_key(region_key: str, label: str) -> str:
+    return f'{region_key}/{label}'
+
+
+class LabelMatcher:
+    """
+    Detects fixed UI labels by normalized cross-correlation of binarized OCR regions with templates cropped from
+    reference frames (see build-label-templates). The UI font and label positions are fixed per resolution, so an exact
+    match is a lot cheaper (and just as reliable) than running the region through OCR.
+    """
+    resolution: str
+    templates: Dict[Tuple[str, str], ndarray]
+
+    def __init__(self, resolution: str, templates: Dict[Tuple[str, str], ndarray]):
+        self.resolution = resolution
+        self.templates = templates
+
+    @staticmethod
+    def load(path: str, resolution: str) -> 'LabelMatcher':
+        with np.load(path) as data:
+            if str(data['resolution']) != resolution:
+                raise ValueError(f'Label templates are for {data["resolution"]}, not {resolution}')
+
+            templates = {}
+            for region_key, label in LABELS:
+                key = get_label_template_key(region_key, label)
+                if key in data:
+                    templates[(region_key, label)] = data[key]
+
+        return LabelMatcher(resolution, templates)
+
+    def has(self, region_key: str, label: str) -> bool:
+        return (region_key, label) in self.templates
+
+    def match(self, pixels: ndarray, region_key: str, label: str) -> float:
+        """
+        Match a label template against the pixels of an OCR region
+        :param pixels: pixels of the region with the label's image operations applied
+        :param region_key: key of the region in coordinates dict
+        :param label: label to match
+        :return: confidence that the label is visible (normalized cross-correlation of best match, -1 to 1)
+        """
+        template = self.templates[(region_key, label)]
+        binary = binarize_label_pixels(pixels)
+        if binary.shape[0] < template.shape[0] or binary.shape[1] < template.shape[1]:
+            return 0.0
+
+        result = cv2.matchTemplate(binary, template, cv2.TM_CCOEFF_NORMED)
+        return float(np.nan_to_num(result).max())
+
+
+def get_label_templates_path(root_dir: str, resolution: str) -> str:
+    return os.path.join(root_dir, 'pickle', f'label-templates-{resolution}.npz')
+
+
+def load_label_matcher(root_dir: str, resolution: str) -> Optional[LabelMatcher]:
+    path = get_label_templates_path(root_dir, resolution)
+    if not os.path.isfile(path):
+        logger.debug(f'No label templates found for {resolution}, using OCR for all labels')
+        return None
+
+    try:
+        return LabelMatcher.load(path, resolution)
+    except (OSError, KeyError, ValueError) as e:
+        logger.error(f'Failed to load label templates, using OCR for all labels ({e})')
+        return None
@@ -0,0 +1,120 @@
+from collections import Counter
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+MAP_NAME_NGRAM_SIZE = 3
+# Number of names (sharing the most n-grams with an OCR result) to calculate the edit distance to
+MAP_NAME_CANDIDATES = 8
+
+# Number of resolved OCR results to remember (forgotten all at once when exceeded)
+MAP_NAME_RESOLVED_MAX_SIZE = 1024
+
+# Cost of substituting characters Tesseract commonly confuses in the BF2 UI font (any other substitution costs 1)
+OCR_CONFUSIONS: Dict[FrozenSet[str], float] = {
+    frozenset(pair): cost for pair, cost in [
+        ('gq', .2), ('ti', .3), ('il', .2), ('i1', .2), ('l1', .2), ('it', .3), ('lt', .4), ('o0', .2), ('e:', .3),
+        ('ec', .4), ('ea', .5), ('ao', .5), ('s5', .3), ('b8', .4), ('b6', .4), ('z2', .4), ('uv', .4), ('nh', .5),
+        ('rn', .5), ('mn', .5), ('fl', .5), ('jl', .5), ('yv', .5), ('kx', .5), ('ce', .4), ('o8', .5), ('-.', .2)
+    ]
+}
+# Cost of a missing/extra character, separators are often dropped or picked up from gaps between words
+OCR_INDEL_COST = 1.0
+OCR_SEPARATOR_INDEL_COST = .5
+OCR_SEPARATORS = {'-', ':', '.', "'"}
+
+
+# Substitution costs by character pair in both directions (faster to look up than building a frozenset per pair)
+OCR_SUBSTITUTION_COSTS: Dict[Tuple[str, str], float] = {
+    (a, b): cost for pair, cost in OCR_CONFUSIONS.items() for a in pair for b in pair if a != b
+}
+
+
+def get_indel_cost(char: str) -> float:
+    return OCR_SEPARATOR_INDEL_COST if char in OCR_SEPARATORS else OCR_INDEL_COST
+
+
+def calc_ocr_edit_distance(a: str, b: str, max_distance: float = float('inf')) -> float:
+    """
+    Calculate the (Levenshtein) edit distance of two strings, weighted by how likely OCR is to produce each edit
+    :param a: OCR result
+    :param b: known string
+    :param max_distance: distance above which to stop calculating (returns inf)
+    :return:
+    """
+    costs = OCR_SUBSTITUTION_COSTS
+    indel_b = [get_indel_cost(char) for char in b]
+    previous = [0.0]
+    for cost in indel_b:
+        previous.append(previous[-1] + cost)
+
+    for char_a in a:
+        indel_a = get_indel_cost(char_a)
+        current = [previous[0] + indel_a]
+        for j, char_b in enumerate(b):
+            current.append(min(
+                previous[j + 1] + indel_a,
+                current[j] + indel_b[j],
+                previous[j] + (0.0 if char_a == char_b else costs.get((char_a, char_b), 1.0))
+            ))
+        # Distance can only grow from here on
+        if min(current) > max_distance:
+            return float('inf')
+        previous = current
+
+    return previous[-1]
+
+
+def get_ngrams(text: str) -> Set[str]:
+    padded = f'^{text}$'
+    return {padded[i:i + MAP_NAME_NGRAM_SIZE] for i in range(max(len(padded) - MAP_NAME_NGRAM_SIZE + 1, 1))}
+
+
+class MapNameIndex:
+    """
+    Resolves (normalized) OCR results of map names to known map names. Candidates are looked up via shared character
+    n-grams, then ranked by an edit distance weighted with common OCR confusions (e.g. "g"/"q", "t"/"i").
+    """
+    names: Set[str]
+    ngrams: Dict[str, List[str]]
+    resolved: Dict[str, Tuple[Optional[str], float]]
+
+    def __init__(self, names: Iterable[str]):
+        self.names = set(names)
+        self.ngrams = {}
+        for name in sorted(self.names):
+            for ngram in get_ngrams(name):
+                self.ngrams.setdefault(ngram, []).append(name)
+        # The same (mis)reads tend to come up over and over, so remember any results
+        self.resolved = {}
+
+    def get_candidates(self, text: str) -> List[str]:
+        counts = Counter(name for ngram in get_ngrams(text) for name in self.ngrams.get(ngram, []))
+        if len(counts) == 0:
+            # OCR result does not share a single n-gram with any known name, so any name is as good a candidate
+            return sorted(self.names)
+
+        return [name for name, _ in counts.most_common(MAP_NAME_CANDIDATES)]
+
+    def resolve(self, text: str) -> Tuple[Optional[str], float]:
+        """
+        Find the known map name most similar to an OCR result
+        :param text: normalized OCR result
+        :return: best matching map name and score (0 to 1, 1 being an exact match)
+        """
+        if text in self.names:
+            return text, 1.0
+        elif text in self.resolved:
+            return self.resolved[text]
+
+        best, best_score = None, 0.0
+        for name in self.get_candidates(text):
+            length = max(len(text), len(name))
+            # Only calculate as much of the distance as needed to tell whether the name scores better than the best one
+            distance = calc_ocr_edit_distance(text, name, (1.0 - best_score) * length)
+            score = 1.0 - distance / length
+            if score > best_score:
+                best, best_score = name, score
+
+        if len(self.resolved) >= MAP_NAME_RESOLVED_MAX_SIZE:
+            self.resolved.clear()
+        self.resolved[text] = best, best_score
+        return best, best_score
@@ -0,0 +1,157 @@
+import os
+from enum import Enum
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+from numpy import ndarray
+
+from BF2AutoSpectator.common import constants
+from BF2AutoSpectator.common.logger import logger
+from BF2AutoSpectator.common.utility import crop_pixels, scale_crop, get_resolution_window_size
+
+SCREEN_FEATURE_SCALE = .25
+SCREEN_FEATURE_BINS = 8
+SCREEN_FEATURE_EDGE_MIN_DELTA = 32
+SCREEN_FEATURE_MIN_REGION_SIZE = 2
+# Second-nearest other screen needs to be this much further away than the nearest for a result to be unambiguous
+SCREEN_CLASSIFIER_MIN_MARGIN = 1.5
+
+
+class Screen(str, Enum):
+    Menu = 'menu'
+    GameMessage = 'game-message'
+    RoundEnd = 'round-end'
+    Loading = 'loading'
+    MapBriefing = 'map-briefing'
+    SpawnMenu = 'spawn-menu'
+    Scoreboard = 'scoreboard'
+    Console = 'console'
+    Spectating = 'spectating'
+
+
+def get_feature_crops(resolution: str) -> List[Tuple[int, int, int, int]]:
+    """
+    Get the (downscaled) crops of all regions any detectors look at
+    :param resolution: resolution to get crops for
+    :return: crops, format: (left, top, right, bottom)
+    """
+    coordinates = constants.COORDINATES[resolution]
+    crops = [crop for crops in coordinates['ocr'].values() for crop in crops]
+    crops.extend(coordinates['hists']['teams'])
+    for group in ['menu', 'eor', 'spawn-menu', 'scoreboard']:
+        crops.extend(coordinates['hists'][group].values())
+    # Include the whole frame as well
+    crops.append((0, 0, 0, 0))
+
+    width, height = get_frame_size(resolution)
+    scaled = []
+    for crop in crops:
+        left, top, right, bottom = scale_crop(crop, SCREEN_FEATURE_SCALE)
+        if width - left - right >= SCREEN_FEATURE_MIN_REGION_SIZE and \
+                height - top - bottom >= SCREEN_FEATURE_MIN_REGION_SIZE and \
+                (left, top, right, bottom) not in scaled:
+            scaled.append((left, top, right, bottom))
+
+    return scaled
+
+
+def get_frame_size(resolution: str) -> Tuple[int, int]:
+    width, height = get_resolution_window_size(resolution)
+    return round(width * SCREEN_FEATURE_SCALE), round(height * SCREEN_FEATURE_SCALE)
+
+
+def calc_screen_features(pixels: ndarray, crops: List[Tuple[int, int, int, int]]) -> ndarray:
+    """
+    Calculate the feature vector of a frame: a coarse grayscale histogram, the mean edge strength and the share of edge
+    pixels for every region
+    :param pixels: RGB pixels of the game window client area (at full resolution)
+    :param crops: downscaled crops of the regions (see get_feature_crops)
+    :return: feature vector
+    """
+    small = cv2.resize(pixels, None, fx=SCREEN_FEATURE_SCALE, fy=SCREEN_FEATURE_SCALE, interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+    edges = cv2.addWeighted(
+        cv2.convertScaleAbs(cv2.Sobel(gray, cv2.CV_16S, 1, 0)), .5,
+        cv2.convertScaleAbs(cv2.Sobel(gray, cv2.CV_16S, 0, 1)), .5,
+        0
+    )
+
+    features = []
+    for crop in crops:
+        region = crop_pixels(gray, crop)
+        region_edges = crop_pixels(edges, crop)
+        histogram = cv2.calcHist([region], [0], None, [SCREEN_FEATURE_BINS], [0, 256]).ravel()
+        features.extend(histogram / region.size)
+        features.append(region_edges.mean() / 255)
+        features.append(np.count_nonzero(region_edges > SCREEN_FEATURE_EDGE_MIN_DELTA) / region.size)
+
+    return np.array(features, dtype=np.float32)
+
+
+class ScreenClassifier:
+    """
+    Identifies the current screen by nearest neighbour lookup of a frame's features in features of labelled reference
+    frames (see build-screen-references)
+    """
+    resolution: str
+    crops: List[Tuple[int, int, int, int]]
+    features: ndarray
+    labels: ndarray
+    mean: ndarray
+    std: ndarray
+    max_distance: float
+
+    def __init__(self, resolution: str, features: ndarray, labels: ndarray, max_distance: float):
+        self.resolution = resolution
+        self.crops = get_feature_crops(resolution)
+        if features.shape[1] != len(self.crops) * (SCREEN_FEATURE_BINS + 2):
+            raise ValueError('Screen references do not match current feature layout, please rebuild them')
+
+        # Standardize features, so every feature contributes equally to distances
+        self.mean = features.mean(axis=0)
+        self.std = np.maximum(features.std(axis=0), 1e-3)
+        self.features = (features - self.mean) / self.std
+        self.labels = labels
+        self.max_distance = max_distance
+
+    @staticmethod
+    def load(path: str, resolution: str) -> 'ScreenClassifier':
+        with np.load(path) as data:
+            if str(data['resolution']) != resolution:
+                raise ValueError(f'Screen references are for {data["resolution"]}, not {resolution}')
+            return ScreenClassifier(resolution, data['features'], data['labels'], float(data['max_distance']))
+
+    def classify(self, pixels: ndarray) -> Tuple[Screen, float, bool]:
+        """
+        Classify a frame
+        :param pixels: RGB pixels of the game window client area
+        :return: nearest screen, distance to it and whether the result is unambiguous
+        """
+        features = (calc_screen_features(pixels, self.crops) - self.mean) / self.std
+        distances = np.sqrt(np.mean((self.features - features) ** 2, axis=1))
+
+        nearest = np.argmin(distances)
+        screen, distance = Screen(self.labels[nearest]), float(distances[nearest])
+        others = distances[self.labels != self.labels[nearest]]
+        second_distance = float(others.min()) if len(others) > 0 else np.inf
+
+        unambiguous = distance <= self.max_distance and second_distance >= distance * SCREEN_CLASSIFIER_MIN_MARGIN
+        return screen, distance, unambiguous
+
+
+def get_screen_references_path(root_dir: str, resolution: str) -> str:
+    return os.path.join(root_dir, 'pickle', f'screen-references-{resolution}.npz')
+
+
+def load_screen_classifier(root_dir: str, resolution: str) -> Optional[ScreenClassifier]:
+    path = get_screen_references_path(root_dir, resolution)
+    if not os.path.isfile(path):
+        logger.debug(f'No screen references found for {resolution}, screen classification is disabled')
+        return None
+
+    try:
+        return ScreenClassifier.load(path, resolution)
+    except (OSError, KeyError, ValueError) as e:
+        logger.error(f'Failed to load screen references, screen classification is disabled ({e})')
+        return None
@@ -0,0 +1,359 @@
+from datetime import datetime
+from typing import Callable, Dict
+
+from BF2AutoSpectator.common.classes import GamePhase
+from BF2AutoSpectator.common.commands import CommandStore, CommandPriority
+from BF2AutoSpectator.common.config import Config
+from BF2AutoSpectator.common.exceptions import SpawnCoordinatesNotAvailableException
+from BF2AutoSpectator.common.logger import logger
+from BF2AutoSpectator.game import GameInstanceManager, GameInstanceState
+from BF2AutoSpectator.phase_machine import PhaseMachine
+from BF2AutoSpectator.scheduler import TickScheduler
+
+
+class PhaseHandlers:
+    """
+    Acts on the results of the main loop's detectors while on a server (loading, between rounds, spawning and
+    spectating phases), entering phases as the round progresses. Any game input and any further detection is done via
+    the game instance manager.
+    """
+    gim: GameInstanceManager
+    gis: GameInstanceState
+    config: Config
+    pm: PhaseMachine
+    cs: CommandStore
+    scheduler: TickScheduler
+    on_player_rotation: Callable[[], None]
+    handlers: Dict[GamePhase, Callable[[Dict[str, bool], bool], None]]
+
+    def __init__(self, gim: GameInstanceManager, config: Config, pm: PhaseMachine, cs: CommandStore,
+                 scheduler: TickScheduler, on_player_rotation: Callable[[], None]):
+        """
+        :param on_player_rotation: function to call after rotating to the next player, e.g.
+                                   ControllerClient.report_player_rotation
+        """
+        self.gim = gim
+        self.gis = gim.get_state()
+        self.config = config
+        self.pm = pm
+        self.cs = cs
+        self.scheduler = scheduler
+        self.on_player_rotation = on_player_rotation
+        # Handlers for phases on a server, (unexpectedly) being in any other phase there is handled like between rounds
+        self.handlers = {
+            GamePhase.loading: self.handle_between_rounds,
+            GamePhase.betweenRounds: self.handle_between_rounds,
+            GamePhase.spawning: self.handle_in_round,
+            GamePhase.spectating: self.handle_in_round
+        }
+
+    def handle(self, results: Dict[str, bool], force_next_player: bool = False) -> None:
+        """
+        Act on detector results using the handler for the current phase
+        :param results: results of the round end screen, map loading, map briefing and default camera view detectors
+        :param force_next_player: whether to rotate to the next player (if spectating) as requested via controller
+        """
+        self.handlers.get(self.pm.get_phase(), self.handle_between_rounds)(results, force_next_player)
+
+    def sleep(self, default: float) -> None:
+        """
+        Wait for the next tick, which is due sooner the closer the current phase is to its expected end
+        :param default: number of seconds to wait if the end of the phase cannot be estimated
+        """
+        self.scheduler.sleep(
+            self.pm.get_phase(), self.gis.get_rotation_map_name(), self.pm.get_phase_duration(), default
+        )
+
+    def handle_between_rounds(self, results: Dict[str, bool], force_next_player: bool) -> None:
+        """
+        Act on the round end screen, map loading and map briefing (loading and between rounds phases)
+        :param results: results of the round end screen, map loading, map briefing and default camera view detectors
+        """
+        if results['map-loading']:
+            logger.info('Map is loading')
+            # Reset state once if it still reflected to be "in" the round
+            if self.gis.round_entered():
+                logger.info('Performing map rotation reset')
+                self.pm.enter(GamePhase.betweenRounds)
+                self.gis.map_rotation_reset()
+                self.cs.wait(6, CommandPriority.high)
+                return
+
+            # Set loading phase *after* between rounds phase to make sure we go spectating -> between rounds -> loading
+            # (and before waiting, so the wait is based on how long loading has been going on for)
+            self.pm.enter(GamePhase.loading)
+
+            # Suspend/delay map loading to avoid a modified content kick on map switches
+            delay = self.config.get_map_load_delay()
+            if delay > 0 and not self.gis.rotation_map_load_delayed() and self.gim.delay_map_load(delay):
+                self.gis.set_rotation_map_load_delayed(True)
+            elif delay == 0 or self.gis.rotation_map_load_delayed():
+                self.sleep(3)
+        elif results['map-briefing']:
+            logger.info('Map briefing present, checking map')
+            map_name, map_size, game_mode = self.gim.get_map_details()
+
+            # Update map state if relevant and required
+            # Map size should always be != -1 even for unknown maps, only reason for it being -1 would be that the map
+            # briefing was no longer visible when map size was checked
+            if map_size != -1 and (
+                    map_name != self.gis.get_rotation_map_name() or
+                    map_size != self.gis.get_rotation_map_size() or
+                    game_mode != self.gis.get_rotation_game_mode()
+            ):
+                logger.debug(f'Updating map state: {map_name}/{map_size}/{game_mode}')
+                self.gis.set_rotation_map_name(map_name)
+                self.gis.set_rotation_map_size(map_size)
+                self.gis.set_rotation_game_mode(game_mode)
+
+            # Give go-ahead for active joining
+            if map_size != -1 and not self.gis.active_join_pending():
+                logger.debug('Enabling active joining')
+                self.gis.set_active_join_possible(after=10)
+
+            # Try to join the game if active join is possible
+            if self.gis.active_join_possible() and self.gim.join_game():
+                logger.debug('Entered game by clicking "Join game" button')
+
+            self.sleep(3)
+        elif results['round-end-screen']:
+            logger.info('Game is on round finish screen')
+            # Reset state once if it still reflected to be "in" the round
+            if self.gis.round_entered():
+                logger.info('Performing round end reset')
+                self.pm.enter(GamePhase.betweenRounds)
+                self.gis.round_end_reset()
+                return
+
+            """
+            When server "rotates" on the same map, we enter the loading state and reset the map details.
+            However, the map briefing is not opened automatically. So unless we open it manually, we never see the
+            map briefing and thus cannot detect the map.
+            """
+            if self.gim.is_join_game_button_visible():
+                logger.info('Join game button is visible but map briefing is not, opening map briefing')
+                if not self.gim.open_map_briefing():
+                    logger.error('Failed to open map briefing, attempting to join game and queuing reconnect')
+                    # We need to join the game, else the ESC press to open the menu will join the game instead of
+                    # opening the menu
+                    self.gim.join_game()
+                    self.gis.set_spectator_on_server(False)
+                return
+            self.sleep(3)
+        else:
+            # Round end screen is gone, new round has started
+            self.handle_round(results, force_next_player)
+
+    def handle_in_round(self, results: Dict[str, bool], force_next_player: bool) -> None:
+        """
+        Watch for the round to end, else continue spawning/spectating (spawning and spectating phases)
+        :param results: results of the round end screen and default camera view detectors
+        """
+        if results['round-end-screen']:
+            # Map loading and map briefing are part of the round end screen, so leave checking for them (and any
+            # state reset) to between rounds
+            logger.info('Game is on round finish screen, round ended')
+            self.pm.enter(GamePhase.betweenRounds)
+        else:
+            self.handle_round(results, force_next_player)
+
+    def handle_round(self, results: Dict[str, bool], force_next_player: bool) -> None:
+        """
+        Start spectating or, once spawned, spectate (any phase on the server once the round end screen is gone)
+        """
+        if self.gis.round_spawned():
+            self.handle_spectating(results, force_next_player)
+        else:
+            self.handle_spawning(results, force_next_player)
+
+    def handle_spawning(self, results: Dict[str, bool], force_next_player: bool) -> None:
+        """
+        Start spectating, via freecam toggle if possible, via spawn-suicide otherwise
+        """
+        if results['default-camera-view'] and not self.gis.round_freecam_toggle_spawn_attempted():
+            # Try to restart spectating without suiciding on consecutive rounds (only works on freecam-enabled servers)
+            logger.info('Game is on default camera view, trying to (re-)start spectating via freecam toggle')
+            self.gis.set_map_loading(False)
+            self.gim.start_spectating_via_freecam_toggle()
+            self.gis.set_round_freecam_toggle_spawn_attempted(True)
+            self.cs.wait(.5, CommandPriority.high)
+            # Set round spawned to true of default camera view is no longer visible, else enable hud for spawn-suicide
+            if not self.gim.is_default_camera_view_visible():
+                logger.info('Started spectating via freecam toggle, skipping spawn-suicide')
+                self.pm.enter(GamePhase.spectating)
+                self.gis.set_round_spawned(True)
+                self.gis.increment_round_num()
+                logger.debug(f'Entering round #{self.gis.get_round_num()} using this instance')
+                # Spectator has "entered" round, update state accordingly
+                self.gis.set_round_entered(True)
+                # We entered a new round, so we most likely won't be on the player the rotation was originally paused on
+                # => unpause rotation
+                self.config.unpause_player_rotation()
+                # No need to immediately rotate to next player (usually done after spawn-suicide)
+                # => set iteration counter to 0
+                self.gis.reset_iterations_on_player()
+            else:
+                # Don't log this as an error since it's totally normal
+                logger.info('Failed to start spectating via freecam toggle, continuing to spawn-suicide')
+        else:
+            # Loaded into map, now trying to start spectating
+            self.pm.enter(GamePhase.spawning)
+            self.gis.set_map_loading(False)
+            # Re-enable hud if required
+            if self.gis.hud_hidden():
+                # Give game time to swap teams (toggling hud next iteration if a command needs to be acted on first)
+                if self.cs.wait(3, CommandPriority.high):
+                    return
+                # Re-enable hud
+                logger.info('Enabling hud')
+                if not self.gim.toggle_hud(1):
+                    logger.error(f'Failed to toggle hud, restart required')
+                    self.gis.set_error_restart_required(True)
+                    return
+                # Update state
+                self.gis.set_hud_hidden(False)
+                self.cs.wait(1, CommandPriority.high)
+
+            if not self.gim.is_spawn_menu_visible():
+                logger.info('Spawn menu not visible, opening with enter')
+                self.gim.open_spawn_menu()
+                # Force another attempt re-enable hud
+                self.gis.set_hud_hidden(True)
+                return
+
+            logger.info('Determining team')
+            current_team = self.gim.get_player_team()
+            if current_team is not None:
+                self.gis.set_round_team(current_team)
+                self.gis.set_round_spawn_randomize_coordinates(False)
+                logger.debug(f'Current team index is {self.gis.get_round_team()} '
+                             f'({"USMC/EU/..." if self.gis.get_round_team() == 0 else "MEC/CHINA/..."})')
+            elif self.gim.spawn_coordinates_available():
+                # We should be able to detect the team if we have spawn coordinates for the map/size/game mode
+                # combination
+                logger.error('Failed to determine current team, retrying')
+                # Force another attempt re-enable hud
+                self.gis.set_hud_hidden(True)
+                return
+            elif not self.gis.get_round_spawn_randomize_coordinates():
+                # If we were not able to detect a team and map/size/game mod combination is not supported,
+                # assume that team detection is not available (unsupported mod/custom map)
+                logger.warning('Team detection is not available, switching to spawn point coordinate randomization')
+                self.gis.set_round_spawn_randomize_coordinates(True)
+
+            """
+            BF2 sometimes gets stuck on the spawn menu. It will ignore any mouse input,
+            so no spawn point can be selected. This can usually be fixed by opening the scoreboard once.
+            """
+            if (self.gis.get_iterations_on_spawn_menu() + 1) % self.config.get_lockup_iterations_on_spawn_menu() == 0:
+                logger.warning('Spawn menu may have locked up, trying to recover by toggling scoreboard')
+                if not self.gim.show_scoreboard():
+                    logger.error('Scoreboard did not open/close when trying to recover from spawn menu lockup, '
+                                 'restart required')
+                    self.gis.set_error_restart_required(True)
+                    return
+
+            logger.info('Spawning once')
+            spawn_succeeded = False
+            if not self.gis.get_round_spawn_randomize_coordinates():
+                try:
+                    spawn_succeeded = self.gim.spawn_suicide()
+                except SpawnCoordinatesNotAvailableException:
+                    logger.warning(f'Spawn point coordinates not available for current combination of '
+                                   f'map/size/game mode '
+                                   f'({self.gis.get_rotation_map_name()}/'
+                                   f'{self.gis.get_rotation_map_size()}/'
+                                   f'{self.gis.get_rotation_game_mode()}), '
+                                   f'switching to spawn point coordinate randomization')
+                    self.gis.set_round_spawn_randomize_coordinates(True)
+
+            if self.gis.get_round_spawn_randomize_coordinates():
+                logger.info(f'Attempting to spawn by selecting randomly generated spawn point coordinates')
+                spawn_succeeded = self.gim.spawn_suicide(randomize=True)
+
+            if spawn_succeeded:
+                logger.info('Spawn succeeded')
+                self.gis.reset_iterations_on_spawn_menu()
+            else:
+                logger.warning('Spawn failed, retrying')
+                self.gis.increment_iterations_on_spawn_menu()
+            self.gis.set_round_spawned(spawn_succeeded)
+
+            # Set counter to max to skip spectator
+            self.gis.set_iterations_on_player(self.config.get_max_iterations_on_player())
+            # Unpause in order to not stay on the spectator after suicide
+            self.config.unpause_player_rotation()
+
+    def handle_spectating(self, results: Dict[str, bool], force_next_player: bool) -> None:
+        """
+        Rotate through players, recovering from the game going back to the default camera view
+        """
+        if results['default-camera-view'] and self.gis.get_iterations_on_default_camera_view() == 0:
+            # In rare cases, an AFK/dead player might be detected as the default camera view
+            # => try to rotate to next player to "exit" what is detected as the default camera view
+            logger.info('Game is on default camera view, trying to rotate to next player')
+            self.gim.rotate_to_next_player()
+            self.gis.increment_iterations_on_default_camera_view()
+            self.cs.wait(3)
+        elif results['default-camera-view'] and \
+                self.gis.get_iterations_on_default_camera_view() < \
+                self.config.get_max_iterations_on_default_camera_view():
+            # Default camera view is visible after spawning once, either after a round restart or after the round ended
+            logger.info('Game is still on default camera view, waiting to see if round ended')
+            self.gis.increment_iterations_on_default_camera_view()
+            self.cs.wait(3)
+        elif results['default-camera-view'] and \
+                self.gis.get_iterations_on_default_camera_view() == \
+                self.config.get_max_iterations_on_default_camera_view():
+            # Default camera view has been visible for a while, most likely due to a round restart
+            # => try to restart spectating by pressing space (only works on freecam-enabled servers)
+            logger.info('Game is still on default camera view, trying to (re-)start spectating via freecam toggle')
+            self.gim.start_spectating_via_freecam_toggle()
+            self.gis.increment_iterations_on_default_camera_view()
+            self.cs.wait(3)
+        elif results['default-camera-view'] and \
+                self.gis.get_iterations_on_default_camera_view() > \
+                self.config.get_max_iterations_on_default_camera_view():
+            # Default camera view has been visible for a while, failed to restart spectating by pressing space
+            # => spawn-suicide again to restart spectating
+            logger.info('Game is still on default camera view, queueing another spawn-suicide to restart spectating')
+            self.gis.set_round_spawned(False)
+            self.gis.reset_iterations_on_default_camera_view()
+        elif not self.gis.hud_hidden():
+            logger.info('Hiding hud')
+            if not self.gim.toggle_hud(0):
+                logger.error(f'Failed to toggle hud, restart required')
+                self.gis.set_error_restart_required(True)
+                return
+            self.pm.enter(GamePhase.spectating)
+            self.gis.set_hud_hidden(True)
+        elif not self.gis.round_entered():
+            self.gis.increment_round_num()
+            logger.debug(f'Entering round #{self.gis.get_round_num()} using this instance')
+            # Spectator has "entered" round, update state accordingly
+            self.gis.set_round_entered(True)
+        elif self.gis.get_iterations_on_player() < self.config.get_max_iterations_on_player() and \
+                not self.config.player_rotation_paused() and not force_next_player:
+            # Check if player is afk
+            if not self.gim.is_sufficient_action_on_screen():
+                logger.info('Insufficient action on screen')
+                self.gis.set_iterations_on_player(self.config.get_max_iterations_on_player())
+            else:
+                logger.info('Nothing to do, stay on player')
+                self.gis.increment_iterations_on_player()
+                self.cs.wait(2)
+        elif self.config.player_rotation_paused() and not force_next_player:
+            logger.info(f'Player rotation is paused until {self.config.get_player_rotation_paused_until().isoformat()}')
+            # If rotation pause flag is still set even though the pause expired, remove the flag
+            if self.config.get_player_rotation_paused_until() < datetime.now():
+                logger.info('Player rotation pause expired, re-enabling rotation')
+                self.config.unpause_player_rotation()
+                # Set counter to max to rotate off current player right away
+                self.gis.set_iterations_on_player(self.config.get_max_iterations_on_player())
+            else:
+                self.cs.wait(2)
+        else:
+            logger.info('Rotating to next player')
+            self.gim.rotate_to_next_player()
+            self.on_player_rotation()
+            self.gis.reset_iterations_on_player()
@@ -0,0 +1,144 @@
+import time
+from typing import Callable, Dict, List, Optional, Set, Union
+
+from BF2AutoSpectator.common.classes import GamePhase
+from BF2AutoSpectator.common.logger import logger
+
+# Phases which can be entered from any phase (errors, game messages and controller commands)
+PHASE_ENTERABLE_FROM_ANY: Set[GamePhase] = {
+    GamePhase.inMenu, GamePhase.closing, GamePhase.starting, GamePhase.stopping, GamePhase.halted
+}
+# Phases which can be entered from a given phase (in addition to the above)
+PHASE_TRANSITIONS: Dict[GamePhase, Set[GamePhase]] = {
+    GamePhase.initial: {GamePhase.launching},
+    GamePhase.launching: {GamePhase.launching},
+    GamePhase.inMenu: {GamePhase.loading},
+    GamePhase.loading: {GamePhase.spawning, GamePhase.spectating, GamePhase.betweenRounds},
+    GamePhase.spawning: {GamePhase.spectating, GamePhase.loading, GamePhase.betweenRounds},
+    GamePhase.spectating: {GamePhase.spawning, GamePhase.loading, GamePhase.betweenRounds},
+    GamePhase.betweenRounds: {GamePhase.loading, GamePhase.spawning, GamePhase.spectating},
+    GamePhase.closing: {GamePhase.launching, GamePhase.stopped},
+    GamePhase.starting: set(),
+    GamePhase.stopping: set(),
+    GamePhase.stopped: set(),
+    GamePhase.halted: set()
+}
+
+# Detectors (and detector-like steps) which can cause a transition out of/are of any use in a phase,
+# phases not listed here run all of them
+PHASE_DETECTORS: Dict[GamePhase, Set[str]] = {
+    # Game messages (errors, kicks) can pop up in any phase, including on top of the menu
+    GamePhase.initial: {'game-message'},
+    GamePhase.launching: {'game-message'},
+    GamePhase.inMenu: {'game-message'},
+    # Loading ends on the default camera view of the new map, which is also where the map can be identified (when
+    # joining mid-round) and the default camera view be learned (before spawning)
+    GamePhase.loading: {
+        'game-message', 'round-end-screen', 'map-loading', 'map-briefing', 'default-camera-view',
+        'map-identification', 'camera-view-learning'
+    },
+    # Map and camera view are dealt with while loading, spawning only needs the default camera view (to start
+    # spectating via freecam toggle instead of spawn-suicide)
+    GamePhase.spawning: {'game-message', 'round-end-screen', 'default-camera-view'},
+    # Map loading/briefing are part of the round end screen, so watching for the latter is enough to end spectating
+    # (the former are checked between rounds)
+    GamePhase.spectating: {'game-message', 'round-end-screen', 'default-camera-view'},
+    # Round end screen covers the game view, so neither map identification nor learning can work (default camera view
+    # is still required to start spectating via freecam toggle after a round restart on the same map)
+    GamePhase.betweenRounds: {'game-message', 'round-end-screen', 'map-loading', 'map-briefing', 'default-camera-view'},
+    GamePhase.closing: {'game-message'},
+    GamePhase.starting: {'game-message'},
+    GamePhase.stopping: {'game-message'},
+    GamePhase.stopped: {'game-message'},
+    GamePhase.halted: {'game-message'}
+}
+
+
+class PhaseMachine:
+    """
+    Tracks the phase the spectator is in, reporting any phase entered to listeners (e.g. the controller). Transitions
+    are driven by the main loop, the machine decides which detectors need to be run in the current phase.
+    """
+    __phase: GamePhase
+    __entered_at: float
+    __detectors: Dict[GamePhase, Set[str]]
+    __listeners: List[Callable[..., None]]
+    __transition_listeners: List[Callable[[GamePhase, GamePhase, float], None]]
+
+    def __init__(self, phase: GamePhase = GamePhase.initial, detectors: Optional[Dict[GamePhase, Set[str]]] = None):
+        self.__phase = phase
+        self.__entered_at = time.monotonic()
+        self.__detectors = detectors if detectors is not None else PHASE_DETECTORS
+        self.__listeners = []
+        self.__transition_listeners = []
+
+    def add_listener(self, listener: Callable[..., None]) -> None:
+        """
+        Add a listener to call with any phase entered (and the details passed to enter)
+        :param listener: function to call, e.g. ControllerClient.update_game_phase
+        """
+        self.__listeners.append(listener)
+
+    def add_transition_listener(self, listener: Callable[[GamePhase, GamePhase, float], None]) -> None:
+        """
+        Add a listener to call on any phase change
+        :param listener: function to call with the previous phase, the new phase and the time spent in the previous
+                         phase
+        """
+        self.__transition_listeners.append(listener)
+
+    def get_phase(self) -> GamePhase:
+        return self.__phase
+
+    def get_phase_duration(self) -> float:
+        """
+        Get the number of seconds spent in the current phase
+        """
+        return time.monotonic() - self.__entered_at
+
+    def enter(self, phase: GamePhase, **kwargs: Union[str, int, dict]) -> bool:
+        """
+        Enter a phase, (re-)reporting it to listeners even if it is the current phase
+        :param phase: phase to enter
+        :param kwargs: details to pass to listeners along with the phase
+        :return: True if phase was changed, False if already in phase
+        """
+        changed = phase is not self.__phase
+        if changed:
+            if not is_transition_expected(self.__phase, phase):
+                logger.debug(f'Unexpected phase transition: {self.__phase.value} -> {phase.value}')
+            previous, duration = self.__phase, self.get_phase_duration()
+            logger.debug(f'Entering phase {phase.value} after {duration:.1f}s in phase {previous.value}')
+            self.__phase = phase
+            self.__entered_at = time.monotonic()
+            for listener in self.__transition_listeners:
+                listener(previous, phase, duration)
+
+        for listener in self.__listeners:
+            listener(phase, **kwargs)
+
+        return changed
+
+    def is_relevant(self, detector: str) -> bool:
+        """
+        Check whether a detector needs to be run in the current phase
+        :param detector: name of the detector
+        :return: True if detector can cause a transition in the current phase
+        """
+        detectors = self.__detectors.get(self.__phase)
+        return detectors is None or detector in detectors
+
+    def evaluate(self, evaluate: Callable[[List[str]], Dict[str, bool]], names: List[str]) -> Dict[str, bool]:
+        """
+        Evaluate detectors relevant in the current phase, treating any other detectors as negative
+        :param evaluate: function to evaluate detectors with (e.g. DetectorPlanner.evaluate)
+        :param names: names of detectors to evaluate
+        :return: results of the given detectors
+        """
+        relevant = [name for name in names if self.is_relevant(name)]
+        results = evaluate(relevant) if len(relevant) > 0 else {}
+        return {name: results.get(name, False) for name in names}
+
+
+def is_transition_expected(current: GamePhase, phase: GamePhase) -> bool:
+    return phase in PHASE_ENTERABLE_FROM_ANY or phase in PHASE_TRANSITIONS.get(current, set())
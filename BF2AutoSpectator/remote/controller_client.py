@@ -1,27 +1,12 @@
-from enum import Enum
 from typing import Union
 
 import socketio
 
+from BF2AutoSpectator.common.classes import GamePhase
 from BF2AutoSpectator.common.commands import CommandStore
 from BF2AutoSpectator.common.logger import logger
 
 
-class GamePhase(str, Enum):
-    initial = 'initializing'
-    launching = 'launching'
-    inMenu = 'in-menu'
-    loading = 'loading'
-    spawning = 'spawning'
-    spectating = 'spectating'
-    betweenRounds = 'between-rounds'
-    closing = 'closing'
-    starting = 'starting'
-    stopping = 'stopping'
-    stopped = 'stopped'
-    halted = 'halted'
-
-
 class ControllerClient:
     base_uri: str
 
@@ -0,0 +1,174 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from BF2AutoSpectator.common.classes import GamePhase
+from BF2AutoSpectator.common.commands import CommandStore
+from BF2AutoSpectator.common.logger import logger
+
+# Phases to learn durations of, along with the phases which end them "naturally"
+# (e.g. a loading phase ended by a kick says nothing about how long loading takes)
+SCHEDULED_PHASES: Dict[GamePhase, List[GamePhase]] = {
+    GamePhase.loading: [GamePhase.spawning, GamePhase.spectating],
+    GamePhase.betweenRounds: [GamePhase.loading]
+}
+
+# Number of most recent durations to keep per phase (and map)
+PHASE_DURATION_SAMPLES = 20
+# Number of durations required before basing any interval on them
+PHASE_DURATION_MIN_SAMPLES = 3
+# Quantile of durations to expect a transition at (rather early than late, to not miss it by polling too sparsely)
+PHASE_DURATION_EXPECTED_QUANTILE = .2
+# Min number of seconds between writes of observed durations to disk
+PHASE_DURATION_SAVE_INTERVAL = 600.0
+
+# Share of the time remaining until the expected transition to wait before polling again
+TICK_SCHEDULER_BACKOFF = .5
+TICK_SCHEDULER_MIN_INTERVAL = 1.0
+# Number of seconds past the expected transition to keep polling densely for (falling back to the default interval
+# after, since the phase is clearly taking longer than usual)
+TICK_SCHEDULER_MAX_OVERRUN = 20.0
+
+
+def get_duration_key(phase: GamePhase, map_name: Optional[str] = None) -> str:
+    return phase.value if map_name is None else f'{phase.value}/{map_name}'
+
+
+class PhaseDurationStore:
+    """
+    Durations of phases observed in past rounds, stored by phase and by phase and map (map loading times differ a lot)
+    """
+    path: str
+    durations: Dict[str, List[float]]
+    dirty: bool
+    saved_at: float
+
+    def __init__(self, path: str):
+        self.path = path
+        self.durations = {}
+        self.dirty = False
+        self.saved_at = time.monotonic()
+
+    def load(self) -> None:
+        if not os.path.isfile(self.path):
+            return
+
+        with open(self.path, 'r') as file:
+            data = json.load(file)
+
+        self.durations = {key: [float(duration) for duration in durations] for key, durations in data.items()}
+        logger.debug(f'Loaded durations of {len(self.durations)} phases/phase-map combinations')
+
+    def save(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Write to temporary file first to never leave a partially written store behind
+            temp_path = f'{self.path}.tmp'
+            with open(temp_path, 'w') as file:
+                json.dump(self.durations, file)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.error(f'Failed to write phase durations to disk ({e})')
+
+        # Don't retry failed writes right away either
+        self.dirty = False
+        self.saved_at = time.monotonic()
+
+    def save_if_due(self) -> None:
+        """
+        Write any recorded durations to disk if the last write is long enough ago (to not rewrite the store on every
+        record)
+        """
+        if self.dirty and time.monotonic() - self.saved_at >= PHASE_DURATION_SAVE_INTERVAL:
+            self.save()
+
+    def record(self, phase: GamePhase, map_name: Optional[str], duration: float) -> None:
+        """
+        Record an observed phase duration (in memory, see save_if_due for writing to disk)
+        :param phase: phase that ended
+        :param map_name: map the phase was observed on (if known)
+        :param duration: number of seconds spent in phase
+        """
+        keys = [get_duration_key(phase)]
+        if map_name is not None:
+            keys.append(get_duration_key(phase, map_name))
+
+        for key in keys:
+            durations = self.durations.setdefault(key, [])
+            durations.append(round(duration, 1))
+            del durations[:-PHASE_DURATION_SAMPLES]
+
+        self.dirty = True
+
+    def get_expected(self, phase: GamePhase, map_name: Optional[str] = None) -> Optional[float]:
+        """
+        Get the number of seconds after which a phase is expected to end
+        :param phase: phase to get expected duration of
+        :param map_name: map to get expected duration on (falls back to any map if not enough durations were observed)
+        :return: expected duration or None if not enough durations were observed
+        """
+        for key in [get_duration_key(phase, map_name), get_duration_key(phase)]:
+            durations = self.durations.get(key, [])
+            if len(durations) >= PHASE_DURATION_MIN_SAMPLES:
+                return sorted(durations)[int(len(durations) * PHASE_DURATION_EXPECTED_QUANTILE)]
+
+        return None
+
+
+class TickScheduler:
+    """
+    Determines how long to wait before checking for a phase transition again, based on observed phase durations. Polls
+    at the default interval early in a phase and increasingly densely as the expected transition approaches.
+    """
+    store: Optional[PhaseDurationStore]
+
+    def __init__(self, store: Optional[PhaseDurationStore]):
+        self.store = store
+
+    def on_transition(self, previous: GamePhase, phase: GamePhase, duration: float, map_name: Optional[str]) -> None:
+        if self.store is None:
+            return
+
+        if phase in SCHEDULED_PHASES.get(previous, []):
+            self.store.record(previous, map_name, duration)
+        self.store.save_if_due()
+
+    def get_interval(self, phase: GamePhase, map_name: Optional[str], elapsed: float, default: float) -> float:
+        """
+        Get the number of seconds to wait before the next tick
+        :param phase: current phase
+        :param map_name: current map (if known)
+        :param elapsed: number of seconds spent in phase
+        :param default: number of seconds to wait if no duration can be expected for phase (never waits any longer)
+        :return: number of seconds to wait
+        """
+        if self.store is None or phase not in SCHEDULED_PHASES:
+            return default
+
+        expected = self.store.get_expected(phase, map_name)
+        if expected is None:
+            return default
+
+        remaining = expected - elapsed
+        if remaining < -TICK_SCHEDULER_MAX_OVERRUN:
+            return default
+
+        return min(max(remaining * TICK_SCHEDULER_BACKOFF, TICK_SCHEDULER_MIN_INTERVAL), default)
+
+    def sleep(self, phase: GamePhase, map_name: Optional[str], elapsed: float, default: float) -> None:
+        interval = self.get_interval(phase, map_name, elapsed, default)
+        logger.debug(f'Waiting {interval:.1f}s ({elapsed:.1f}s into phase {phase.value})')
+        # Wake up early to act on any controller command
+        CommandStore().wait(interval)
+
+
+def load_phase_duration_store(path: str) -> Optional[PhaseDurationStore]:
+    store = PhaseDurationStore(path)
+    try:
+        store.load()
+    except (OSError, ValueError, AttributeError) as e:
+        logger.error(f'Failed to load phase durations, falling back to fixed intervals ({e})')
+        return None
+
+    return store
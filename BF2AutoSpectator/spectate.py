@@ -1,19 +1,28 @@
 import argparse
 import logging
+import multiprocessing
 import os
-import pickle
 import sys
 import time
-from datetime import datetime
 
 from BF2AutoSpectator.common import constants
-from BF2AutoSpectator.common.commands import CommandStore
+from BF2AutoSpectator.common.capture import CaptureThread
+from BF2AutoSpectator.common.commands import CommandStore, CommandPriority
 from BF2AutoSpectator.common.config import Config
-from BF2AutoSpectator.common.exceptions import SpawnCoordinatesNotAvailableException
+from BF2AutoSpectator.common.glyph_ocr import GlyphOCR, load_glyph_model
+from BF2AutoSpectator.common.histograms import HistogramStore
 from BF2AutoSpectator.common.logger import logger
-from BF2AutoSpectator.common.utility import find_window_by_title, init_pytesseract
-from BF2AutoSpectator.game import GameInstanceManager, GameMessage
+from BF2AutoSpectator.common.ocr import OCRResultCache, OCR_CACHE_DEFAULT_SIZE, OCR_CACHE_DEFAULT_TTL
+from BF2AutoSpectator.common.utility import find_window_by_title, init_pytesseract, start_ocr_service, WaitTracker
+from BF2AutoSpectator.game import GameInstanceManager, GameMessage, Screen
+from BF2AutoSpectator.game.camera_views import load_camera_view_store
+from BF2AutoSpectator.game.detector_cache import DETECTOR_CACHE_DEFAULT_TTL
+from BF2AutoSpectator.game.label_matcher import load_label_matcher
+from BF2AutoSpectator.game.screen_classifier import load_screen_classifier
 from BF2AutoSpectator.global_state import GlobalState
+from BF2AutoSpectator.phase_handlers import PhaseHandlers
+from BF2AutoSpectator.phase_machine import PhaseMachine
+from BF2AutoSpectator.scheduler import TickScheduler, load_phase_duration_store
 from BF2AutoSpectator.remote import ControllerClient, GamePhase, OBSClient
 
 
@@ -48,9 +57,31 @@ def run():
     parser.add_argument('--obs-url', help='OBS WebSocket URL in format "ws://:password@hostname:port"', type=str)
     parser.add_argument('--obs-source-name', help='OBS game source name', type=str, default='Battlefield 2')
     parser.add_argument('--no-rtl-limit', dest='limit_rtl', action='store_false')
+    parser.add_argument('--background-capture', dest='background_capture', action='store_true',
+                        help='Continuously capture the game window in the background (for motion/AFK detection)')
+    parser.add_argument('--capture-rate', help='Number of frames to capture per second in the background',
+                        type=float, default=4.0)
+    parser.add_argument('--capture-scale', help='Factor to downscale frames captured in the background by',
+                        type=float, default=.125)
+    parser.add_argument('--capture-buffer', help='Number of seconds worth of background frames to keep',
+                        type=float, default=5.0)
+    parser.add_argument('--glyph-ocr-regions', help='OCR regions to read using the built-in glyph OCR engine '
+                                                    'instead of Tesseract', nargs='*',
+                        choices=list(constants.COORDINATES['720p']['ocr'].keys()), default=[])
+    parser.add_argument('--ocr-cache-size', help='Number of OCR results to cache (0 to disable caching)',
+                        type=int, default=OCR_CACHE_DEFAULT_SIZE)
+    parser.add_argument('--ocr-cache-ttl', help='Number of seconds to cache OCR results for',
+                        type=float, default=OCR_CACHE_DEFAULT_TTL)
+    parser.add_argument('--ocr-workers', help='Number of worker processes to run OCR in (0 to run OCR in-process)',
+                        type=int, default=0)
+    parser.add_argument('--detector-cache-ttl', help='Number of seconds to cache results of detectors not using the '
+                                                     'shared frame for while no input is sent to the game (0 to only '
+                                                     'cache results based on the shared frame)',
+                        type=float, default=DETECTOR_CACHE_DEFAULT_TTL)
     parser.add_argument('--debug-log', dest='debug_log', action='store_true')
     parser.add_argument('--debug-screenshot', dest='debug_screenshot', action='store_true')
-    parser.set_defaults(limit_rtl=True, debug_log=False, debug_screenshot=False, use_controller=False, control_obs=False)
+    parser.set_defaults(limit_rtl=True, debug_log=False, debug_screenshot=False, use_controller=False, control_obs=False,
+                        background_capture=False)
     args = parser.parse_args()
 
     logger.setLevel(logging.DEBUG if args.debug_log else logging.INFO)
@@ -76,6 +107,15 @@ def run():
         obs_source_name=args.obs_source_name,
         resolution=args.game_res,
         debug_screenshot=args.debug_screenshot,
+        background_capture=args.background_capture,
+        capture_rate=args.capture_rate,
+        capture_scale=args.capture_scale,
+        capture_buffer=args.capture_buffer,
+        glyph_ocr_regions=args.glyph_ocr_regions,
+        ocr_cache_size=args.ocr_cache_size,
+        ocr_cache_ttl=args.ocr_cache_ttl,
+        ocr_workers=args.ocr_workers,
+        detector_cache_ttl=args.detector_cache_ttl,
         min_iterations_on_player=args.min_iterations_on_player,
         max_iterations_on_player=5,
         max_iterations_on_default_camera_view=6,
@@ -90,11 +130,19 @@ def run():
 
     # Init pytesseract
     init_pytesseract(config.get_tesseract_path())
+    OCRResultCache().configure(config.get_ocr_cache_size(), config.get_ocr_cache_ttl())
 
-    # Load pickles
-    logger.debug('Loading pickles')
-    with open(os.path.join(config.ROOT_DIR, 'pickle', 'histograms.pickle'), 'rb') as histogramFile:
-        histograms = pickle.load(histogramFile)
+    # Init glyph OCR engine for any regions that should not be read using Tesseract
+    if len(config.get_glyph_ocr_regions()) > 0:
+        GlyphOCR().init(load_glyph_model(config.ROOT_DIR, config.get_resolution()), config.get_glyph_ocr_regions())
+
+    # Start OCR worker processes (initialized the same way as above)
+    if config.get_ocr_workers() > 0:
+        start_ocr_service(config.get_ocr_workers())
+
+    # Load histograms
+    logger.debug('Loading histograms')
+    histograms = HistogramStore.load(os.path.join(config.ROOT_DIR, 'pickle', 'histograms.bin'))
 
     # Init debug directory if debugging is/could be enabled
     if config.debug_screenshot() or config.use_controller():
@@ -111,6 +159,21 @@ def run():
         histograms
     )
     gis = gim.get_state()
+    gim.detector_cache.configure(config.get_detector_cache_ttl())
+
+    screen_classifier = load_screen_classifier(config.ROOT_DIR, config.get_resolution())
+    if screen_classifier is not None:
+        gim.set_screen_classifier(screen_classifier)
+    label_matcher = load_label_matcher(config.ROOT_DIR, config.get_resolution())
+    if label_matcher is not None:
+        gim.set_label_matcher(label_matcher)
+    camera_views = load_camera_view_store(
+        os.path.join(config.CACHE_DIR, 'default-camera-views'),
+        config.get_resolution(),
+        config.get_server_mod()
+    )
+    if camera_views is not None:
+        gim.set_camera_view_store(camera_views)
     cc = ControllerClient(
         config.get_controller_base_uri()
     )
@@ -119,9 +182,20 @@ def run():
     )
     cs = CommandStore()
 
+    if config.background_capture():
+        capture_thread = CaptureThread(config.get_capture_rate(), config.get_capture_scale(), config.get_capture_buffer())
+        capture_thread.start()
+        gim.set_capture_thread(capture_thread)
+
+    pm = PhaseMachine()
+    scheduler = TickScheduler(load_phase_duration_store(os.path.join(config.CACHE_DIR, 'phase-durations.json')))
+    pm.add_transition_listener(
+        lambda previous, phase, duration: scheduler.on_transition(previous, phase, duration, gis.get_rotation_map_name())
+    )
     if config.use_controller():
         cc.connect()
-        cc.update_game_phase(GamePhase.initial)
+        pm.add_listener(cc.update_game_phase)
+        pm.enter(GamePhase.initial)
 
     if config.control_obs():
         obsc.connect()
@@ -146,7 +220,14 @@ def run():
     # Start with max to switch away from dead spectator right away
     gis.set_iterations_on_player(config.get_max_iterations_on_player())
     gs = GlobalState()
+
+    handlers = PhaseHandlers(gim, config, pm, cs, scheduler, cc.report_player_rotation)
+
+    stats_logged_at = time.monotonic()
     while True:
+        # Drop last iteration's frame snapshot, screen has most likely changed since
+        gim.invalidate_frame()
+
         # Try to bring BF2 window to foreground
         if gim.has_instance() and not gis.error_restart_required():
             try:
@@ -162,7 +243,7 @@ def run():
             if gis.get_error_unresponsive_count() < 3:
                 logger.info('Unresponsive count below limit, giving time to recover')
                 gis.increment_error_unresponsive_count()
-                time.sleep(2)
+                cs.wait(2, CommandPriority.high)
                 continue
             else:
                 logger.error('Unresponsive count exceeded limit, scheduling restart')
@@ -172,7 +253,22 @@ def run():
             # Game got it together, reset unresponsive count
             gis.reset_error_unresponsive_count()
             # Wait for a few seconds to let game settle back in
-            time.sleep(3)
+            cs.wait(3, CommandPriority.high)
+
+        # Regularly log runtime stats, helping to spot slow command handling, waits timing out and costly detectors
+        if time.monotonic() - stats_logged_at > constants.STATS_LOG_INTERVAL:
+            for command, latency in cs.get_latencies().items():
+                logger.info(f'Command {command} acted on {latency["count"]} times, '
+                            f'latency mean: {latency["mean"]:.2f}s, max: {latency["max"]:.2f}s')
+            for key, wait in WaitTracker().get_stats().items():
+                logger.info(f'Waited for {key} {wait["waits"]} times ({wait["timeouts"]} timed out), '
+                            f'duration mean: {wait["mean"]:.2f}s, max: {wait["max"]:.2f}s')
+            for name, detector in gim.planner.get_stats().items():
+                logger.info(f'Detector {name} ran {detector["runs"]} times, skipped {detector["skips"]} times, '
+                            f'cost: {detector["cost"]:.1f}ms')
+            for name, (hits, misses) in gim.detector_cache.get_stats().items():
+                logger.info(f'Detector cache for {name} hit {hits} times, missed {misses} times')
+            stats_logged_at = time.monotonic()
 
         # Check for (debug assertion and Visual C++ Runtime) error window
         if not gis.error_restart_required() and \
@@ -187,7 +283,7 @@ def run():
         if cs.pop('start'):
             if gs.stopped():
                 logger.info('Start command issued via controller, queueing game start')
-                cc.update_game_phase(GamePhase.starting)
+                pm.enter(GamePhase.starting)
                 gs.set_stopped(False)
                 # Set restart required flag
                 gis.set_error_restart_required(True)
@@ -197,7 +293,7 @@ def run():
         if cs.pop('stop'):
             if not gs.stopped():
                 logger.info('Stop command issued via controller, queueing game stop')
-                cc.update_game_phase(GamePhase.stopping)
+                pm.enter(GamePhase.stopping)
                 gs.set_stopped(True)
             else:
                 logger.info('Already stopped, ignoring stop command issued via controller')
@@ -278,7 +374,7 @@ def run():
                 logger.info('Stopping OBS stream')
                 try:
                     obsc.stop_stream()
-                    time.sleep(5)
+                    cs.wait(5, CommandPriority.high)
                 except Exception as e:
                     logger.error(f'Failed to stop OBS stream: {str(e)}')
             elif streaming is False and not (gs.stopped() or gis.halted()) and gim.has_instance():
@@ -286,14 +382,14 @@ def run():
                 logger.info('Starting OBS stream')
                 try:
                     obsc.start_stream()
-                    time.sleep(5)
+                    cs.wait(5, CommandPriority.high)
                 except Exception as e:
                     logger.error(f'Failed to start OBS stream: {str(e)}')
 
         # Stop existing (and start a new) game instance if required
         if not gim.has_instance() or gs.stopped() or gis.rtl_restart_required() or gis.error_restart_required():
             if gim.has_instance() and (gs.stopped() or gis.rtl_restart_required()):
-                cc.update_game_phase(GamePhase.closing)
+                pm.enter(GamePhase.closing)
                 # Quit out of current instance
                 logger.info('Quitting existing game instance')
                 if gim.quit_instance():
@@ -306,13 +402,16 @@ def run():
 
             # Don't use elif here so error restart can be executed right after a failed quit attempt
             if gim.has_instance() and gis.error_restart_required():
-                cc.update_game_phase(GamePhase.closing)
+                pm.enter(GamePhase.closing)
                 # Kill any remaining instance by pid
                 logger.info('Killing existing game instance')
                 killed = gim.kill_instance()
                 logger.debug(f'Instance killed: {killed}')
-                # Give Windows time to actually close the window
-                time.sleep(3)
+                # Give Windows time to actually close the window (must not be cut short by commands, else the closing
+                # window could be picked up again)
+                gim.wait_until(
+                    lambda: find_window_by_title(constants.BF2_WINDOW_TITLE, 'BF2') is None, 3, key='window-close'
+                )
 
             # Run find instance to update (dispose of) current game window reference
             gim.find_instance(config.get_server_mod())
@@ -320,13 +419,13 @@ def run():
             # Don't launch a new instance when stopped
             if gs.stopped():
                 cc.reset_current_server()
-                cc.update_game_phase(GamePhase.stopped)
-                time.sleep(30)
+                pm.enter(GamePhase.stopped)
+                cs.wait(30, CommandPriority.high)
                 continue
 
             # Init game new game instance
             logger.info('Starting new game instance')
-            cc.update_game_phase(GamePhase.launching)
+            pm.enter(GamePhase.launching)
             got_instance, correct_params, running_mod = gim.launch_instance(config.get_server_mod())
 
             """
@@ -366,7 +465,7 @@ def run():
 
             # Ensure game menu is open, try to open it if not
             if gim.is_in_menu() or gim.open_menu():
-                cc.update_game_phase(GamePhase.inMenu)
+                pm.enter(GamePhase.inMenu)
                 gis.restart_reset()
             else:
                 logger.error('Game menu is not visible and could not be opened, restart required')
@@ -374,14 +473,24 @@ def run():
 
             continue
 
-        if gim.is_game_message_visible():
+        # Take one screenshot to be shared by all following detectors (until we send any input to the game)
+        gim.capture_frame()
+        gim.planner.begin_tick()
+
+        # Identify screen in one go if possible, only falling back to individual detectors if the result is ambiguous
+        screen = gim.classify_screen()
+        if screen is not None:
+            game_message_visible = screen is Screen.GameMessage
+        else:
+            game_message_visible = pm.evaluate(gim.planner.evaluate, ['game-message'])['game-message']
+        if game_message_visible:
             logger.debug('Game message present, ocr-ing message')
             game_message, raw_message = gim.get_game_message()
 
             if game_message is GameMessage.ServerFull:
                 logger.warning('Server full, trying to rejoin in 20 seconds')
                 gis.set_spectator_on_server(False)
-                time.sleep(20)
+                cs.wait(20, CommandPriority.high)
             elif game_message is GameMessage.Kicked:
                 logger.warning('Got kicked, trying to rejoin')
                 gis.set_spectator_on_server(False)
@@ -412,11 +521,11 @@ def run():
                 gs.set_halted(True)
 
             if not gis.halted():
-                cc.update_game_phase(GamePhase.inMenu)
+                pm.enter(GamePhase.inMenu)
                 # Close game message to enable actions
                 gim.close_game_message()
             elif not gs.halted():
-                cc.update_game_phase(GamePhase.inMenu)
+                pm.enter(GamePhase.inMenu)
                 # Close game message to release halted state
                 logger.info('Releasing halted state')
                 gim.close_game_message()
@@ -425,12 +534,12 @@ def run():
                 # The situation that caused us to halt can be rectified via the controller
                 # (game restart/switching servers)
                 cc.reset_current_server()
-                cc.update_game_phase(GamePhase.halted, server={
+                pm.enter(GamePhase.halted, server={
                     'ip': config.get_server_ip(),
                     'port': config.get_server_port(),
                     'password': config.get_server_pass()
                 })
-                time.sleep(20)
+                cs.wait(20, CommandPriority.high)
             else:
                 # There is no clear way to recover without a controller, so just exit
                 sys.exit(1)
@@ -456,7 +565,7 @@ def run():
             iteration if menu does not open in time.
             """
             if (gim.is_in_menu() or gim.open_menu(max_attempts=1, sleep=3.0)) and gim.disconnect_from_server():
-                cc.update_game_phase(GamePhase.inMenu)
+                pm.enter(GamePhase.inMenu)
                 gis.set_spectator_on_server(False)
 
                 # If game instance is about to be replaced, add one more round on the new server
@@ -476,7 +585,7 @@ def run():
             loaded. Instead, press ESC once and wait a bit longer. Fail and restart game if menu does not open in time.
             """
             if gim.is_in_menu() or gim.open_menu(max_attempts=1, sleep=3.0):
-                cc.update_game_phase(GamePhase.inMenu)
+                pm.enter(GamePhase.inMenu)
             else:
                 logger.error('Game menu is not visible and could not be opened, restart required')
                 gis.set_error_restart_required(True)
@@ -502,17 +611,53 @@ def run():
             gis.set_map_loading(connected)
             if connected:
                 cc.update_current_server(server_ip, server_port, server_pass)
-                cc.update_game_phase(GamePhase.loading)
+                pm.enter(GamePhase.loading)
                 gis.set_server(server_ip, server_port, server_pass)
             else:
                 logger.error('Failed to (re-)connect to server')
 
             continue
 
-        on_round_finish_screen = gim.is_round_end_screen_visible()
-        map_is_loading = gim.is_map_loading()
-        map_briefing_present = gim.is_map_briefing_visible()
-        default_camera_view_visible = gim.is_default_camera_view_visible()
+        # Classify again, since the shared frame (and with it any classification result) is dropped once input is sent
+        gim.planner.begin_tick()
+        screen = gim.classify_screen()
+        if screen is not None:
+            # Loading screen and map briefing are part of the round end screen
+            on_round_finish_screen = screen in [Screen.RoundEnd, Screen.Loading, Screen.MapBriefing]
+            map_is_loading = screen is Screen.Loading
+            map_briefing_present = screen is Screen.MapBriefing
+            gim.planner.set_results({
+                'round-end-screen': on_round_finish_screen,
+                'map-loading': map_is_loading,
+                'map-briefing': map_briefing_present
+            })
+        else:
+            # Only pay for detectors that can still be positive (e.g. no map briefing without round end screen)
+            results = pm.evaluate(gim.planner.evaluate, ['round-end-screen', 'map-loading', 'map-briefing'])
+            on_round_finish_screen = results['round-end-screen']
+            map_is_loading = results['map-loading']
+            map_briefing_present = results['map-briefing']
+
+        # Identify map via the default camera view if map briefing was not seen (e.g. after joining mid-round)
+        if pm.is_relevant('map-identification') and gis.get_rotation_map_name() is None and \
+                not on_round_finish_screen and not map_is_loading:
+            map_name, confidence = gim.identify_map()
+            if map_name is not None and confidence >= constants.MAP_IDENTIFICATION_MIN_CONFIDENCE:
+                logger.info(f'Identified map as {map_name} via default camera view (confidence: {confidence:.2f})')
+                gis.set_rotation_map_name(map_name)
+
+        default_camera_view_visible = pm.evaluate(gim.planner.evaluate, ['default-camera-view'])['default-camera-view']
+
+        # Right after loading into a map (and before spawning), the game is on the default camera view
+        # => learn it for maps without a reference (hud is still hidden from the last round at this point)
+        if pm.is_relevant('camera-view-learning') and not default_camera_view_visible and gis.map_loading() and \
+                gis.hud_hidden() and not gis.round_spawned() and not on_round_finish_screen and not map_is_loading:
+            if gim.learn_default_camera_view():
+                default_camera_view_visible = gim.is_default_camera_view_visible()
+            elif gim.is_camera_view_learning_pending():
+                # Take another look next tick (instead of starting to spawn, which would change the screen)
+                cs.wait(constants.DEFAULT_CAMERA_VIEW_LEARN_INTERVAL)
+                continue
 
         # Update instance state if any map load/eor screen is present
         # (only _set_ map loading state here, since it should only be _unset_ when attempting to spawn
@@ -526,253 +671,16 @@ def run():
         if config.limit_rtl() and on_round_finish_screen and gis.get_round_num() >= config.get_instance_trl():
             logger.info('Game instance has reached rtl limit, restart required')
             gis.set_rtl_restart_required(True)
-        elif map_is_loading:
-            logger.info('Map is loading')
-            # Reset state once if it still reflected to be "in" the round
-            if gis.round_entered():
-                logger.info('Performing map rotation reset')
-                cc.update_game_phase(GamePhase.betweenRounds)
-                gis.map_rotation_reset()
-                time.sleep(6)
-                continue
-
-            # Suspend/delay map loading to avoid a modified content kick on map switches
-            delay = config.get_map_load_delay()
-            if delay > 0 and not gis.rotation_map_load_delayed() and gim.delay_map_load(delay):
-                gis.set_rotation_map_load_delayed(True)
-            elif delay == 0 or gis.rotation_map_load_delayed():
-                time.sleep(3)
-
-            # Set loading phase *after* between rounds phase to make sure we go spectating -> between rounds -> loading
-            cc.update_game_phase(GamePhase.loading)
-        elif map_briefing_present:
-            logger.info('Map briefing present, checking map')
-            map_name, map_size, game_mode = gim.get_map_details()
-
-            # Update map state if relevant and required
-            # Map size should always be != -1 even for unknown maps, only reason for it being -1 would be that the map
-            # briefing was no longer visible when map size was checked
-            if map_size != -1 and (
-                    map_name != gis.get_rotation_map_name() or
-                    map_size != gis.get_rotation_map_size() or
-                    game_mode != gis.get_rotation_game_mode()
-            ):
-                logger.debug(f'Updating map state: {map_name}/{map_size}/{game_mode}')
-                gis.set_rotation_map_name(map_name)
-                gis.set_rotation_map_size(map_size)
-                gis.set_rotation_game_mode(game_mode)
-
-            # Give go-ahead for active joining
-            if map_size != -1 and not gis.active_join_pending():
-                logger.debug('Enabling active joining')
-                gis.set_active_join_possible(after=10)
-
-            # Try to join the game if active join is possible
-            if gis.active_join_possible() and gim.join_game():
-                logger.debug('Entered game by clicking "Join game" button')
-
-            time.sleep(3)
-        elif on_round_finish_screen:
-            logger.info('Game is on round finish screen')
-            # Reset state once if it still reflected to be "in" the round
-            if gis.round_entered():
-                logger.info('Performing round end reset')
-                cc.update_game_phase(GamePhase.betweenRounds)
-                gis.round_end_reset()
-                continue
-
-            """
-            When server "rotates" on the same map, we enter the loading state and reset the map details.
-            However, the map briefing is not opened automatically. So unless we open it manually, we never see the
-            map briefing and thus cannot detect the map.
-            """
-            if gim.is_join_game_button_visible():
-                logger.info('Join game button is visible but map briefing is not, opening map briefing')
-                if not gim.open_map_briefing():
-                    logger.error('Failed to open map briefing, attempting to join game and queuing reconnect')
-                    # We need to join the game, else the ESC press to open the menu will join the game instead of
-                    # opening the menu
-                    gim.join_game()
-                    gis.set_spectator_on_server(False)
-                continue
-            time.sleep(3)
-        elif default_camera_view_visible and gis.round_spawned() and \
-                gis.get_iterations_on_default_camera_view() == 0:
-            # In rare cases, an AFK/dead player might be detected as the default camera view
-            # => try to rotate to next player to "exit" what is detected as the default camera view
-            logger.info('Game is on default camera view, trying to rotate to next player')
-            gim.rotate_to_next_player()
-            gis.increment_iterations_on_default_camera_view()
-            time.sleep(3)
-        elif default_camera_view_visible and gis.round_spawned() and \
-                gis.get_iterations_on_default_camera_view() < config.get_max_iterations_on_default_camera_view():
-            # Default camera view is visible after spawning once, either after a round restart or after the round ended
-            logger.info('Game is still on default camera view, waiting to see if round ended')
-            gis.increment_iterations_on_default_camera_view()
-            time.sleep(3)
-        elif default_camera_view_visible and gis.round_spawned() and \
-                gis.get_iterations_on_default_camera_view() == config.get_max_iterations_on_default_camera_view():
-            # Default camera view has been visible for a while, most likely due to a round restart
-            # => try to restart spectating by pressing space (only works on freecam-enabled servers)
-            logger.info('Game is still on default camera view, trying to (re-)start spectating via freecam toggle')
-            gim.start_spectating_via_freecam_toggle()
-            gis.increment_iterations_on_default_camera_view()
-            time.sleep(3)
-        elif default_camera_view_visible and gis.round_spawned() and \
-                gis.get_iterations_on_default_camera_view() > config.get_max_iterations_on_default_camera_view():
-            # Default camera view has been visible for a while, failed to restart spectating by pressing space
-            # => spawn-suicide again to restart spectating
-            logger.info('Game is still on default camera view, queueing another spawn-suicide to restart spectating')
-            gis.set_round_spawned(False)
-            gis.reset_iterations_on_default_camera_view()
-        elif default_camera_view_visible and not gis.round_spawned() and not gis.round_freecam_toggle_spawn_attempted():
-            # Try to restart spectating without suiciding on consecutive rounds (only works on freecam-enabled servers)
-            logger.info('Game is on default camera view, trying to (re-)start spectating via freecam toggle')
-            gis.set_map_loading(False)
-            gim.start_spectating_via_freecam_toggle()
-            gis.set_round_freecam_toggle_spawn_attempted(True)
-            time.sleep(.5)
-            # Set round spawned to true of default camera view is no longer visible, else enable hud for spawn-suicide
-            if not gim.is_default_camera_view_visible():
-                logger.info('Started spectating via freecam toggle, skipping spawn-suicide')
-                cc.update_game_phase(GamePhase.spectating)
-                gis.set_round_spawned(True)
-                gis.increment_round_num()
-                logger.debug(f'Entering round #{gis.get_round_num()} using this instance')
-                # Spectator has "entered" round, update state accordingly
-                gis.set_round_entered(True)
-                # We entered a new round, so we most likely won't be on the player the rotation was originally paused on
-                # => unpause rotation
-                config.unpause_player_rotation()
-                # No need to immediately rotate to next player (usually done after spawn-suicide)
-                # => set iteration counter to 0
-                gis.reset_iterations_on_player()
-            else:
-                # Don't log this as an error since it's totally normal
-                logger.info('Failed to start spectating via freecam toggle, continuing to spawn-suicide')
-        elif not on_round_finish_screen and not gis.round_spawned():
-            # Loaded into map, now trying to start spectating
-            cc.update_game_phase(GamePhase.spawning)
-            gis.set_map_loading(False)
-            # Re-enable hud if required
-            if gis.hud_hidden():
-                # Give game time to swap teams
-                time.sleep(3)
-                # Re-enable hud
-                logger.info('Enabling hud')
-                if not gim.toggle_hud(1):
-                    logger.error(f'Failed to toggle hud, restart required')
-                    gis.set_error_restart_required(True)
-                    continue
-                # Update state
-                gis.set_hud_hidden(False)
-                time.sleep(1)
-
-            if not gim.is_spawn_menu_visible():
-                logger.info('Spawn menu not visible, opening with enter')
-                gim.open_spawn_menu()
-                # Force another attempt re-enable hud
-                gis.set_hud_hidden(True)
-                continue
-
-            logger.info('Determining team')
-            current_team = gim.get_player_team()
-            if current_team is not None:
-                gis.set_round_team(current_team)
-                gis.set_round_spawn_randomize_coordinates(False)
-                logger.debug(f'Current team index is {gis.get_round_team()} '
-                             f'({"USMC/EU/..." if gis.get_round_team() == 0 else "MEC/CHINA/..."})')
-            elif gim.spawn_coordinates_available():
-                # We should be able to detect the team if we have spawn coordinates for the map/size/game mode combination
-                logger.error('Failed to determine current team, retrying')
-                # Force another attempt re-enable hud
-                gis.set_hud_hidden(True)
-                continue
-            elif not gis.get_round_spawn_randomize_coordinates():
-                # If we were not able to detect a team and map/size/game mod combination is not supported,
-                # assume that team detection is not available (unsupported mod/custom map)
-                logger.warning('Team detection is not available, switching to spawn point coordinate randomization')
-                gis.set_round_spawn_randomize_coordinates(True)
-
-            """
-            BF2 sometimes gets stuck on the spawn menu. It will ignore any mouse input,
-            so no spawn point can be selected. This can usually be fixed by opening the scoreboard once.
-            """
-            if (gis.get_iterations_on_spawn_menu() + 1) % config.get_lockup_iterations_on_spawn_menu() == 0:
-                logger.warning('Spawn menu may have locked up, trying to recover by toggling scoreboard')
-                if not gim.show_scoreboard():
-                    logger.error('Scoreboard did not open/close when trying to recover from spawn menu lockup, '
-                                 'restart required')
-                    gis.set_error_restart_required(True)
-                    continue
-
-            logger.info('Spawning once')
-            spawn_succeeded = False
-            if not gis.get_round_spawn_randomize_coordinates():
-                try:
-                    spawn_succeeded = gim.spawn_suicide()
-                except SpawnCoordinatesNotAvailableException:
-                    logger.warning(f'Spawn point coordinates not available for current combination of map/size/game mode '
-                                   f'({gis.get_rotation_map_name()}/'
-                                   f'{gis.get_rotation_map_size()}/'
-                                   f'{gis.get_rotation_game_mode()}), switching to spawn point coordinate randomization')
-                    gis.set_round_spawn_randomize_coordinates(True)
-
-            if gis.get_round_spawn_randomize_coordinates():
-                logger.info(f'Attempting to spawn by selecting randomly generated spawn point coordinates')
-                spawn_succeeded = gim.spawn_suicide(randomize=True)
-
-            if spawn_succeeded:
-                logger.info('Spawn succeeded')
-                gis.reset_iterations_on_spawn_menu()
-            else:
-                logger.warning('Spawn failed, retrying')
-                gis.increment_iterations_on_spawn_menu()
-            gis.set_round_spawned(spawn_succeeded)
-
-            # Set counter to max to skip spectator
-            gis.set_iterations_on_player(config.get_max_iterations_on_player())
-            # Unpause in order to not stay on the spectator after suicide
-            config.unpause_player_rotation()
-        elif not on_round_finish_screen and not gis.hud_hidden():
-            logger.info('Hiding hud')
-            if not gim.toggle_hud(0):
-                logger.error(f'Failed to toggle hud, restart required')
-                gis.set_error_restart_required(True)
-                continue
-            cc.update_game_phase(GamePhase.spectating)
-            gis.set_hud_hidden(True)
-        elif not on_round_finish_screen and not gis.round_entered():
-            gis.increment_round_num()
-            logger.debug(f'Entering round #{gis.get_round_num()} using this instance')
-            # Spectator has "entered" round, update state accordingly
-            gis.set_round_entered(True)
-        elif not on_round_finish_screen and gis.get_iterations_on_player() < config.get_max_iterations_on_player() and \
-                not config.player_rotation_paused() and not force_next_player:
-            # Check if player is afk
-            if not gim.is_sufficient_action_on_screen():
-                logger.info('Insufficient action on screen')
-                gis.set_iterations_on_player(config.get_max_iterations_on_player())
-            else:
-                logger.info('Nothing to do, stay on player')
-                gis.increment_iterations_on_player()
-                time.sleep(2)
-        elif not on_round_finish_screen and config.player_rotation_paused() and not force_next_player:
-            logger.info(f'Player rotation is paused until {config.get_player_rotation_paused_until().isoformat()}')
-            # If rotation pause flag is still set even though the pause expired, remove the flag
-            if config.get_player_rotation_paused_until() < datetime.now():
-                logger.info('Player rotation pause expired, re-enabling rotation')
-                config.unpause_player_rotation()
-                # Set counter to max to rotate off current player right away
-                gis.set_iterations_on_player(config.get_max_iterations_on_player())
-            else:
-                time.sleep(2)
-        elif not on_round_finish_screen:
-            logger.info('Rotating to next player')
-            gim.rotate_to_next_player()
-            cc.report_player_rotation()
-            gis.reset_iterations_on_player()
+        else:
+            handlers.handle({
+                'round-end-screen': on_round_finish_screen,
+                'map-loading': map_is_loading,
+                'map-briefing': map_briefing_present,
+                'default-camera-view': default_camera_view_visible
+            }, force_next_player)
 
 
 if __name__ == '__main__':
+    # Required for OCR worker processes to start from a frozen executable
+    multiprocessing.freeze_support()
     run()
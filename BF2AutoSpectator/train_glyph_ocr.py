@@ -0,0 +1,154 @@
+import argparse
+import glob
+import os
+import time
+from typing import Callable, List, Tuple
+
+import cv2
+import numpy as np
+from numpy import ndarray
+
+from BF2AutoSpectator.common.config import Config
+from BF2AutoSpectator.common.glyph_ocr import GlyphModel, extract_glyphs, get_glyph_model_path
+from BF2AutoSpectator.common.ocr import TesseractEnginePool
+from BF2AutoSpectator.common.utility import init_pytesseract
+
+
+def load_corpus(path: str) -> List[Tuple[str, ndarray, str]]:
+    """
+    Load labelled crops (e.g. debug screenshots of OCR regions), each consisting of an image (<name>.png) and a
+    text file containing the expected text (<name>.txt)
+    :param path: path to folder containing crops
+    :return: name, RGB pixels and expected text of every crop
+    """
+    corpus = []
+    for image_path in sorted(glob.glob(os.path.join(path, '*.png'))):
+        name = os.path.splitext(os.path.basename(image_path))[0]
+        label_path = os.path.join(path, f'{name}.txt')
+        if not os.path.isfile(label_path):
+            print(f'No label for {name}, skipping crop')
+            continue
+
+        with open(label_path, 'r', encoding='utf-8') as label_file:
+            text = label_file.read().strip()
+        corpus.append((name, cv2.cvtColor(cv2.imread(image_path), cv2.COLOR_BGR2RGB), text))
+
+    return corpus
+
+
+def collect_glyphs(corpus: List[Tuple[str, ndarray, str]]) -> Tuple[List[ndarray], List[str]]:
+    features, labels = [], []
+    for name, pixels, text in corpus:
+        chars = [char for char in text if not char.isspace()]
+        # Glyphs can only be assigned to characters if segmentation found exactly one glyph per character
+        glyph_features, _ = extract_glyphs(pixels)
+        if len(glyph_features) != len(chars):
+            glyph_features, _ = extract_glyphs(pixels, split=True)
+        if len(glyph_features) != len(chars):
+            print(f'Found {len(glyph_features)} glyphs in {name}, expected {len(chars)} ("{text}"), skipping crop')
+            continue
+
+        features.extend(glyph_features)
+        labels.extend(chars)
+
+    return features, labels
+
+
+def train(resolution: str, corpus: List[Tuple[str, ndarray, str]], max_samples: int) -> GlyphModel:
+    features, labels = collect_glyphs(corpus)
+    features, labels = np.array(features, dtype=np.float32), np.array(labels)
+
+    # Keep up to max_samples (evenly spaced) samples per glyph to keep the model small and fast
+    keep = []
+    for label in np.unique(labels):
+        indices = np.flatnonzero(labels == label)
+        keep.extend(indices[np.linspace(0, len(indices) - 1, min(len(indices), max_samples)).astype(int)])
+    keep = sorted(set(keep))
+
+    return GlyphModel(resolution, features[keep], labels[keep])
+
+
+def evaluate(corpus: List[Tuple[str, ndarray, str]], image_to_string: Callable[[ndarray], str]) -> Tuple[float, float]:
+    correct = 0
+    durations = []
+    for name, pixels, text in corpus:
+        started = time.perf_counter()
+        result = image_to_string(pixels).strip(' \n\x0c')
+        durations.append(time.perf_counter() - started)
+        if result.lower() == text.lower():
+            correct += 1
+
+    return correct / len(corpus), float(np.mean(durations))
+
+
+def write_report(path: str, resolution: str, training: int, holdout: int,
+                 results: List[Tuple[str, float, float]]) -> None:
+    lines = [
+        f'# Glyph OCR vs. Tesseract ({resolution})',
+        '',
+        f'Trained on {training} crops, evaluated on {holdout} holdout crops.',
+        '',
+        '| Engine | Accuracy | Latency (ms/crop) |',
+        '|--------|----------|-------------------|',
+        *[f'| {engine} | {accuracy:.2%} | {duration * 1000:.2f} |' for engine, accuracy, duration in results]
+    ]
+    if len(results) == 0:
+        lines.append('| - | - | - |')
+
+    with open(path, 'w', encoding='utf-8') as report_file:
+        report_file.write('\n'.join(lines) + '\n')
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        prog='train-glyph-ocr',
+        description='Train the glyph OCR engine from labelled crops of OCR regions and compare it to Tesseract'
+    )
+    parser.add_argument('corpus', help='Path to folder containing crops (<name>.png, image operations already applied) '
+                                       'and their expected text (<name>.txt)', type=str)
+    parser.add_argument('--game-res', help='Resolution the crops were recorded at', choices=['720p', '900p'],
+                        type=str, default='720p')
+    parser.add_argument('--tesseract-path', help='Path to Tesseract install folder (to compare results with)',
+                        type=str)
+    parser.add_argument('--max-samples', help='Max number of samples to keep per glyph', type=int, default=20)
+    parser.add_argument('--holdout', help='Use every nth crop for evaluation only', type=int, default=5)
+    parser.add_argument('--output', help='Path to write model to', type=str)
+    parser.add_argument('--report', help='Path to write accuracy/latency comparison to (markdown)', type=str)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if len(corpus) == 0:
+        print('No crops found in corpus')
+        return
+
+    # Evaluate a model trained without the holdout crops
+    holdout = corpus[::args.holdout]
+    training = [crop for index, crop in enumerate(corpus) if index % args.holdout != 0]
+    results = []
+    if len(holdout) > 0 and len(training) > 0:
+        model = train(args.game_res, training, args.max_samples)
+        results.append(('Glyph OCR', *evaluate(holdout, model.image_to_string)))
+
+        if args.tesseract_path is not None:
+            init_pytesseract(args.tesseract_path)
+            results.append(('Tesseract', *evaluate(
+                holdout,
+                lambda pixels: TesseractEnginePool().image_to_string(pixels, r'--oem 3 --psm 7')
+            )))
+
+    for engine, accuracy, duration in results:
+        print(f'{engine}: {accuracy:.2%} accurate, {duration * 1000:.2f} ms/crop ({len(holdout)} holdout crops)')
+
+    if args.report is not None:
+        write_report(args.report, args.game_res, len(training), len(holdout), results)
+        print(f'Wrote report to {args.report}')
+
+    # Final model is trained using all crops
+    model = train(args.game_res, corpus, args.max_samples)
+    output = args.output if args.output is not None else get_glyph_model_path(Config.ROOT_DIR, args.game_res)
+    model.save(output)
+    print(f'Wrote model ({len(model.labels)} samples of {len(np.unique(model.labels))} glyphs) to {output}')
+
+
+if __name__ == '__main__':
+    run()
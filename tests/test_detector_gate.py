@@ -0,0 +1,59 @@
+from typing import Iterator
+
+import cv2
+import numpy as np
+import pytest
+from numpy import ndarray
+
+from BF2AutoSpectator.common.utility import is_text_on_plain_background
+
+# Headers and terrain are generated rather than captured, since there are no captured game message frames (the
+# thresholds in constants are only calibrated against these synthetic fixtures)
+
+# Size of the game message header region at 720p
+HEIGHT, WIDTH = 25, 130
+
+
+def create_header(background: int, text: int, gradient: float = 0.0, noise: float = 0.0,
+                  scale: float = 0.5) -> ndarray:
+    mask = np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
+    cv2.putText(mask, 'GAME MESSAGE', (4, 18), cv2.FONT_HERSHEY_SIMPLEX, scale, 255, 1, cv2.LINE_AA)
+    alpha = (mask / 255.0)[:, :, np.newaxis]
+    plain = np.zeros((HEIGHT, WIDTH, 3)) + background + np.linspace(0, gradient, WIDTH)[np.newaxis, :, np.newaxis]
+    pixels = plain * (1 - alpha) + text * alpha + np.random.default_rng(0).normal(0, noise, plain.shape)
+    return np.clip(pixels, 0, 255).astype(np.uint8)
+
+
+def create_terrain_crops(seed: int, contrast: float) -> Iterator[ndarray]:
+    # Smooth "terrain" plus some fine detail, cut into header sized crops
+    rng = np.random.default_rng(seed)
+    base = cv2.GaussianBlur(rng.normal(0, 1, size=(720, 1280)).astype(np.float32), (0, 0), 6)
+    detail = cv2.GaussianBlur(rng.normal(0, 1, size=(720, 1280)).astype(np.float32), (0, 0), 1.5)
+    gray = np.clip(110 + base / base.std() * contrast + detail / detail.std() * contrast / 3, 0, 255)
+    pixels = np.repeat(gray[:, :, np.newaxis], 3, axis=2).astype(np.uint8)
+    for top in range(0, 720 - HEIGHT, HEIGHT):
+        for left in range(0, 1280 - WIDTH, WIDTH):
+            yield pixels[top:top + HEIGHT, left:left + WIDTH]
+
+
+@pytest.mark.parametrize('header', [
+    create_header(30, 230),
+    create_header(30, 230, gradient=20, noise=3),
+    create_header(60, 200, noise=4),
+    create_header(40, 160, scale=0.4),
+    create_header(200, 30)
+])
+def test_header_is_text_on_plain_background(header: ndarray):
+    assert is_text_on_plain_background(header)
+
+
+@pytest.mark.parametrize('value', [0, 35, 255])
+def test_uniform_region_is_not_text(value: int):
+    assert not is_text_on_plain_background(np.full((HEIGHT, WIDTH, 3), value, dtype=np.uint8))
+
+
+@pytest.mark.parametrize('contrast', [5, 10, 20, 30, 45, 60])
+def test_terrain_is_not_text(contrast: float):
+    assert not any(
+        is_text_on_plain_background(crop) for seed in range(4) for crop in create_terrain_crops(seed, contrast)
+    )
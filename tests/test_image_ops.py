@@ -0,0 +1,69 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from BF2AutoSpectator.common.utility import ImageOperation, apply_image_ops, compile_image_ops
+from BF2AutoSpectator.game.label_matcher import LABELS
+
+# Chains used by GameInstanceManager detectors outside of LABELS
+INSTANCE_MANAGER_IMAGE_OPS = [
+    [(ImageOperation.invert, None)],
+    [
+        (ImageOperation.grayscale, None),
+        (ImageOperation.colorize, {'black': '#000', 'white': '#fff', 'blackpoint': 50, 'whitepoint': 135}),
+        (ImageOperation.invert, None)
+    ]
+]
+
+# Further chains exercising every supported operation
+EXTRA_IMAGE_OPS = [
+    [],
+    [(ImageOperation.grayscale, None)],
+    [(ImageOperation.solarize, {'threshold': 100})],
+    [(ImageOperation.invert, None), (ImageOperation.solarize, {'threshold': 200})],
+    [(ImageOperation.grayscale, None), (ImageOperation.invert, None)],
+    [
+        (ImageOperation.grayscale, None),
+        (ImageOperation.colorize, {'black': '#102030', 'white': '#f0e0d0', 'mid': '#808080'})
+    ]
+]
+
+IMAGE_OPS: List[List[Tuple[ImageOperation, Optional[dict]]]] = [
+    *{id(image_ops): image_ops for image_ops in LABELS.values()}.values(),
+    *INSTANCE_MANAGER_IMAGE_OPS,
+    *EXTRA_IMAGE_OPS
+]
+
+
+@pytest.mark.parametrize('image_ops', IMAGE_OPS, ids=lambda image_ops: '|'.join(
+    method.name for method, _ in image_ops
+) or 'none')
+@pytest.mark.parametrize('seed', range(5))
+def test_compiled_image_ops_are_bit_identical(image_ops: List[Tuple[ImageOperation, Optional[dict]]], seed: int):
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(37, 113, 3), dtype=np.uint8)
+
+    compiled = compile_image_ops(image_ops)
+    assert compiled is not None
+
+    expected = np.asarray(apply_image_ops(Image.fromarray(pixels), image_ops))
+    actual = compiled.apply(pixels)
+
+    assert actual.dtype == expected.dtype
+    assert actual.shape == expected.shape
+    assert np.array_equal(actual, expected)
+
+
+def test_compiled_image_ops_do_not_modify_input():
+    pixels = np.random.default_rng(0).integers(0, 256, size=(16, 16, 3), dtype=np.uint8)
+    original = pixels.copy()
+
+    compile_image_ops([(ImageOperation.invert, None)]).apply(pixels)
+
+    assert np.array_equal(pixels, original)
+
+
+def test_grayscale_after_other_operations_is_not_compiled():
+    assert compile_image_ops([(ImageOperation.invert, None), (ImageOperation.grayscale, None)]) is None
@@ -0,0 +1,77 @@
+import pytest
+
+from BF2AutoSpectator.common import constants
+from BF2AutoSpectator.game.instance_manager import GameInstanceManager, MAP_NAME_INDEX
+from BF2AutoSpectator.game.map_names import MapNameIndex, calc_ocr_edit_distance
+
+# Misreads seen in map briefing OCR results, format: (raw OCR result, map name)
+MISREADS = [
+    # Previously handled by replacing the first "g" with "q"
+    ('Taraba Guarry', 'taraba-quarry'),
+    # Previously handled by replacing the second "t" with "i"
+    ('Mashtuur Ctty', 'mashtuur-city'),
+    # Previously handled by replacing a trailing colon with "e"
+    ('Operation Road Rag:', 'operation-road-rage'),
+    ('Surg:', 'surge'),
+    # Further confusions
+    ('Midntght Sun', 'midnight-sun'),
+    ('Frostbite Ntght', 'frostbite-night'),
+    ('B1ue Bayou', 'blue-bayou'),
+    ('Sharql Peninsula', 'sharqi-peninsula'),
+    ('Zatar Wet1ands', 'zatar-wetlands'),
+    ('Ghost Tovvn', 'ghost-town'),
+    ('Stranded CTT', 'stranded-ctf'),
+    ('Dalian 2 v 2', 'dalian-2v2'),
+    ('Daqing 2y2', 'daqing-2v2'),
+    ("Sailor's Warning", 'sailors-warning'),
+    ('Strike_At.Karkand', 'strike-at-karkand'),
+    ('Wake Island 2OO7', 'wake-island-2007')
+]
+
+# Names of maps without spawn coordinates, which must not be mistaken for (similar) known maps
+UNKNOWN_MAPS = [
+    'iron-gator',
+    'wake-island',
+    'operation-blue-lagoon',
+    'kashan-desert',
+    'jalalabad',
+    'karkand',
+    'dust-bowl',
+    'hingan-hills'
+]
+
+
+@pytest.mark.parametrize('ocr_result, expected', MISREADS)
+def test_normalize_map_name_resolves_misreads(ocr_result: str, expected: str):
+    assert GameInstanceManager.normalize_map_name(ocr_result) == expected
+
+
+@pytest.mark.parametrize('map_name', sorted(constants.COORDINATES['spawns'].keys()))
+def test_known_map_names_resolve_to_themselves(map_name: str):
+    assert MAP_NAME_INDEX.resolve(map_name) == (map_name, 1.0)
+
+
+@pytest.mark.parametrize('map_name', UNKNOWN_MAPS)
+def test_unknown_map_names_stay_below_min_score(map_name: str):
+    _, score = MAP_NAME_INDEX.resolve(map_name)
+    assert score < constants.MAP_NAME_MIN_SCORE
+    assert GameInstanceManager.normalize_map_name(map_name) == map_name
+
+
+def test_ocr_confusions_are_cheaper_than_other_substitutions():
+    assert calc_ocr_edit_distance('guarry', 'quarry') < calc_ocr_edit_distance('xuarry', 'quarry')
+    assert calc_ocr_edit_distance('road-rag:', 'road-rage') < calc_ocr_edit_distance('road-ragx', 'road-rage')
+
+
+def test_separator_indels_are_cheaper_than_other_indels():
+    assert calc_ocr_edit_distance('wakeisland', 'wake-island') < calc_ocr_edit_distance('wake-islnd', 'wake-island')
+
+
+def test_edit_distance_stops_at_max_distance():
+    assert calc_ocr_edit_distance('dust-bowl', 'strike-at-karkand', max_distance=2.0) == float('inf')
+
+
+def test_resolve_remembers_misreads():
+    index = MapNameIndex(['taraba-quarry', 'surge'])
+    assert index.resolve('taraba-guarry') == index.resolve('taraba-guarry')
+    assert 'taraba-guarry' in index.resolved
@@ -0,0 +1,98 @@
+from functools import lru_cache
+from typing import Tuple
+
+import cv2
+import numpy as np
+import pytest
+from numpy import ndarray
+
+from BF2AutoSpectator.common import constants
+from BF2AutoSpectator.common.utility import to_motion_frame, calc_motion_score
+
+# Scenes are generated rather than captured, since there is no labelled corpus of game clips (the thresholds in
+# constants are only calibrated against these synthetic fixtures)
+
+# Size of the region is_sufficient_action_on_screen looks at (720p without the left and right edges)
+HEIGHT, WIDTH = 720, 944
+MARGIN = 64
+SEEDS = range(4)
+
+
+@lru_cache(maxsize=None)
+def create_scene(seed: int) -> ndarray:
+    # Smooth, high contrast "terrain" plus some fine detail, larger than the view to allow for camera movement
+    rng = np.random.default_rng(seed)
+    shape = (HEIGHT + 2 * MARGIN, WIDTH + 2 * MARGIN, 3)
+    base = cv2.GaussianBlur(rng.normal(128, 60, size=shape).astype(np.float32), (0, 0), 6)
+    detail = cv2.GaussianBlur(rng.normal(0, 25, size=shape).astype(np.float32), (0, 0), 1.5)
+    return np.clip((base - 128) * 3 + 128 + detail, 0, 255)
+
+
+def get_view(scene: ndarray, dy: int = 0, dx: int = 0) -> ndarray:
+    return scene[MARGIN + dy:MARGIN + dy + HEIGHT, MARGIN + dx:MARGIN + dx + WIDTH].copy()
+
+
+def add_noise(pixels: ndarray, rng: np.random.Generator, sigma: float = 2.0) -> ndarray:
+    # Capture/compression noise
+    return np.clip(pixels + rng.normal(0, sigma, size=pixels.shape), 0, 255).astype(np.uint8)
+
+
+def add_object(pixels: ndarray, x: int, contrast: int) -> ndarray:
+    # Vehicle/player sized object
+    pixels[300:420, x:x + 200] = np.clip(pixels[300:420, x:x + 200] + contrast, 0, 255)
+    return pixels
+
+
+def create_pair(scenario: str, seed: int) -> Tuple[ndarray, ndarray]:
+    scene = create_scene(seed)
+    rng = np.random.default_rng(seed)
+    a, b = get_view(scene), get_view(scene)
+    noise = 2.0
+    if scenario == 'static-noisy':
+        noise = 5.0
+    elif scenario == 'flicker':
+        # Fire/water/particles, averages out when downscaling
+        b[100:200, 100:200] += rng.normal(0, 40, size=(100, 100, 3))
+    elif scenario.startswith('sway'):
+        # Idle weapon sway in the lower right corner
+        weapon = get_view(scene, 100, 100)[:250, :300]
+        shift = int(scenario[4:])
+        a[470:720, 644:944] = weapon
+        b[470:720, 644:944] = np.roll(weapon, shift, axis=(0, 1))
+    elif scenario.startswith('pan'):
+        dx = int(scenario[3:])
+        b = get_view(scene, dx // 2, dx)
+    elif scenario.startswith('object'):
+        contrast = int(scenario[6:])
+        a, b = add_object(a, 300, contrast), add_object(b, 360, contrast)
+
+    return add_noise(a, rng, noise), add_noise(b, rng, noise)
+
+
+def calc_score(scenario: str, seed: int) -> float:
+    a, b = create_pair(scenario, seed)
+    return calc_motion_score(to_motion_frame(a), to_motion_frame(b))
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+@pytest.mark.parametrize('scenario', ['static', 'static-noisy', 'flicker', 'sway2', 'sway4', 'pan4'])
+def test_afk_is_below_min_score(scenario: str, seed: int):
+    assert calc_score(scenario, seed) <= constants.MOTION_MIN_SCORE
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+@pytest.mark.parametrize('scenario', ['pan8', 'pan16', 'pan24', 'pan32'])
+def test_camera_movement_is_full_action(scenario: str, seed: int):
+    assert calc_score(scenario, seed) == 1.0
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_camera_movement_beyond_max_shift_is_action(seed: int):
+    # Moves 60px (7.5px after downscaling), which cannot be compensated for, so most blocks change
+    assert calc_score('pan60', seed) > .5
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+@pytest.mark.parametrize('scenario', ['object60', 'object30', 'object15'])
+def test_moving_object_is_action(scenario: str, seed: int):
+    assert calc_score(scenario, seed) > constants.MOTION_MIN_SCORE
@@ -0,0 +1,318 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import pytest
+
+from BF2AutoSpectator.common.classes import GamePhase
+from BF2AutoSpectator.common.commands import CommandPriority
+from BF2AutoSpectator.game import GameInstanceState
+from BF2AutoSpectator.phase_handlers import PhaseHandlers
+from BF2AutoSpectator.phase_machine import PhaseMachine, is_transition_expected
+
+DETECTORS = ['round-end-screen', 'map-loading', 'map-briefing', 'default-camera-view']
+MAX_ITERATIONS_ON_PLAYER = 5
+MAX_ITERATIONS_ON_DEFAULT_CAMERA_VIEW = 2
+
+
+class FakeGameInstanceManager:
+    """
+    Stands in for GameInstanceManager, recording any game input instead of sending it and answering detectors based on
+    a made up screen
+    """
+    state: GameInstanceState
+    inputs: List[str]
+    default_camera_view_visible: bool
+    spawn_succeeds: bool
+    sufficient_action: bool
+
+    def __init__(self):
+        self.state = GameInstanceState()
+        self.inputs = []
+        self.default_camera_view_visible = False
+        self.spawn_succeeds = True
+        self.sufficient_action = True
+
+    def get_state(self) -> GameInstanceState:
+        return self.state
+
+    def delay_map_load(self, delay: int) -> bool:
+        self.inputs.append('delay-map-load')
+        return True
+
+    def get_map_details(self) -> Tuple[str, int, str]:
+        return 'dalian-plant', 64, 'gpm_cq'
+
+    def join_game(self) -> bool:
+        self.inputs.append('join-game')
+        return True
+
+    def is_join_game_button_visible(self) -> bool:
+        return False
+
+    def open_map_briefing(self) -> bool:
+        self.inputs.append('open-map-briefing')
+        return True
+
+    def start_spectating_via_freecam_toggle(self) -> None:
+        self.inputs.append('freecam-toggle')
+
+    def is_default_camera_view_visible(self) -> bool:
+        return self.default_camera_view_visible
+
+    def toggle_hud(self, direction: int) -> bool:
+        self.inputs.append(f'toggle-hud-{direction}')
+        return True
+
+    def is_spawn_menu_visible(self) -> bool:
+        return True
+
+    def open_spawn_menu(self) -> None:
+        self.inputs.append('open-spawn-menu')
+
+    def get_player_team(self) -> Optional[int]:
+        return 0
+
+    def spawn_coordinates_available(self) -> bool:
+        return True
+
+    def show_scoreboard(self) -> bool:
+        self.inputs.append('show-scoreboard')
+        return True
+
+    def spawn_suicide(self, randomize: bool = False) -> bool:
+        self.inputs.append('spawn-suicide')
+        return self.spawn_succeeds
+
+    def rotate_to_next_player(self) -> None:
+        self.inputs.append('rotate-to-next-player')
+
+    def is_sufficient_action_on_screen(self) -> bool:
+        return self.sufficient_action
+
+
+class FakeConfig:
+    """
+    Stands in for Config, providing only what the handlers use
+    """
+    rotation_paused: bool = False
+
+    def get_map_load_delay(self) -> int:
+        return 0
+
+    def get_max_iterations_on_player(self) -> int:
+        return MAX_ITERATIONS_ON_PLAYER
+
+    def get_max_iterations_on_default_camera_view(self) -> int:
+        return MAX_ITERATIONS_ON_DEFAULT_CAMERA_VIEW
+
+    def get_lockup_iterations_on_spawn_menu(self) -> int:
+        return 5
+
+    def player_rotation_paused(self) -> bool:
+        return self.rotation_paused
+
+    def get_player_rotation_paused_until(self) -> datetime:
+        return datetime.max
+
+    def unpause_player_rotation(self) -> None:
+        self.rotation_paused = False
+
+
+class FakeCommandStore:
+    """
+    Stands in for CommandStore, recording waits instead of blocking
+    """
+    waits: List[Tuple[float, CommandPriority]]
+
+    def __init__(self):
+        self.waits = []
+
+    def wait(self, timeout: float, priority: CommandPriority = CommandPriority.normal) -> bool:
+        self.waits.append((timeout, priority))
+        return False
+
+
+class FakeScheduler:
+    sleeps: List[Tuple[GamePhase, Optional[str], float]]
+
+    def __init__(self):
+        self.sleeps = []
+
+    def sleep(self, phase: GamePhase, map_name: Optional[str], elapsed: float, default: float) -> None:
+        self.sleeps.append((phase, map_name, default))
+
+
+class FakePlanner:
+    """
+    Stands in for DetectorPlanner.evaluate, reporting the detectors visible on a made up screen
+    """
+    visible: Set[str]
+    evaluated: List[str]
+
+    def __init__(self):
+        self.visible = set()
+        self.evaluated = []
+
+    def evaluate(self, names: List[str]) -> Dict[str, bool]:
+        self.evaluated.extend(names)
+        return {name: name in self.visible for name in names}
+
+
+@pytest.fixture
+def transitions() -> List[tuple]:
+    return []
+
+
+@pytest.fixture
+def rotations() -> List[bool]:
+    return []
+
+
+@pytest.fixture
+def handlers(transitions: List[tuple], rotations: List[bool]) -> PhaseHandlers:
+    pm = PhaseMachine(GamePhase.loading)
+    pm.add_transition_listener(lambda previous, phase, duration: transitions.append((previous, phase)))
+    return PhaseHandlers(
+        FakeGameInstanceManager(), FakeConfig(), pm, FakeCommandStore(), FakeScheduler(), lambda: rotations.append(True)
+    )
+
+
+def show(handlers: PhaseHandlers, *visible: str, force_next_player: bool = False) -> None:
+    handlers.handle({name: name in visible for name in DETECTORS}, force_next_player)
+
+
+def test_round_is_driven_through_all_phases(handlers: PhaseHandlers, transitions: List[tuple],
+                                            rotations: List[bool]):
+    gim, gis = handlers.gim, handlers.gis
+    gim.default_camera_view_visible = True
+
+    show(handlers, 'round-end-screen', 'map-loading')
+    assert handlers.pm.get_phase() is GamePhase.loading
+    assert handlers.scheduler.sleeps == [(GamePhase.loading, None, 3)]
+
+    # Freecam toggle does not work on this server, so spawn-suicide is used instead
+    show(handlers, 'default-camera-view')
+    assert gim.inputs == ['freecam-toggle']
+    assert not gis.round_spawned()
+    show(handlers, 'default-camera-view')
+    assert gim.inputs == ['freecam-toggle', 'spawn-suicide']
+    assert handlers.pm.get_phase() is GamePhase.spawning
+    assert gis.round_spawned()
+
+    # Hide hud, enter round and rotate off the spectator right away
+    for _ in range(3):
+        show(handlers)
+    assert gim.inputs[2:] == ['toggle-hud-0', 'rotate-to-next-player']
+    assert gis.round_entered() and gis.get_round_num() == 1
+    assert rotations == [True]
+
+    # Round ends, map briefing is checked and the next map loads
+    for visible in [('round-end-screen',), ('round-end-screen',), ('round-end-screen', 'map-briefing'),
+                    ('round-end-screen', 'map-loading')]:
+        show(handlers, *visible)
+    assert gis.get_rotation_map_name() == 'dalian-plant'
+
+    assert transitions == [
+        (GamePhase.loading, GamePhase.spawning),
+        (GamePhase.spawning, GamePhase.spectating),
+        (GamePhase.spectating, GamePhase.betweenRounds),
+        (GamePhase.betweenRounds, GamePhase.loading)
+    ]
+    assert all(is_transition_expected(previous, phase) for previous, phase in transitions)
+
+
+def test_freecam_toggle_skips_spawn_suicide(handlers: PhaseHandlers, transitions: List[tuple]):
+    show(handlers, 'default-camera-view')
+
+    assert handlers.gim.inputs == ['freecam-toggle']
+    assert handlers.gis.round_spawned() and handlers.gis.round_entered()
+    assert transitions == [(GamePhase.loading, GamePhase.spectating)]
+
+
+def test_loading_screen_ends_spectating_via_round_end_screen(handlers: PhaseHandlers, transitions: List[tuple]):
+    planner = FakePlanner()
+    planner.visible = {'round-end-screen', 'map-loading'}
+    handlers.pm.enter(GamePhase.spectating)
+    transitions.clear()
+
+    handlers.handle(handlers.pm.evaluate(planner.evaluate, DETECTORS))
+    assert handlers.pm.get_phase() is GamePhase.betweenRounds
+    assert 'map-loading' not in planner.evaluated
+
+    handlers.handle(handlers.pm.evaluate(planner.evaluate, DETECTORS))
+    assert transitions == [
+        (GamePhase.spectating, GamePhase.betweenRounds),
+        (GamePhase.betweenRounds, GamePhase.loading)
+    ]
+
+
+def test_map_rotation_resets_state_if_round_was_entered(handlers: PhaseHandlers):
+    handlers.pm.enter(GamePhase.betweenRounds)
+    handlers.gis.set_round_entered(True)
+    handlers.gis.set_rotation_map_name('dalian-plant')
+
+    show(handlers, 'round-end-screen', 'map-loading')
+
+    assert handlers.pm.get_phase() is GamePhase.betweenRounds
+    assert not handlers.gis.round_entered()
+    assert handlers.gis.get_rotation_map_name() is None
+    assert handlers.cs.waits == [(6, CommandPriority.high)]
+
+
+def test_unexpected_phase_is_handled_like_between_rounds(handlers: PhaseHandlers):
+    handlers.pm.enter(GamePhase.inMenu)
+
+    show(handlers, 'round-end-screen', 'map-loading')
+
+    assert handlers.pm.get_phase() is GamePhase.loading
+
+
+@pytest.fixture
+def spectating(handlers: PhaseHandlers) -> PhaseHandlers:
+    handlers.pm.enter(GamePhase.spectating)
+    handlers.gis.set_round_spawned(True)
+    handlers.gis.set_round_entered(True)
+    handlers.gis.set_hud_hidden(True)
+    return handlers
+
+
+def test_spectator_stays_on_active_player(spectating: PhaseHandlers, rotations: List[bool]):
+    show(spectating)
+
+    assert spectating.gim.inputs == []
+    assert spectating.gis.get_iterations_on_player() == 1
+    assert spectating.cs.waits == [(2, CommandPriority.normal)]
+    assert rotations == []
+
+
+def test_spectator_rotates_off_afk_player_next_tick(spectating: PhaseHandlers, rotations: List[bool]):
+    spectating.gim.sufficient_action = False
+
+    show(spectating)
+    assert spectating.gim.inputs == []
+    show(spectating)
+
+    assert spectating.gim.inputs == ['rotate-to-next-player']
+    assert rotations == [True]
+
+
+@pytest.mark.parametrize('paused', [False, True])
+def test_forced_next_player_rotates_even_if_paused(spectating: PhaseHandlers, rotations: List[bool], paused: bool):
+    spectating.config.rotation_paused = paused
+
+    show(spectating, force_next_player=True)
+
+    assert spectating.gim.inputs == ['rotate-to-next-player']
+    assert spectating.gis.get_iterations_on_player() == 0
+    assert rotations == [True]
+
+
+def test_default_camera_view_while_spectating_escalates_to_spawn_suicide(spectating: PhaseHandlers):
+    for _ in range(MAX_ITERATIONS_ON_DEFAULT_CAMERA_VIEW + 1):
+        show(spectating, 'default-camera-view')
+    assert spectating.gim.inputs == ['rotate-to-next-player', 'freecam-toggle']
+    assert spectating.gis.round_spawned()
+
+    show(spectating, 'default-camera-view')
+    assert not spectating.gis.round_spawned()
+    assert spectating.gis.get_iterations_on_default_camera_view() == 0
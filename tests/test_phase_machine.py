@@ -0,0 +1,122 @@
+from typing import Dict, List, Set
+
+import pytest
+
+from BF2AutoSpectator.common.classes import GamePhase
+from BF2AutoSpectator.phase_machine import PhaseMachine, PHASE_DETECTORS, is_transition_expected
+
+DETECTORS = ['game-message', 'round-end-screen', 'map-loading', 'map-briefing', 'default-camera-view']
+
+
+class FakePlanner:
+    """
+    Stands in for DetectorPlanner.evaluate, reporting the detectors visible on a made up screen
+    """
+    visible: Set[str]
+    evaluated: List[str]
+
+    def __init__(self):
+        self.visible = set()
+        self.evaluated = []
+
+    def show(self, *visible: str) -> None:
+        self.visible = set(visible)
+
+    def evaluate(self, names: List[str]) -> Dict[str, bool]:
+        self.evaluated.extend(names)
+        return {name: name in self.visible for name in names}
+
+
+@pytest.fixture
+def transitions() -> List[tuple]:
+    return []
+
+
+@pytest.fixture
+def pm(transitions: List[tuple]) -> PhaseMachine:
+    pm = PhaseMachine(GamePhase.inMenu)
+    pm.add_transition_listener(lambda previous, phase, duration: transitions.append((previous, phase)))
+    return pm
+
+
+@pytest.mark.parametrize('phase', list(GamePhase))
+def test_evaluate_only_runs_detectors_relevant_in_phase(phase: GamePhase):
+    planner = FakePlanner()
+    planner.show(*DETECTORS)
+    pm = PhaseMachine(phase)
+
+    results = pm.evaluate(planner.evaluate, DETECTORS)
+
+    assert set(planner.evaluated) == set(DETECTORS) & PHASE_DETECTORS[phase]
+    # Detectors not run are treated as negative
+    assert results == {name: name in PHASE_DETECTORS[phase] for name in DETECTORS}
+
+
+def test_evaluate_skips_planner_if_no_detector_is_relevant():
+    planner = FakePlanner()
+    pm = PhaseMachine(GamePhase.spectating)
+
+    assert pm.evaluate(planner.evaluate, ['map-loading', 'map-briefing']) == {
+        'map-loading': False,
+        'map-briefing': False
+    }
+    assert planner.evaluated == []
+
+
+def test_phases_not_listed_run_all_detectors():
+    pm = PhaseMachine(GamePhase.spectating, detectors={})
+
+    assert all(pm.is_relevant(name) for name in DETECTORS + ['map-identification', 'camera-view-learning'])
+
+
+def test_map_identification_and_learning_only_run_while_loading():
+    for phase in GamePhase:
+        pm = PhaseMachine(phase)
+        assert pm.is_relevant('map-identification') is (phase is GamePhase.loading)
+        assert pm.is_relevant('camera-view-learning') is (phase is GamePhase.loading)
+
+
+def test_enter_reports_phase_to_listeners_even_if_unchanged(pm: PhaseMachine, transitions: List[tuple]):
+    entered = []
+    pm.add_listener(lambda phase, **kwargs: entered.append((phase, kwargs)))
+
+    assert pm.enter(GamePhase.loading) is True
+    assert pm.enter(GamePhase.loading) is False
+    assert pm.enter(GamePhase.halted, server={'ip': '127.0.0.1'}) is True
+
+    assert entered == [
+        (GamePhase.loading, {}),
+        (GamePhase.loading, {}),
+        (GamePhase.halted, {'server': {'ip': '127.0.0.1'}})
+    ]
+    assert transitions == [(GamePhase.inMenu, GamePhase.loading), (GamePhase.loading, GamePhase.halted)]
+
+
+def test_transition_listener_receives_time_spent_in_phase(monkeypatch: pytest.MonkeyPatch):
+    now = [100.0]
+    monkeypatch.setattr('BF2AutoSpectator.phase_machine.time.monotonic', lambda: now[0])
+    durations = []
+    pm = PhaseMachine(GamePhase.loading)
+    pm.add_transition_listener(lambda previous, phase, duration: durations.append(duration))
+
+    now[0] += 42.5
+    assert pm.get_phase_duration() == 42.5
+    pm.enter(GamePhase.spawning)
+    now[0] += 3.0
+    pm.enter(GamePhase.spawning)
+    pm.enter(GamePhase.spectating)
+
+    assert durations == [42.5, 3.0]
+
+
+@pytest.mark.parametrize('current, phase, expected', [
+    (GamePhase.spectating, GamePhase.betweenRounds, True),
+    (GamePhase.betweenRounds, GamePhase.loading, True),
+    (GamePhase.spectating, GamePhase.halted, True),
+    (GamePhase.stopped, GamePhase.starting, True),
+    (GamePhase.initial, GamePhase.spectating, False),
+    (GamePhase.inMenu, GamePhase.spectating, False),
+    (GamePhase.stopped, GamePhase.loading, False)
+])
+def test_is_transition_expected(current: GamePhase, phase: GamePhase, expected: bool):
+    assert is_transition_expected(current, phase) is expected
@@ -0,0 +1,90 @@
+import json
+import os
+
+import pytest
+
+from BF2AutoSpectator import scheduler
+from BF2AutoSpectator.common.classes import GamePhase
+from BF2AutoSpectator.scheduler import PhaseDurationStore, TickScheduler, TICK_SCHEDULER_MAX_OVERRUN, \
+    TICK_SCHEDULER_MIN_INTERVAL
+
+DEFAULT = 3.0
+EXPECTED = 60.0
+
+
+@pytest.fixture
+def store(tmp_path) -> PhaseDurationStore:
+    store = PhaseDurationStore(os.path.join(tmp_path, 'phase-durations.json'))
+    for _ in range(5):
+        store.record(GamePhase.loading, 'strike-at-karkand', EXPECTED)
+    return store
+
+
+def test_interval_is_default_without_durations(tmp_path):
+    ts = TickScheduler(PhaseDurationStore(os.path.join(tmp_path, 'phase-durations.json')))
+
+    assert ts.get_interval(GamePhase.loading, 'strike-at-karkand', 10.0, DEFAULT) == DEFAULT
+    assert TickScheduler(None).get_interval(GamePhase.loading, None, 10.0, DEFAULT) == DEFAULT
+
+
+@pytest.mark.parametrize('elapsed', [0.0, 10.0, 50.0, EXPECTED - 2.0, EXPECTED, EXPECTED + 5.0, EXPECTED + 100.0])
+def test_interval_is_never_sparser_than_default(store: PhaseDurationStore, elapsed: float):
+    interval = TickScheduler(store).get_interval(GamePhase.loading, 'strike-at-karkand', elapsed, DEFAULT)
+
+    assert TICK_SCHEDULER_MIN_INTERVAL <= interval <= DEFAULT
+
+
+def test_interval_is_dense_around_expected_transition(store: PhaseDurationStore):
+    ts = TickScheduler(store)
+
+    assert ts.get_interval(GamePhase.loading, 'strike-at-karkand', EXPECTED - 1.0, DEFAULT) == \
+        TICK_SCHEDULER_MIN_INTERVAL
+    assert ts.get_interval(GamePhase.loading, 'strike-at-karkand', EXPECTED + 1.0, DEFAULT) == \
+        TICK_SCHEDULER_MIN_INTERVAL
+
+
+def test_interval_falls_back_to_default_once_phase_overruns(store: PhaseDurationStore):
+    elapsed = EXPECTED + TICK_SCHEDULER_MAX_OVERRUN + 1.0
+
+    assert TickScheduler(store).get_interval(GamePhase.loading, 'strike-at-karkand', elapsed, DEFAULT) == DEFAULT
+
+
+def test_interval_is_default_for_phases_not_scheduled(store: PhaseDurationStore):
+    assert TickScheduler(store).get_interval(GamePhase.spectating, 'strike-at-karkand', 10.0, DEFAULT) == DEFAULT
+
+
+def test_expected_duration_falls_back_to_any_map(store: PhaseDurationStore):
+    assert store.get_expected(GamePhase.loading, 'strike-at-karkand') == EXPECTED
+    assert store.get_expected(GamePhase.loading, 'dalian-plant') == EXPECTED
+    assert store.get_expected(GamePhase.betweenRounds, 'strike-at-karkand') is None
+
+
+def test_transitions_are_only_recorded_if_phase_ended_naturally(tmp_path):
+    store = PhaseDurationStore(os.path.join(tmp_path, 'phase-durations.json'))
+    ts = TickScheduler(store)
+
+    ts.on_transition(GamePhase.loading, GamePhase.spawning, 42.0, 'dalian-plant')
+    ts.on_transition(GamePhase.loading, GamePhase.inMenu, 10.0, 'dalian-plant')
+    ts.on_transition(GamePhase.spectating, GamePhase.betweenRounds, 1800.0, 'dalian-plant')
+
+    assert store.durations == {'loading': [42.0], 'loading/dalian-plant': [42.0]}
+
+
+def test_durations_are_written_in_batches(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    now = [1000.0]
+    monkeypatch.setattr(scheduler.time, 'monotonic', lambda: now[0])
+    path = os.path.join(tmp_path, 'phase-durations.json')
+    ts = TickScheduler(PhaseDurationStore(path))
+
+    ts.on_transition(GamePhase.loading, GamePhase.spawning, 42.0, None)
+    ts.on_transition(GamePhase.betweenRounds, GamePhase.loading, 20.0, None)
+    assert not os.path.exists(path)
+
+    now[0] += scheduler.PHASE_DURATION_SAVE_INTERVAL
+    ts.on_transition(GamePhase.loading, GamePhase.spectating, 40.0, None)
+    with open(path) as file:
+        assert json.load(file) == {'loading': [42.0, 40.0], 'between-rounds': [20.0]}
+
+    reloaded = PhaseDurationStore(path)
+    reloaded.load()
+    assert reloaded.durations == ts.store.durations